@@ -1,6 +1,70 @@
 from django.contrib import admin
 from django import forms
+from django.db import transaction
+from django.db.models import QuerySet
+from django.utils.text import capfirst
+from .deletion import cascade_counts, chunked_delete
 from .models import User, Fuel, Machine, Payment, Creditor
+from .pagination import EstimatedCountPaginator
+from .pubsub import publish_machine
+from .readings import machine_entries, record_readings
+from .search import search
+from .valuation import PRICE_HISTORY_START, set_fuel_price
+
+
+# DELETES
+class ChunkedDeleteMixin:
+    """
+    Deletes through app.deletion.chunked_delete so dependents (reading history, ledger) are
+    removed in bounded batches; the confirmation page counts them instead of listing every row
+    """
+
+    def delete_model(self, request, obj):
+        chunked_delete(self.model._base_manager.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        chunked_delete(queryset)
+
+    def get_deleted_objects(self, objs, request):
+        if not isinstance(objs, QuerySet):
+            objs = self.model._base_manager.filter(pk__in=[obj.pk for obj in objs])
+        counts = cascade_counts(objs)
+
+        to_delete = ['{}: {}'.format(capfirst(self.model._meta.verbose_name), obj) for obj in objs]
+        model_count = {model._meta.verbose_name_plural: count for model, count in counts.items() if count}
+        perms_needed = {
+            model._meta.verbose_name for model, count in counts.items()
+            if count and model in self.admin_site._registry
+            and not self.admin_site._registry[model].has_delete_permission(request)
+        }
+        return to_delete, model_count, perms_needed, []
+
+
+# PAGINATION
+class EstimatedCountMixin:
+    """
+    Changelists paginate on the table statistics' row estimate (unfiltered) or a capped count
+    (filtered) instead of exact counts, and skip the unfiltered total next to search results
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+# SEARCH
+class FullTextSearchMixin:
+    """
+    Searches through the full-text index of app.search, terms too short for the index (or all
+    of them without one) go through the search_fields lookups
+    """
+
+    def get_search_results(self, request, queryset, search_term):
+        results = search(queryset, search_term) if search_term else None
+        if results is None:
+            return super().get_search_results(request, queryset, search_term)
+        queryset, rest = results
+        if rest:
+            return super().get_search_results(request, queryset, rest)
+        return queryset, False
 
 
 # USERS
@@ -29,7 +93,7 @@ class UserForm(forms.ModelForm):
 
 
 @admin.register(User)
-class UserAdmin(admin.ModelAdmin):
+class UserAdmin(EstimatedCountMixin, FullTextSearchMixin, ChunkedDeleteMixin, admin.ModelAdmin):
     form = UserForm
     search_fields = [
         'name',
@@ -68,7 +132,7 @@ class FuelForm(forms.ModelForm):
 
 
 @admin.register(Fuel)
-class FuelAdmin(admin.ModelAdmin):
+class FuelAdmin(EstimatedCountMixin, FullTextSearchMixin, ChunkedDeleteMixin, admin.ModelAdmin):
     form = FuelForm
     search_fields = [
         'type',
@@ -80,6 +144,19 @@ class FuelAdmin(admin.ModelAdmin):
     ]
     list_per_page = 10
 
+    def save_model(self, request, obj, form, change):
+        price = obj.price
+        with transaction.atomic():
+            if change and 'price' in form.changed_data:
+                # Price changes go through the price history
+                obj.price = form.initial['price']
+                super().save_model(request, obj, form, change)
+                set_fuel_price(obj, price)
+            else:
+                super().save_model(request, obj, form, change)
+                if not change:
+                    set_fuel_price(obj, price, PRICE_HISTORY_START)
+
 
 # PAYMENTS
 class PaymentForm(forms.ModelForm):
@@ -94,7 +171,7 @@ class PaymentForm(forms.ModelForm):
 
 
 @admin.register(Payment)
-class PaymentAdmin(admin.ModelAdmin):
+class PaymentAdmin(EstimatedCountMixin, ChunkedDeleteMixin, admin.ModelAdmin):
     form = PaymentForm
     search_fields = [
         'mode'
@@ -124,11 +201,11 @@ class MachineForm(forms.ModelForm):
 
 
 @admin.register(Machine)
-class MachineAdmin(admin.ModelAdmin):
+class MachineAdmin(EstimatedCountMixin, FullTextSearchMixin, ChunkedDeleteMixin, admin.ModelAdmin):
     form = MachineForm
     search_fields = [
         'name',
-        'fuel',
+        'fuel__type',
         'reading'
     ]
     list_display = [
@@ -138,6 +215,18 @@ class MachineAdmin(admin.ModelAdmin):
     ]
     list_per_page = 10
 
+    def save_model(self, request, obj, form, change):
+        with transaction.atomic():
+            if change:
+                # The reading when the form was loaded may be stale, lock the row and use the stored one
+                previous = Machine.objects.select_for_update().values_list('reading', flat=True).get(pk=obj.pk)
+            super().save_model(request, obj, form, change)
+            if not change:
+                record_readings(machine_entries([obj], {}))
+            elif obj.reading != previous:
+                record_readings(machine_entries([obj], {obj.pk: previous}))
+                publish_machine(obj)
+
 
 # CREDITORS
 class CreditorForm(forms.ModelForm):
@@ -152,7 +241,7 @@ class CreditorForm(forms.ModelForm):
 
 
 @admin.register(Creditor)
-class CreditorAdmin(admin.ModelAdmin):
+class CreditorAdmin(EstimatedCountMixin, FullTextSearchMixin, ChunkedDeleteMixin, admin.ModelAdmin):
     form = CreditorForm
     search_fields = [
         'payment__mode',
@@ -164,6 +253,17 @@ class CreditorAdmin(admin.ModelAdmin):
         'payment',
         'name',
         'limit_warning',
-        'limit_stop_credit'
+        'limit_stop_credit',
+        'balance'
+    ]
+    readonly_fields = [
+        'balance'
     ]
     list_per_page = 10
+
+    def save_model(self, request, obj, form, change):
+        # balance moves concurrently through the ledger, only write the edited columns back
+        if change:
+            obj.save(update_fields=[name for name in form.changed_data if name != 'balance'])
+        else:
+            obj.save()
@@ -0,0 +1,184 @@
+from collections import namedtuple
+from itertools import chain
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from django.db import connection, transaction
+from .models import MachineReading, MeterAnomaly
+
+ROLLBACK = "rollback"
+STUCK = "stuck"
+JUMP = "jump"
+
+# Scale of the median absolute deviation that matches a standard deviation for normal data
+MAD_SCALE = 1.4826
+
+Anomaly = namedtuple(
+    "Anomaly", ["kind", "machine_id", "reading_id", "reading", "delta", "score", "until_reading_id"]
+)
+
+
+class AnomalySettings(namedtuple("AnomalySettings", [
+    "window", "step", "threshold", "min_scale", "tolerance", "stuck_samples", "stuck_hours",
+])):
+    """
+    window: deltas in the rolling baseline of a jump, moved every step deltas,
+    threshold: robust z-score of a jump,
+    min_scale: floor of the deviation in litres so a mostly idle pump doesn't flag every sale,
+    tolerance: litres a reading may move back or stand still by,
+    stuck_samples / stuck_hours: shortest run of unchanged readings reported as a stuck meter
+    """
+
+
+DEFAULT_SETTINGS = AnomalySettings(
+    window=168, step=24, threshold=12.0, min_scale=1.0, tolerance=0.001, stuck_samples=6, stuck_hours=24,
+)
+
+
+def load_histories(start=None, end=None, machine_ids=None):
+    """
+    Reading history as (reading ids, machine ids, readings) arrays ordered by machine and time.
+    Only numbers are fetched, through the (machine, recorded_at) index
+    """
+    readings = MachineReading.objects.order_by("machine_id", "recorded_at", "pk")
+    if start is not None:
+        readings = readings.filter(recorded_at__gte=start)
+    if end is not None:
+        readings = readings.filter(recorded_at__lt=end)
+    if machine_ids is not None:
+        readings = readings.filter(machine_id__in=machine_ids)
+
+    sql, params = readings.values_list("pk", "machine_id", "reading").query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = np.fromiter(chain.from_iterable(cursor), dtype=np.float64).reshape(-1, 3)
+    return rows[:, 0].astype(np.int64), rows[:, 1].astype(np.int64), rows[:, 2]
+
+
+def machine_slices(machine_ids):
+    """
+    (machine id, slice) of each machine's run in machine_ids, which is sorted
+    """
+    starts = np.flatnonzero(np.r_[True, machine_ids[1:] != machine_ids[:-1]])
+    ends = np.r_[starts[1:], len(machine_ids)]
+    return [(int(machine_ids[start]), slice(start, end)) for start, end in zip(starts, ends)]
+
+
+def rolling_scores(deltas, window, step, min_scale):
+    """
+    Robust z-score of every delta against the median and median absolute deviation of window
+    deltas before it, nan for the first window deltas. The baseline is moved every step deltas,
+    which keeps the cost at len(deltas) * window / step
+    """
+    scores = np.full(len(deltas), np.nan)
+    if len(deltas) <= window:
+        return scores
+    windows = sliding_window_view(deltas[:-1], window)[::step]
+    medians = np.median(windows, axis=1)
+    scales = np.maximum(np.median(np.abs(windows - medians[:, None]), axis=1) * MAD_SCALE, min_scale)
+    baseline = (np.arange(window, len(deltas)) - window) // step
+    scores[window:] = (deltas[window:] - medians[baseline]) / scales[baseline]
+    return scores
+
+
+def zero_runs(still, min_length):
+    """
+    (first, last) positions of the runs of True in still at least min_length long
+    """
+    edges = np.diff(np.r_[0, still.astype(np.int8), 0])
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    long_runs = ends - starts >= min_length
+    return starts[long_runs], ends[long_runs] - 1
+
+
+def analyse_machine(machine_id, ids, readings, settings):
+    """
+    Anomalies of one machine's readings: rollbacks (a reading below the previous one),
+    stuck meters (a run of unchanged readings) and jumps (a delta far above the rolling baseline).
+    Stuck runs are returned as candidates, their duration is checked by detect_anomalies
+    """
+    anomalies = []
+    if len(readings) < 2:
+        return anomalies
+    deltas = np.diff(readings)
+
+    for position in np.flatnonzero(deltas < -settings.tolerance):
+        anomalies.append(Anomaly(
+            ROLLBACK, machine_id, int(ids[position + 1]), float(readings[position + 1]),
+            float(deltas[position]), float(deltas[position]), None,
+        ))
+
+    firsts, lasts = zero_runs(np.abs(deltas) <= settings.tolerance, settings.stuck_samples)
+    for first, last in zip(firsts, lasts):
+        anomalies.append(Anomaly(
+            STUCK, machine_id, int(ids[first]), float(readings[first]), 0.0, float(last - first + 1),
+            int(ids[last + 1]),
+        ))
+
+    scores = rolling_scores(deltas, settings.window, settings.step, settings.min_scale)
+    with np.errstate(invalid="ignore"):
+        jumps = np.flatnonzero(scores > settings.threshold)
+    for position in jumps:
+        anomalies.append(Anomaly(
+            JUMP, machine_id, int(ids[position + 1]), float(readings[position + 1]),
+            float(deltas[position]), float(scores[position]), None,
+        ))
+    return anomalies
+
+
+def reading_times(reading_ids):
+    times = {}
+    reading_ids = list(reading_ids)
+    for position in range(0, len(reading_ids), 500):
+        times.update(
+            MachineReading.objects.filter(pk__in=reading_ids[position:position + 500]).values_list("pk", "recorded_at")
+        )
+    return times
+
+
+def detect_anomalies(start=None, end=None, machine_ids=None, settings=DEFAULT_SETTINGS):
+    """
+    Scan the reading history of [start, end) and return the flagged anomalies with the time
+    of their reading, as (Anomaly, recorded_at, until) ordered by time
+    """
+    ids, machines, readings = load_histories(start, end, machine_ids)
+    anomalies = []
+    for machine_id, rows in machine_slices(machines) if len(machines) else []:
+        anomalies.extend(analyse_machine(machine_id, ids[rows], readings[rows], settings))
+
+    times = reading_times(
+        {anomaly.reading_id for anomaly in anomalies}
+        | {anomaly.until_reading_id for anomaly in anomalies if anomaly.until_reading_id}
+    )
+    flagged = []
+    for anomaly in anomalies:
+        recorded_at = times[anomaly.reading_id]
+        until = times.get(anomaly.until_reading_id)
+        if anomaly.kind == STUCK and (until - recorded_at).total_seconds() < settings.stuck_hours * 3600:
+            continue
+        flagged.append((anomaly, recorded_at, until))
+    flagged.sort(key=lambda item: (item[1], item[0].machine_id))
+    return flagged
+
+
+def store_anomalies(flagged, start=None, end=None, machine_ids=None):
+    """
+    Replace the stored anomalies of the scanned range with flagged, returns the number stored
+    """
+    stored = MeterAnomaly.objects.all()
+    if start is not None:
+        stored = stored.filter(recorded_at__gte=start)
+    if end is not None:
+        stored = stored.filter(recorded_at__lt=end)
+    if machine_ids is not None:
+        stored = stored.filter(machine_id__in=machine_ids)
+
+    with transaction.atomic():
+        stored.delete()
+        MeterAnomaly.objects.bulk_create([
+            MeterAnomaly(
+                machine_id=anomaly.machine_id, kind=anomaly.kind, recorded_at=recorded_at, until=until,
+                reading=anomaly.reading, delta=anomaly.delta, score=anomaly.score,
+            )
+            for anomaly, recorded_at, until in flagged
+        ], batch_size=1000)
+    return len(flagged)
@@ -0,0 +1,134 @@
+import copy
+import time
+from collections import OrderedDict
+from threading import Lock
+from django.conf import settings
+from graphql_jwt.middleware import JSONWebTokenMiddleware as BaseJSONWebTokenMiddleware
+from graphql_jwt.settings import jwt_settings
+from graphql_jwt.utils import get_http_authorization, get_payload, get_user_by_payload
+from .versions import bump_cache_version, get_cache_version
+
+DEFAULT_TOKEN_CACHE = {
+    # verified tokens kept per process
+    "MAX_SIZE": 1024,
+    # seconds a verified token is trusted before it is decoded and looked up again
+    "TTL": 300,
+}
+
+
+def get_token_cache_settings():
+    token_settings = dict(DEFAULT_TOKEN_CACHE)
+    token_settings.update(getattr(settings, "GRAPHQL_JWT_TOKEN_CACHE", {}))
+    return token_settings
+
+
+def user_version_key(user_id):
+    return "auth:user:{}:version".format(user_id)
+
+
+def get_user_version(user_id):
+    return get_cache_version(user_version_key(user_id))
+
+
+def bump_user_version(user_id):
+    bump_cache_version(user_version_key(user_id))
+
+
+class TokenCache:
+    """
+    Process wide LRU of verified token -> user snapshot. An entry is dropped when its TTL or the
+    token expiry passes, or when the user row changes in any worker (shared per user version)
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.tokens = OrderedDict()
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, token):
+        with self.lock:
+            entry = self.tokens.get(token)
+            if entry is not None:
+                self.tokens.move_to_end(token)
+
+        if entry is not None:
+            user, version, expires_at = entry
+            if expires_at > time.time() and version == get_user_version(user.pk):
+                with self.lock:
+                    self.hits += 1
+                # Every request gets its own copy so per request state (e.g permission caches) never leaks
+                return copy.copy(user)
+            with self.lock:
+                self.tokens.pop(token, None)
+
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def get_user(self, token, context=None):
+        user = self.lookup(token)
+        if user is not None:
+            return user
+
+        payload = get_payload(token, context)
+        user = get_user_by_payload(payload)
+        if user is None:
+            return None
+
+        expires_at = time.time() + self.ttl
+        if payload.get("exp"):
+            expires_at = min(expires_at, payload["exp"])
+
+        entry = (copy.copy(user), get_user_version(user.pk), expires_at)
+        with self.lock:
+            self.tokens[token] = entry
+            while len(self.tokens) > self.max_size:
+                self.tokens.popitem(last=False)
+        return user
+
+    def stats(self):
+        with self.lock:
+            return {"size": len(self.tokens), "hits": self.hits, "misses": self.misses}
+
+    def clear(self):
+        with self.lock:
+            self.tokens.clear()
+            self.hits = self.misses = 0
+
+
+token_cache = TokenCache(**{key.lower(): value for key, value in get_token_cache_settings().items()})
+
+
+class JSONWebTokenMiddleware(BaseJSONWebTokenMiddleware):
+    """
+    Authenticate the request once, on its first root field, through the verified token cache.
+    Nested fields go straight to their resolver
+    """
+
+    def resolve(self, next, root, info, **kwargs):
+        # Per field token arguments need the original per resolver behaviour
+        if jwt_settings.JWT_ALLOW_ARGUMENT:
+            return super().resolve(next, root, info, **kwargs)
+
+        if info.path.prev is None:
+            self.authenticate(info, **kwargs)
+        return next(root, info, **kwargs)
+
+    def authenticate(self, info, **kwargs):
+        context = info.context
+        if getattr(context, "_jwt_authenticated", False):
+            return
+        if hasattr(context, "user") and not context.user.is_anonymous:
+            return
+
+        token = get_http_authorization(context)
+        if token is None or not self.authenticate_context(info, **kwargs):
+            return
+
+        user = token_cache.get_user(token, context)
+        if user is not None:
+            context.user = user
+        context._jwt_authenticated = True
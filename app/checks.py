@@ -0,0 +1,105 @@
+from django.contrib import admin
+from django.core.checks import Tags, Warning, register
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import UniqueConstraint
+from graphene_django.registry import get_global_registry
+from .search import is_searchable
+
+SEARCH_PREFIXES = "^=@"
+# Admin searches an index can serve: ^ (istartswith) and = (iexact), plain ones are icontains
+INDEXED_SEARCH_PREFIXES = "^="
+
+
+def indexed_columns(model):
+    """
+    Columns that lead an index of the model's table, only the leading column of a
+    composite index can serve a lookup on its own
+    """
+    opts = model._meta
+    columns = set()
+    for field in opts.concrete_fields:
+        if field.primary_key or field.unique or field.db_index:
+            columns.add(field.column)
+    for index in opts.indexes:
+        if index.fields:
+            columns.add(opts.get_field(index.fields[0].lstrip("-")).column)
+    for fields in opts.unique_together:
+        columns.add(opts.get_field(fields[0]).column)
+    for constraint in opts.constraints:
+        if isinstance(constraint, UniqueConstraint) and constraint.fields:
+            columns.add(opts.get_field(constraint.fields[0]).column)
+    return columns
+
+
+def resolve_field(model, path):
+    """
+    Follow a lookup path (payment__mode, name__icontains) to the (model, field) it filters on
+    """
+    field = None
+    for part in path.split("__"):
+        if field is not None:
+            if not field.is_relation:
+                # Trailing lookup, e.g icontains
+                break
+            related_model = field.related_model
+        else:
+            related_model = model
+        try:
+            field = related_model._meta.get_field(part)
+        except FieldDoesNotExist:
+            break
+        model = related_model
+    return model, field
+
+
+def unindexed_fields(model, paths):
+    for path in paths:
+        field_model, field = resolve_field(model, path.lstrip(SEARCH_PREFIXES))
+        if field is None or not field.concrete:
+            continue
+        if field.column not in indexed_columns(field_model):
+            yield path, field_model, field
+
+
+def filtered_paths():
+    """
+    Yield (source, model, filter or search paths) of the GraphQL nodes and the admin. Admin
+    searches only count where an index can serve them, icontains can't use one
+    """
+    from . import query  # noqa: F401 registers the nodes
+
+    for model, node in get_global_registry()._registry.items():
+        filter_fields = getattr(node._meta, "filter_fields", None)
+        if filter_fields:
+            yield node.__name__, model, list(filter_fields)
+
+    for model, model_admin in admin.site._registry.items():
+        # Searches of these go through the full-text index
+        if is_searchable(model):
+            continue
+        paths = [path for path in model_admin.search_fields if path[:1] in INDEXED_SEARCH_PREFIXES]
+        if paths:
+            yield model_admin.__class__.__name__, model, paths
+
+
+@register(Tags.models)
+def check_filter_indexes(app_configs=None, **kwargs):
+    """
+    Warn about filter and search fields whose lookups have no index to use
+    """
+    warnings = []
+    for source, model, paths in filtered_paths():
+        if app_configs is not None and model._meta.app_config not in app_configs:
+            continue
+        for path, field_model, field in unindexed_fields(model, paths):
+            warnings.append(
+                Warning(
+                    "{}.{} filters on {}.{} which has no index.".format(
+                        source, path, field_model._meta.label, field.name
+                    ),
+                    hint="Add an index led by '{}' to {}.Meta.indexes.".format(field.name, field_model.__name__),
+                    obj=model,
+                    id="app.W001",
+                )
+            )
+    return warnings
@@ -0,0 +1,244 @@
+from collections import OrderedDict
+from threading import Lock
+from django.conf import settings
+from graphene_django.settings import graphene_settings
+from graphql import GraphQLError, GraphQLInt, get_named_type, get_operation_ast, is_object_type
+from graphql.language.ast import FieldNode, FragmentDefinitionNode, FragmentSpreadNode, VariableNode
+from graphql.utilities import value_from_ast
+
+MAX_CACHED_COST_PLANS = 512
+
+DEFAULT_QUERY_COST = {
+    # deepest allowed nesting of fields, connection edges/node wrappers are not counted
+    "MAX_DEPTH": 10,
+    # highest allowed estimated number of resolved fields per request
+    "MAX_COST": 50000,
+    # cost of resolving a single field
+    "FIELD_COST": 1,
+    # page size assumed when a connection is queried without first/last
+    "DEFAULT_PAGE_SIZE": None,
+}
+
+
+def get_query_cost_settings():
+    cost_settings = dict(DEFAULT_QUERY_COST)
+    cost_settings.update(getattr(settings, "GRAPHQL_QUERY_COST", {}))
+    if cost_settings["DEFAULT_PAGE_SIZE"] is None:
+        cost_settings["DEFAULT_PAGE_SIZE"] = graphene_settings.RELAY_CONNECTION_MAX_LIMIT or 100
+    return cost_settings
+
+
+def is_connection_type(graphql_type):
+    return is_object_type(graphql_type) and graphql_type.name.endswith("Connection") and "edges" in graphql_type.fields
+
+
+class QueryCost:
+    """
+    Result of the static analysis of one operation
+    """
+
+    def __init__(self, max_depth, max_cost):
+        self.max_depth = max_depth
+        self.max_cost = max_cost
+        self.depth = 0
+        self.cost = 0
+
+    def as_extension(self):
+        return {"requested": self.cost, "maximum": self.max_cost, "depth": self.depth, "max_depth": self.max_depth}
+
+
+class CostPlan:
+    """
+    Cost of a selection with its page sizes left open: the fixed cost plus, per connection, its
+    page size times the cost of one of its nodes. Page sizes given as variables are read per request
+    """
+
+    def __init__(self, cost=0):
+        self.cost = cost
+        self.connections = []
+
+    def add(self, plan):
+        self.cost += plan.cost
+        self.connections += plan.connections
+
+    def evaluate(self, page_size):
+        return self.cost + sum(page_size(pages) * plan.evaluate(page_size) for pages, plan in self.connections)
+
+
+class CostPlanner:
+    """
+    Compiles the cost of an operation into a CostPlan, fragments are resolved against their type condition
+    """
+
+    def __init__(self, schema, document, cost_settings):
+        self.schema = schema
+        self.fragments = {
+            definition.name.value: definition
+            for definition in document.definitions
+            if isinstance(definition, FragmentDefinitionNode)
+        }
+        self.field_cost = cost_settings["FIELD_COST"]
+        self.default_page_size = cost_settings["DEFAULT_PAGE_SIZE"]
+
+    def page_size(self, field_node):
+        """
+        The page size of a connection field, or the first/last argument values to read it from per request
+        """
+        values = []
+        for argument in field_node.arguments:
+            if argument.name.value in ("first", "last"):
+                if isinstance(argument.value, VariableNode):
+                    values.append(argument.value)
+                    continue
+                value = value_from_ast(argument.value, GraphQLInt)
+                if isinstance(value, int):
+                    return tuple(values) + (value,) if values else value
+        return tuple(values) + (self.default_page_size,) if values else self.default_page_size
+
+    def fields(self, parent_type, selection_set, visited):
+        """
+        Yield (field node, field definition) pairs, resolving fragments against their type condition
+        """
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                name = selection.name.value
+                if name.startswith("__") or not hasattr(parent_type, "fields"):
+                    continue
+                definition = parent_type.fields.get(name)
+                if definition is not None:
+                    yield selection, definition
+                continue
+
+            if isinstance(selection, FragmentSpreadNode):
+                name = selection.name.value
+                fragment = self.fragments.get(name)
+                if fragment is None or name in visited:
+                    continue
+                visited = visited | {name}
+            else:
+                fragment = selection
+
+            fragment_type = parent_type
+            if fragment.type_condition is not None:
+                fragment_type = self.schema.get_type(fragment.type_condition.name.value) or parent_type
+            yield from self.fields(fragment_type, fragment.selection_set, visited)
+
+    def measure(self, parent_type, selection_set, depth, visited=frozenset()):
+        """
+        Return (plan, depth) of a selection set
+        """
+        total, deepest = CostPlan(), depth
+        for field_node, definition in self.fields(parent_type, selection_set, visited):
+            field_type = get_named_type(definition.type)
+            plan, field_depth = CostPlan(self.field_cost), depth + 1
+
+            if field_node.selection_set is not None and is_connection_type(field_type):
+                page_size = self.page_size(field_node)
+                for child, child_definition in self.fields(field_type, field_node.selection_set, visited):
+                    child_type = get_named_type(child_definition.type)
+                    if child.name.value == "edges" and child.selection_set is not None:
+                        for node, node_definition in self.fields(child_type, child.selection_set, visited):
+                            if node.selection_set is None:
+                                continue
+                            node_plan, node_depth = self.measure(
+                                get_named_type(node_definition.type), node.selection_set, depth + 1, visited
+                            )
+                            plan.connections.append((page_size, node_plan))
+                            field_depth = max(field_depth, node_depth)
+                    elif child.selection_set is not None:
+                        plan.add(self.measure(child_type, child.selection_set, depth + 1, visited)[0])
+                    else:
+                        plan.cost += self.field_cost
+
+            elif field_node.selection_set is not None:
+                child_plan, field_depth = self.measure(field_type, field_node.selection_set, depth + 1, visited)
+                plan.add(child_plan)
+
+            total.add(plan)
+            deepest = max(deepest, field_depth)
+        return total, deepest
+
+
+class CostPlanCache:
+    """
+    Process wide LRU of (operation node, plan, depth) per cached document and operation. Entries
+    hold their document, so the id of a document in a live entry can't be reused by another one
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.plans = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, schema, document, operation_name, cost_settings):
+        key = (id(document), operation_name, cost_settings["FIELD_COST"], cost_settings["DEFAULT_PAGE_SIZE"])
+        with self.lock:
+            entry = self.plans.get(key)
+            if entry is not None and entry[0] is document:
+                self.plans.move_to_end(key)
+                return entry[1]
+
+        operation = get_operation_ast(document, operation_name)
+        root_type = schema.get_root_type(operation.operation) if operation is not None else None
+        if root_type is None:
+            compiled = None
+        else:
+            plan, depth = CostPlanner(schema, document, cost_settings).measure(root_type, operation.selection_set, 0)
+            compiled = (operation, plan, depth)
+
+        with self.lock:
+            self.plans[key] = (document, compiled)
+            self.plans.move_to_end(key)
+            while len(self.plans) > self.max_size:
+                self.plans.popitem(last=False)
+        return compiled
+
+    def clear(self):
+        with self.lock:
+            self.plans.clear()
+
+
+cost_plan_cache = CostPlanCache(MAX_CACHED_COST_PLANS)
+
+
+def check_query_cost(schema, document, variables=None, operation_name=None, cost_settings=None):
+    """
+    Measure the depth and cost of the executed operation, returns (QueryCost, errors) where
+    errors reject requests over the limits. The plan of a document is compiled once, each
+    request only reads its page sizes from the variables
+    """
+    cost_settings = cost_settings or get_query_cost_settings()
+    query_cost = QueryCost(cost_settings["MAX_DEPTH"], cost_settings["MAX_COST"])
+    compiled = cost_plan_cache.get(schema, document, operation_name, cost_settings)
+    if compiled is None:
+        return query_cost, []
+    operation, plan, query_cost.depth = compiled
+
+    def page_size(pages):
+        if isinstance(pages, int):
+            return pages
+        for value_node in pages[:-1]:
+            value = value_from_ast(value_node, GraphQLInt, variables)
+            if isinstance(value, int):
+                return value
+        return pages[-1]
+
+    query_cost.cost = plan.evaluate(page_size)
+    errors = []
+    if query_cost.depth > query_cost.max_depth:
+        errors.append(
+            GraphQLError(
+                "Query depth {} exceeds the maximum depth of {}.".format(query_cost.depth, query_cost.max_depth),
+                operation,
+                extensions={"code": "MAX_DEPTH_EXCEEDED", "cost": query_cost.as_extension()},
+            )
+        )
+    if query_cost.cost > query_cost.max_cost:
+        errors.append(
+            GraphQLError(
+                "Query cost {} exceeds the maximum cost of {}.".format(query_cost.cost, query_cost.max_cost),
+                operation,
+                extensions={"code": "MAX_COST_EXCEEDED", "cost": query_cost.as_extension()},
+            )
+        )
+    return query_cost, errors
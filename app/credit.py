@@ -0,0 +1,52 @@
+from collections import namedtuple
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import Creditor, CreditTransaction
+from .summaries import refresh_on_commit
+
+CreditCheck = namedtuple(
+    "CreditCheck", ["creditor_id", "balance", "limit_warning", "limit_stop_credit", "projected_balance"]
+)
+
+
+class CreditLimitExceeded(Exception):
+    pass
+
+
+def credit_check(creditor_id, amount):
+    """
+    Balance and limits of a creditor as they would stand after a sale of amount, one primary key read
+    """
+    row = (
+        Creditor.objects.filter(pk=creditor_id)
+        .values_list("balance", "limit_warning", "limit_stop_credit")
+        .first()
+    )
+    if row is None:
+        return None
+    balance, limit_warning, limit_stop_credit = row
+    return CreditCheck(creditor_id, balance, limit_warning, limit_stop_credit, balance + amount)
+
+
+def post_transaction(creditor_id, amount, note="", enforce_limit=True, fuel_id=None):
+    """
+    Append a ledger entry and move the creditor balance by amount in the same transaction.
+    Credit sales that would take the balance over limit_stop_credit raise CreditLimitExceeded,
+    the limit is checked by the UPDATE itself so concurrent sales can't both slip through.
+    fuel_id attributes a credit sale to a fuel in the daily summaries
+    """
+    with transaction.atomic():
+        creditors = Creditor.objects.filter(pk=creditor_id)
+        if enforce_limit and amount > 0:
+            creditors = creditors.filter(balance__lte=F("limit_stop_credit") - amount)
+        if not creditors.update(balance=F("balance") + amount):
+            if not Creditor.objects.filter(pk=creditor_id).exists():
+                raise Creditor.DoesNotExist("creditor does not exist")
+            raise CreditLimitExceeded("credit limit exceeded")
+        credit_transaction = CreditTransaction.objects.create(
+            creditor_id=creditor_id, fuel_id=fuel_id, amount=amount, note=note
+        )
+        if amount > 0:
+            refresh_on_commit([timezone.localdate(credit_transaction.created_at)])
+        return credit_transaction
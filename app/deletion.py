@@ -0,0 +1,90 @@
+import logging
+from collections import Counter
+from django.db import connection, transaction
+from django.db.models import CASCADE, SET_NULL
+from django.db.models.deletion import Collector, get_candidate_relations_to_delete
+from .search import is_searchable, update_documents
+
+logger = logging.getLogger(__name__)
+
+# Rows loaded per batch, bounded by the parameters one query may carry (999 on sqlite)
+DELETE_CHUNK_SIZE = 900
+# Rows per DELETE of dependents without delete signals or dependents of their own, deleted by pk range unloaded
+FAST_DELETE_CHUNK_SIZE = 10000
+
+
+def chunk_size_limit(chunk_size):
+    return min(chunk_size, connection.features.max_query_params or chunk_size)
+
+
+def report(model, progress, deleted):
+    logger.info("deleted %d %s", deleted[model._meta.label], model._meta.label)
+    if progress is not None:
+        progress(model, deleted[model._meta.label])
+
+
+def fast_delete_rows(queryset, progress, deleted):
+    pks = queryset.order_by("pk").values_list("pk", flat=True)
+    while True:
+        last = list(pks[FAST_DELETE_CHUNK_SIZE - 1:FAST_DELETE_CHUNK_SIZE])
+        count, per_model = (queryset.filter(pk__lte=last[0]) if last else queryset).delete()
+        if count:
+            deleted.update(per_model)
+            report(queryset.model, progress, deleted)
+        if not last:
+            return
+
+
+def delete_rows(queryset, chunk_size, progress, deleted):
+    model = queryset.model
+    relations = list(get_candidate_relations_to_delete(model._meta))
+    pks = queryset.order_by("pk").values_list("pk", flat=True)
+    while True:
+        batch = list(pks[:chunk_size])
+        if not batch:
+            return
+        with transaction.atomic():
+            parents = model._base_manager.filter(pk__in=batch)
+            for relation in relations:
+                field = relation.field
+                related = relation.related_model._base_manager.filter(**{"%s__in" % field.name: parents})
+                if field.remote_field.on_delete is CASCADE:
+                    # Searchable rows go by loaded batches, their pks are dropped from the search index
+                    if Collector(using=related.db).can_fast_delete(related) and not is_searchable(related.model):
+                        fast_delete_rows(related, progress, deleted)
+                    else:
+                        delete_rows(related, chunk_size, progress, deleted)
+                elif field.remote_field.on_delete is SET_NULL:
+                    related.update(**{field.name: None})
+            # Dependents are gone, Django's collector only loads this batch (and applies any
+            # other on_delete rule and the delete signals)
+            count, per_model = parents.delete()
+            update_documents(model, batch, parents.db)
+        deleted.update(per_model)
+        report(model, progress, deleted)
+
+
+def chunked_delete(queryset, chunk_size=DELETE_CHUNK_SIZE, progress=None):
+    """
+    Delete the rows of queryset and everything cascading from them, dependents first, never
+    loading more than chunk_size rows at a time (QuerySet.delete() loads every dependent row
+    that has delete signals or dependents of its own, and deletes the others in one statement).
+    Each top level batch is deleted in one transaction, progress(model, deleted so far) is
+    called after every batch. Returns (deleted, {model label: deleted}) like QuerySet.delete()
+    """
+    deleted = Counter()
+    delete_rows(queryset, chunk_size_limit(chunk_size), progress, deleted)
+    return sum(deleted.values()), dict(deleted)
+
+
+def cascade_counts(queryset):
+    """
+    {model: rows} that deleting queryset would delete, counted with subqueries
+    """
+    counts = Counter({queryset.model: queryset.count()})
+    for relation in get_candidate_relations_to_delete(queryset.model._meta):
+        field = relation.field
+        if field.remote_field.on_delete is CASCADE:
+            related = relation.related_model._base_manager.filter(**{"%s__in" % field.name: queryset})
+            counts.update(cascade_counts(related))
+    return counts
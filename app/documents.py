@@ -0,0 +1,131 @@
+import hashlib
+import json
+from collections import OrderedDict
+from threading import Lock
+from django.conf import settings
+from django.core.cache import cache
+from graphql import GraphQLError, parse, validate
+
+DEFAULT_DOCUMENT_CACHE = {
+    # parsed + validated documents kept per process
+    "MAX_SIZE": 512,
+    # accept sha256 only requests (automatic persisted queries)
+    "PERSISTED_QUERIES": True,
+    # seconds a persisted query stays in the django cache, None keeps it forever
+    "PERSISTED_QUERY_TIMEOUT": None,
+}
+
+
+def get_document_cache_settings():
+    document_settings = dict(DEFAULT_DOCUMENT_CACHE)
+    document_settings.update(getattr(settings, "GRAPHQL_DOCUMENT_CACHE", {}))
+    return document_settings
+
+
+def query_hash(query):
+    return hashlib.sha256(query.encode("utf-8")).hexdigest()
+
+
+def get_persisted_query_hash(request, data):
+    """
+    Read the sha256 hash of an automatic persisted query from the request extensions
+    """
+    extensions = request.GET.get("extensions") or data.get("extensions")
+    if isinstance(extensions, str):
+        try:
+            extensions = json.loads(extensions)
+        except ValueError:
+            return None
+    if not isinstance(extensions, dict):
+        return None
+    persisted_query = extensions.get("persistedQuery") or {}
+    return persisted_query.get("sha256Hash")
+
+
+class DocumentCache:
+    """
+    Process wide LRU of parsed and validated GraphQL documents, keyed by the sha256 of the query text
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.documents = OrderedDict()
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.persisted_hits = 0
+        self.persisted_misses = 0
+
+    def lookup(self, key):
+        with self.lock:
+            entry = self.documents.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.documents.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def store(self, key, entry):
+        with self.lock:
+            self.documents[key] = entry
+            self.documents.move_to_end(key)
+            while len(self.documents) > self.max_size:
+                self.documents.popitem(last=False)
+
+    def build(self, schema, key, query):
+        document = parse(query)
+        entry = (document, validate(schema, document))
+        self.store(key, entry)
+        return entry
+
+    def get(self, schema, query, key=None):
+        """
+        Return (document, validation errors) for the query, parsing and validating it only once.
+        Parse errors are raised as GraphQLError and never cached
+        """
+        key = key or query_hash(query)
+        return self.lookup(key) or self.build(schema, key, query)
+
+    def get_persisted(self, schema, key, query=None, timeout=None):
+        """
+        Resolve an automatic persisted query, registering the query text when the client sends it
+        """
+        store_key = "graphql:persisted:{}".format(key)
+        if query:
+            if query_hash(query) != key:
+                raise GraphQLError(
+                    "provided sha does not match query", extensions={"code": "PERSISTED_QUERY_HASH_MISMATCH"}
+                )
+            cache.set(store_key, query, timeout)
+            return self.get(schema, query, key)
+
+        entry = self.lookup(key)
+        if entry is None:
+            query = cache.get(store_key)
+            if query is None:
+                self.persisted_misses += 1
+                raise GraphQLError("PersistedQueryNotFound", extensions={"code": "PERSISTED_QUERY_NOT_FOUND"})
+            entry = self.build(schema, key, query)
+
+        self.persisted_hits += 1
+        return entry
+
+    def stats(self):
+        with self.lock:
+            return {
+                "size": len(self.documents),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "persisted_hits": self.persisted_hits,
+                "persisted_misses": self.persisted_misses,
+            }
+
+    def clear(self):
+        with self.lock:
+            self.documents.clear()
+            self.hits = self.misses = self.persisted_hits = self.persisted_misses = 0
+
+
+document_cache = DocumentCache(get_document_cache_settings()["MAX_SIZE"])
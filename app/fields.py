@@ -0,0 +1,165 @@
+from django.db.models.query import QuerySet
+from graphene import Int, relay
+from graphene.relay.connection import PageInfo
+from graphene_django.filter import DjangoFilterConnectionField
+from graphene_django.utils import maybe_queryset
+from graphql import GraphQLError
+from graphql_relay.utils import base64, unbase64
+from .loaders import get_loaders
+from .optimizer import optimize_queryset
+from .results import result_cache
+
+PAGINATION_ARGS = ("first", "last", "before", "after", "offset")
+KEYSET_PREFIX = "keyset:"
+
+
+class CountableConnection(relay.Connection):
+    """
+    Connection exposing totalCount, the count query only runs when the field is selected
+    """
+
+    class Meta:
+        abstract = True
+
+    total_count = Int()
+
+    def resolve_total_count(self, info, **kwargs):
+        if isinstance(self.iterable, QuerySet):
+            return self.iterable.count()
+        return len(self.iterable)
+
+
+class BatchedConnectionField(DjangoFilterConnectionField):
+    """
+    Connection field that only reads the columns and relations the client selected, and
+    registers every resolved page with the request loaders, so foreign keys and reverse
+    sets of the page rows are fetched in one query each
+    """
+
+    @classmethod
+    def resolve_queryset(cls, connection, iterable, info, args, filtering_args, filterset_class):
+        # Already batched by a loader, there is nothing left to filter in the database
+        if isinstance(iterable, list):
+            return iterable
+        queryset = super().resolve_queryset(
+            connection, iterable, info, args, filtering_args=filtering_args, filterset_class=filterset_class
+        )
+        return optimize_queryset(queryset, info)
+
+    @classmethod
+    def connection_resolver(cls, resolver, connection, default_manager, queryset_resolver, max_limit,
+                            enforce_first_or_last, root, info, **args):
+        result = super().connection_resolver(
+            resolver, connection, default_manager, queryset_resolver, max_limit, enforce_first_or_last, root,
+            info, **args
+        )
+        get_loaders(info.context).queue_page(
+            connection._meta.node._meta.model, [edge.node for edge in result.edges]
+        )
+        return result
+
+
+def is_filtered(args):
+    return any(value is not None for name, value in args.items() if name not in PAGINATION_ARGS)
+
+
+def keyset_to_cursor(key):
+    return base64("{}{}".format(KEYSET_PREFIX, key))
+
+
+def cursor_to_keyset(cursor, model):
+    if cursor is None:
+        return None
+    try:
+        value = unbase64(cursor)
+        if not value.startswith(KEYSET_PREFIX):
+            raise ValueError(value)
+        return model._meta.pk.to_python(value[len(KEYSET_PREFIX):])
+    except Exception:
+        raise GraphQLError("Invalid cursor: {}".format(cursor))
+
+
+class KeysetConnectionField(BatchedConnectionField):
+    """
+    Drop-in connection field paginating on the primary key: cursors hold the last seen id, so
+    `after` becomes `WHERE id > ?` (an index seek) and no COUNT(*) runs unless totalCount is selected
+    """
+
+    @classmethod
+    def resolve_connection(cls, connection, args, iterable, max_limit=None):
+        iterable = maybe_queryset(iterable)
+        model = connection._meta.node._meta.model
+        first, last, offset = args.get("first"), args.get("last"), args.get("offset") or 0
+        after = cursor_to_keyset(args.get("after"), model)
+        before = cursor_to_keyset(args.get("before"), model)
+
+        for name, value in (("first", first), ("last", last), ("offset", offset)):
+            if value is not None and value < 0:
+                raise GraphQLError("Argument '{}' must be a non-negative integer.".format(name))
+
+        if max_limit is not None and first is None and last is None:
+            first = max_limit
+
+        if isinstance(iterable, QuerySet):
+            rows = iterable
+            if after is not None:
+                rows = rows.filter(pk__gt=after)
+            if before is not None:
+                rows = rows.filter(pk__lt=before)
+            forward, backward = rows.order_by("pk"), rows.order_by("-pk")
+        else:
+            rows = sorted(
+                (row for row in iterable
+                 if (after is None or row.pk > after) and (before is None or row.pk < before)),
+                key=lambda row: row.pk,
+            )
+            forward, backward = rows, rows[::-1]
+
+        if first is None:
+            # Paginating backwards only, read the tail of the window in reverse order
+            nodes = list(backward[:last + 1])
+            has_previous_page = len(nodes) > last
+            nodes = nodes[:last][::-1]
+            has_next_page = before is not None
+        else:
+            nodes = list(forward[offset:offset + first + 1])
+            has_next_page = len(nodes) > first
+            nodes = nodes[:first]
+            has_previous_page = after is not None or offset > 0
+            if last is not None and len(nodes) > last:
+                nodes = nodes[-last:]
+                has_previous_page = True
+
+        edges = [connection.Edge(node=node, cursor=keyset_to_cursor(node.pk)) for node in nodes]
+        result = connection(
+            edges=edges,
+            page_info=PageInfo(
+                start_cursor=edges[0].cursor if edges else None,
+                end_cursor=edges[-1].cursor if edges else None,
+                has_previous_page=has_previous_page,
+                has_next_page=has_next_page,
+            ),
+        )
+        result.iterable = iterable
+        return result
+
+
+class CachedConnectionField(KeysetConnectionField):
+    """
+    Connection over read-mostly reference data. The filtered rows are cached per filter
+    arguments and invalidated whenever the model version changes (see app.signals)
+    """
+
+    @classmethod
+    def resolve_queryset(cls, connection, iterable, info, args, filtering_args, filterset_class):
+        if isinstance(iterable, list):
+            return iterable
+
+        def load():
+            queryset = DjangoFilterConnectionField.resolve_queryset(
+                connection, iterable, info, args, filtering_args=filtering_args, filterset_class=filterset_class
+            )
+            return list(queryset.order_by("pk"))
+
+        arguments = {name: value for name, value in args.items() if name in filtering_args}
+        return result_cache.get_or_load(connection._meta.node._meta.model, arguments, load)
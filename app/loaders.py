@@ -0,0 +1,158 @@
+from collections import defaultdict
+
+
+class ModelLoader:
+    """
+    Batch primary key lookups for one model within a single request
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.cache = {}
+        self.pending = set()
+
+    def key(self, value):
+        return self.model._meta.pk.to_python(value)
+
+    def queue(self, keys):
+        for key in keys:
+            if key is not None:
+                key = self.key(key)
+                if key not in self.cache:
+                    self.pending.add(key)
+
+    def prime(self, instances):
+        for instance in instances:
+            # Rows loaded through only() may lack columns another selection needs
+            if instance.get_deferred_fields():
+                continue
+            self.cache[instance.pk] = instance
+            self.pending.discard(instance.pk)
+
+    def load(self, key):
+        if key is None:
+            return None
+        key = self.key(key)
+        if key not in self.cache:
+            self.pending.add(key)
+            self.dispatch()
+        return self.cache.get(key)
+
+    def dispatch(self):
+        keys, self.pending = self.pending, set()
+        found = self.model._default_manager.in_bulk(keys)
+        for key in keys:
+            self.cache[key] = found.get(key)
+
+
+class RelatedSetLoader:
+    """
+    Batch reverse foreign key lookups (e.g. fuel.machine_set) for many parents at once
+    """
+
+    def __init__(self, relation):
+        self.model = relation.related_model
+        self.field = relation.field
+        self.cache = {}
+        self.pending = set()
+
+    def queue(self, keys):
+        self.pending.update(key for key in keys if key not in self.cache)
+
+    def prime(self, key, instances):
+        self.cache[key] = list(instances)
+        self.pending.discard(key)
+
+    def load(self, key):
+        if key not in self.cache:
+            self.pending.add(key)
+            self.dispatch()
+        return self.cache[key]
+
+    def dispatch(self):
+        keys, self.pending = self.pending, set()
+        groups = defaultdict(list)
+        queryset = self.model._default_manager.filter(
+            **{"{}__in".format(self.field.attname): keys}
+        ).order_by("pk")
+        for instance in queryset:
+            groups[getattr(instance, self.field.attname)].append(instance)
+        for key in keys:
+            self.cache[key] = groups[key]
+
+
+class Loaders:
+    """
+    Per-request registry of loaders, created lazily on first use
+    """
+
+    def __init__(self):
+        self.models = {}
+        self.related = {}
+
+    def model(self, model):
+        if model not in self.models:
+            self.models[model] = ModelLoader(model)
+        return self.models[model]
+
+    def related_set(self, model, accessor):
+        key = (model, accessor)
+        if key not in self.related:
+            relation = next(
+                rel for rel in model._meta.related_objects if rel.get_accessor_name() == accessor
+            )
+            self.related[key] = RelatedSetLoader(relation)
+        return self.related[key]
+
+    def queue_page(self, model, instances):
+        """
+        Remember the foreign keys and primary keys of a resolved page so the first
+        lookup on any row fetches the related rows of the whole page in one query
+        """
+        if not instances:
+            return
+
+        self.model(model).prime(instances)
+        deferred = instances[0].get_deferred_fields()
+
+        for field in model._meta.concrete_fields:
+            if not (field.is_relation and field.many_to_one) or field.attname in deferred:
+                continue
+            # Rows fetched with select_related are resolved straight from the instance, the
+            # relations of those rows are batched like the ones of the page
+            self.model(field.related_model).queue(
+                getattr(instance, field.attname) for instance in instances if not field.is_cached(instance)
+            )
+            related = {}
+            for instance in instances:
+                if field.is_cached(instance):
+                    parent = getattr(instance, field.name)
+                    if parent is not None:
+                        related.setdefault(parent.pk, parent)
+            self.queue_page(field.related_model, list(related.values()))
+
+        for relation in model._meta.related_objects:
+            if not relation.one_to_many:
+                continue
+            accessor = relation.get_accessor_name()
+            loader = self.related_set(model, accessor)
+            for instance in instances:
+                prefetched = getattr(instance, "_prefetched_objects_cache", {})
+                if accessor in prefetched:
+                    loader.prime(instance.pk, prefetched[accessor])
+            loader.queue(instance.pk for instance in instances)
+
+    def clear(self):
+        self.models.clear()
+        self.related.clear()
+
+
+def get_loaders(context):
+    """
+    Return the loaders attached to the request, creating them on first access
+    """
+    loaders = getattr(context, "loaders", None)
+    if loaders is None:
+        loaders = Loaders()
+        context.loaders = loaders
+    return loaders
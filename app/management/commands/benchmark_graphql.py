@@ -0,0 +1,79 @@
+import asyncio
+import json
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import AsyncClient, Client, override_settings
+from django.urls import path
+from graphql_jwt.shortcuts import get_token
+from app.models import Fuel, Machine, User
+from app.views import AsyncGraphQLView, CachedGraphQLView
+
+# The benchmark serves both views side by side through its own URLconf
+urlpatterns = [
+    path("graphql", CachedGraphQLView.as_view(graphiql=False)),
+    path("graphql-async", AsyncGraphQLView.as_view(graphiql=False)),
+]
+
+QUERY = "{ machines(first: 50) { edges { node { name reading fuel { type price } } } } }"
+
+
+class Command(BaseCommand):
+    help = "Compare /graphql throughput of the WSGI (sync worker) path and the ASGI (async view) path"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500, help="requests sent to each path")
+        parser.add_argument("--concurrency", type=int, default=50, help="requests in flight on the ASGI path")
+        parser.add_argument("--machines", type=int, default=200, help="machines seeded in the test database")
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            with override_settings(ROOT_URLCONF=__name__):
+                self.run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def seed(self, machines):
+        fuels = Fuel.objects.bulk_create([Fuel(type="fuel {}".format(i), price=100 + i) for i in range(5)])
+        Machine.objects.bulk_create(
+            [Machine(fuel=fuels[i % len(fuels)], name="pump {}".format(i), reading=i) for i in range(machines)]
+        )
+        user = User.objects.create_superuser(username="0000000000", password="benchmark", name="benchmark")
+        return get_token(user)
+
+    def run(self, options):
+        token = self.seed(options["machines"])
+        headers = {"HTTP_AUTHORIZATION": "JWT {}".format(token)}
+        body = json.dumps({"query": QUERY})
+        total = options["requests"]
+
+        client = Client()
+        started = time.perf_counter()
+        for _ in range(total):
+            response = client.post("/graphql", body, content_type="application/json", **headers)
+            if response.status_code != 200:
+                raise CommandError(response.content)
+        wsgi_rps = total / (time.perf_counter() - started)
+
+        async def run_async():
+            client = AsyncClient()
+            semaphore = asyncio.Semaphore(options["concurrency"])
+
+            async def request():
+                async with semaphore:
+                    response = await client.post("/graphql-async", body, content_type="application/json", **headers)
+                    if response.status_code != 200:
+                        raise CommandError(response.content)
+
+            started = time.perf_counter()
+            await asyncio.gather(*[request() for _ in range(total)])
+            return total / (time.perf_counter() - started)
+
+        asgi_rps = asyncio.run(run_async())
+
+        self.stdout.write("WSGI  (sync view, 1 request at a time): {:8.1f} req/s".format(wsgi_rps))
+        self.stdout.write(
+            "ASGI  (async view, {} in flight):       {:8.1f} req/s".format(options["concurrency"], asgi_rps)
+        )
@@ -0,0 +1,57 @@
+import time
+from collections import Counter
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from app.anomalies import DEFAULT_SETTINGS, detect_anomalies, store_anomalies
+from app.models import Machine
+
+
+class Command(BaseCommand):
+    help = (
+        "Scan the machine reading history for meter rollbacks, stuck meters and impossible jumps and store "
+        "the flagged readings shown on the report page"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=365, help="history scanned, counted back from now")
+        parser.add_argument("--all", action="store_true", help="scan the whole history")
+        parser.add_argument("--machine", action="append", help="machine name, may be repeated (default all)")
+        parser.add_argument("--window", type=int, default=DEFAULT_SETTINGS.window)
+        parser.add_argument("--step", type=int, default=DEFAULT_SETTINGS.step)
+        parser.add_argument("--threshold", type=float, default=DEFAULT_SETTINGS.threshold)
+        parser.add_argument("--stuck-hours", type=float, default=DEFAULT_SETTINGS.stuck_hours)
+        parser.add_argument("--dry-run", action="store_true", help="print the anomalies without storing them")
+
+    def handle(self, *args, **options):
+        if options["window"] < 1 or options["step"] < 1:
+            raise CommandError("--window and --step must be positive")
+        settings = DEFAULT_SETTINGS._replace(
+            window=options["window"], step=options["step"], threshold=options["threshold"],
+            stuck_hours=options["stuck_hours"],
+        )
+
+        machine_ids = None
+        if options["machine"]:
+            machine_ids = list(Machine.objects.filter(name__in=options["machine"]).values_list("pk", flat=True))
+            if not machine_ids:
+                raise CommandError("No machine named {}".format(", ".join(options["machine"])))
+        start = None if options["all"] else timezone.now() - timedelta(days=options["days"])
+
+        started = time.perf_counter()
+        flagged = detect_anomalies(start, None, machine_ids, settings)
+        elapsed = time.perf_counter() - started
+
+        if options["dry_run"]:
+            for anomaly, recorded_at, until in flagged:
+                self.stdout.write("{} machine {} at {}: reading {:.2f}, delta {:.2f}, score {:.2f}".format(
+                    anomaly.kind, anomaly.machine_id, recorded_at, anomaly.reading, anomaly.delta, anomaly.score
+                ))
+        else:
+            store_anomalies(flagged, start, None, machine_ids)
+
+        kinds = Counter(anomaly.kind for anomaly, recorded_at, until in flagged)
+        self.stdout.write("Flagged {} anomalies ({}) in {:.1f}s".format(
+            len(flagged), ", ".join("{} {}".format(count, kind) for kind, count in sorted(kinds.items())) or "none",
+            elapsed,
+        ))
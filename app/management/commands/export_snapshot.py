@@ -0,0 +1,30 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from app.snapshot import SNAPSHOT_TABLES, export_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Export fuels, machines, payments, creditors and the reading and credit history as one NumPy .npy "
+        "file per column plus manifest.json, memory mappable for offline analysis. Reading and ledger "
+        "history is exported incrementally past the primary key watermark of the previous export"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="snapshot directory, created if missing")
+        parser.add_argument("--table", action="append", choices=sorted(SNAPSHOT_TABLES), help="may be repeated (default all)")
+        parser.add_argument("--full", action="store_true", help="re-export from scratch, merging incremental parts")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            manifest = export_snapshot(options["path"], options["table"], options["full"])
+        except OSError as e:
+            raise CommandError("Snapshot export failed: {}".format(e))
+
+        for name in options["table"] or SNAPSHOT_TABLES:
+            entry = manifest["tables"][name]
+            self.stdout.write("{}: {} rows in {} parts, watermark {}".format(
+                name, entry["rows"], len(entry["parts"]), entry["watermark"]
+            ))
+        self.stdout.write("Exported to {} in {:.1f}s".format(options["path"], time.perf_counter() - started))
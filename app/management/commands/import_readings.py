@@ -0,0 +1,171 @@
+import csv
+import json
+import sys
+import time
+from datetime import datetime
+from itertools import islice
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from app.models import Machine
+from app.readings import ReadingEntry, readings_before, record_readings, sync_machine_readings
+
+COLUMNS = ("machine", "recorded_at", "reading")
+
+
+def read_csv(stream):
+    reader = csv.reader(stream)
+    header = next(reader, None)
+    if header is None:
+        return
+    try:
+        positions = [header.index(column) for column in COLUMNS]
+    except ValueError:
+        raise CommandError("CSV header must contain the columns {}".format(", ".join(COLUMNS)))
+    for row in reader:
+        try:
+            yield tuple(row[position] for position in positions)
+        except IndexError:
+            yield (None, None, None)
+
+
+def read_jsonl(stream):
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+            yield tuple(item.get(column) for column in COLUMNS)
+        except (ValueError, AttributeError):
+            yield (None, None, None)
+
+
+READERS = {"csv": read_csv, "jsonl": read_jsonl}
+
+
+def parse_moment(value, tzinfo):
+    try:
+        moment = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        moment = parse_datetime(value) if isinstance(value, str) else None
+        if moment is None:
+            raise ValueError("invalid recorded_at {!r}".format(value))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=tzinfo)
+    return moment
+
+
+class Command(BaseCommand):
+    help = (
+        "Import historical machine readings from CSV or JSON lines (machine, recorded_at, reading) into the "
+        "reading history and its hourly / daily rollups. Rows are expected in time order per machine"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="file to import, - reads stdin")
+        parser.add_argument("--format", choices=sorted(READERS), help="defaults to the file extension")
+        parser.add_argument("--chunk-size", type=int, default=50000, help="rows validated and written per transaction")
+        parser.add_argument("--max-errors", type=int, default=20, help="rejected rows printed")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        input_format = options["format"] or path.rsplit(".", 1)[-1].lower()
+        if input_format not in READERS:
+            raise CommandError("Unknown format {}, use --format".format(input_format))
+
+        machines, ambiguous = {}, set()
+        for name, pk in Machine.objects.values_list("name", "pk"):
+            if name in machines:
+                ambiguous.add(name)
+            machines[name] = pk
+
+        stream = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+        try:
+            self.run(READERS[input_format](stream), machines, ambiguous, options)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+    def validate(self, rows, offset, machines, ambiguous, tzinfo, errors):
+        """
+        Turn one chunk of raw rows into (machine id, recorded_at, reading) column by column,
+        falling back to row by row checks to report the rejected rows when a column fails
+        """
+        names, moments, readings = zip(*rows)
+        try:
+            if ambiguous.intersection(names):
+                raise ValueError
+            machine_ids = [machines[name] for name in names]
+            # Rows of one export share their timestamps across machines, each is parsed once
+            parsed = {moment: parse_moment(moment, tzinfo) for moment in set(moments)}
+            moments = [parsed[moment] for moment in moments]
+            readings = list(map(float, readings))
+        except (KeyError, TypeError, ValueError):
+            return self.validate_rows(rows, offset, machines, ambiguous, tzinfo, errors)
+        return list(zip(machine_ids, moments, readings))
+
+    def validate_rows(self, rows, offset, machines, ambiguous, tzinfo, errors):
+        valid = []
+        for line, (name, recorded_at, reading) in enumerate(rows, start=offset):
+            try:
+                if name is None:
+                    raise ValueError("missing machine")
+                if name in ambiguous:
+                    raise ValueError("machine name {!r} matches several machines".format(name))
+                machine_id = machines.get(name)
+                if machine_id is None:
+                    raise ValueError("unknown machine {!r}".format(name))
+                valid.append((machine_id, parse_moment(recorded_at, tzinfo), float(reading)))
+            except (TypeError, ValueError) as e:
+                errors.append((line, str(e)))
+        return valid
+
+    def run(self, rows, machines, ambiguous, options):
+        tzinfo = timezone.get_current_timezone()
+        chunk_size = options["chunk_size"]
+        previous, touched, errors = {}, set(), []
+        imported = offset = 0
+        started = time.perf_counter()
+
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            valid = self.validate(chunk, offset + 1, machines, ambiguous, tzinfo, errors)
+            offset += len(chunk)
+            if not valid:
+                continue
+
+            valid.sort(key=lambda row: (row[0], row[1]))
+            # Rows are sorted, the first row of a machine is its earliest
+            new_machines = {}
+            for machine_id, recorded_at, _ in valid:
+                if machine_id not in previous and machine_id not in new_machines:
+                    new_machines[machine_id] = recorded_at
+            previous.update(readings_before(new_machines))
+
+            entries = []
+            for machine_id, recorded_at, reading in valid:
+                entries.append(ReadingEntry(machine_id, recorded_at, reading, previous.get(machine_id)))
+                previous[machine_id] = reading
+            record_readings(entries)
+            touched.update(new_machines)
+            imported += len(entries)
+
+            elapsed = time.perf_counter() - started
+            self.stdout.write("{} rows imported, {:.0f} rows/s".format(imported, imported / elapsed))
+
+        if touched:
+            sync_machine_readings(touched)
+
+        for line, message in errors[:options["max_errors"]]:
+            self.stderr.write("row {}: {}".format(line, message))
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                "Imported {} rows, rejected {} in {:.2f}s ({:.0f} rows/s)".format(
+                    imported, len(errors), elapsed, (imported + len(errors)) / elapsed if elapsed else 0
+                )
+            )
+        )
@@ -0,0 +1,58 @@
+import asyncio
+from django.core.management.base import BaseCommand
+from app.pubsub import BROKER_SUBSCRIBE
+
+
+class Command(BaseCommand):
+    help = "Relay GraphQL subscription events between workers (GRAPHQL_PUBSUB backend app.pubsub.BrokerPubSub)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument(
+            "--max-buffer", type=int, default=1024 * 1024,
+            help="Bytes of unsent events a subscriber may fall behind by before it is disconnected",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            asyncio.run(self.serve(options["host"], options["port"], options["max_buffer"]))
+        except KeyboardInterrupt:
+            pass
+
+    async def serve(self, host, port, max_buffer):
+        # Only connections that subscribed, publishers never read and would only pile up writes
+        subscribers = set()
+
+        def drop(subscriber):
+            subscribers.discard(subscriber)
+            subscriber.close()
+
+        async def relay(reader, writer):
+            try:
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    if line == BROKER_SUBSCRIBE:
+                        subscribers.add(writer)
+                        continue
+                    for subscriber in list(subscribers):
+                        try:
+                            subscriber.write(line)
+                        except (ConnectionError, RuntimeError):
+                            drop(subscriber)
+                            continue
+                        # A worker that stopped reading, it reconnects and resubscribes once it catches up
+                        if subscriber.transport.get_write_buffer_size() > max_buffer:
+                            drop(subscriber)
+            except ConnectionError:
+                pass
+            finally:
+                subscribers.discard(writer)
+                writer.close()
+
+        server = await asyncio.start_server(relay, host, port)
+        self.stdout.write("pub/sub broker listening on {}:{}".format(host, port))
+        async with server:
+            await server.serve_forever()
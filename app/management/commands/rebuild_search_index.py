@@ -0,0 +1,25 @@
+import time
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from app.search import SEARCH_DOCUMENTS, install_search_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the admin full-text search tables and index every object again, e.g. after SEARCH_DOCUMENTS "
+        "changed, ADMIN_SEARCH switched backend or rows were written past the save and delete signals"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--model", action="append", choices=sorted(SEARCH_DOCUMENTS), help="may be repeated (default all)")
+
+    def handle(self, *args, **options):
+        for label in options["model"] or SEARCH_DOCUMENTS:
+            started = time.perf_counter()
+            model = apps.get_model(label)
+            with transaction.atomic():
+                install_search_index([model])
+            self.stdout.write("{}: {} objects indexed in {:.1f}s".format(
+                label, model._base_manager.count(), time.perf_counter() - started
+            ))
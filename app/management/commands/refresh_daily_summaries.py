@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from app.summaries import all_days, refresh_days, refresh_since_watermarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Refresh the daily station summaries of the days touched by readings and credit sales added since the "
+        "last run (the commits refresh their own days, this catches up on anything they missed)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("days", nargs="*", help="refresh these days (YYYY-MM-DD) instead")
+        parser.add_argument("--all", action="store_true", help="rebuild every day, e.g. after machines changed fuel")
+
+    def handle(self, *args, **options):
+        if options["all"]:
+            days = sorted(all_days())
+            refresh_days(days)
+        elif options["days"]:
+            days = [parse_date(day) for day in options["days"]]
+            if None in days:
+                raise CommandError("Days must be given as YYYY-MM-DD")
+            refresh_days(days)
+        else:
+            days = refresh_since_watermarks()
+
+        if days:
+            self.stdout.write("Refreshed {} days ({} to {})".format(len(days), days[0], days[-1]))
+        else:
+            self.stdout.write("Daily summaries are up to date")
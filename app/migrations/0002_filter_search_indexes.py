@@ -0,0 +1,65 @@
+# Generated by Django 4.1.1 on 2026-10-18 08:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='creditor',
+            index=models.Index(fields=['payment', 'name'], name='app_credito_payment_e30943_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='creditor',
+            index=models.Index(fields=['name'], name='app_credito_name_92ab74_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='creditor',
+            index=models.Index(fields=['limit_warning'], name='app_credito_limit_w_395cc9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='creditor',
+            index=models.Index(fields=['limit_stop_credit'], name='app_credito_limit_s_ab15c4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fuel',
+            index=models.Index(fields=['price'], name='app_fuel_price_0f6c2d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='machine',
+            index=models.Index(fields=['fuel', 'name'], name='app_machine_fuel_id_b784c0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='machine',
+            index=models.Index(fields=['name'], name='app_machine_name_c740c9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='machine',
+            index=models.Index(fields=['reading'], name='app_machine_reading_607f95_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['mode'], name='app_payment_mode_5708b1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['allowed_subcategory', 'id'], name='app_payment_allowed_26cc56_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['is_staff', 'id'], name='app_user_is_staf_bf5e77_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['name'], name='app_user_name_fc39e0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['authorisation'], name='app_user_authori_b85f04_idx'),
+        ),
+    ]
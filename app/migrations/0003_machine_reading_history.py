@@ -0,0 +1,72 @@
+# Generated by Django 4.1.1 on 2026-10-18 08:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0002_filter_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MachineReading',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recorded_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('reading', models.FloatField()),
+                ('machine', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='readings', to='app.machine')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='HourlyReading',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField()),
+                ('first_reading', models.FloatField()),
+                ('last_reading', models.FloatField()),
+                ('volume', models.FloatField(default=0)),
+                ('samples', models.IntegerField(default=0)),
+                ('machine', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.machine')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyReading',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField()),
+                ('first_reading', models.FloatField()),
+                ('last_reading', models.FloatField()),
+                ('volume', models.FloatField(default=0)),
+                ('samples', models.IntegerField(default=0)),
+                ('machine', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.machine')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='machinereading',
+            index=models.Index(fields=['machine', 'recorded_at'], name='app_machine_machine_8fe9c3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='machinereading',
+            index=models.Index(fields=['recorded_at'], name='app_machine_recorde_6ec12a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='hourlyreading',
+            index=models.Index(fields=['bucket'], name='app_hourlyr_bucket_379ecf_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='hourlyreading',
+            constraint=models.UniqueConstraint(fields=('machine', 'bucket'), name='unique_hourly_reading_bucket'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyreading',
+            index=models.Index(fields=['bucket'], name='app_dailyre_bucket_62647b_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyreading',
+            constraint=models.UniqueConstraint(fields=('machine', 'bucket'), name='unique_daily_reading_bucket'),
+        ),
+    ]
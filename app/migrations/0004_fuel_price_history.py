@@ -0,0 +1,76 @@
+# Generated by Django 4.1.1 on 2026-10-18 08:28
+
+import datetime
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def seed_price_history(apps, schema_editor):
+    """
+    Start every fuel's history with its current price and value the recorded volume at it
+    """
+    Fuel = apps.get_model('app', 'Fuel')
+    FuelPrice = apps.get_model('app', 'FuelPrice')
+    MachineReading = apps.get_model('app', 'MachineReading')
+    start = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+    FuelPrice.objects.bulk_create(
+        [FuelPrice(fuel_id=fuel.pk, price=fuel.price, effective_from=start) for fuel in Fuel.objects.all()]
+    )
+
+    previous = {}
+    for reading in MachineReading.objects.order_by('machine_id', 'recorded_at', 'pk'):
+        if reading.machine_id in previous:
+            reading.volume = reading.reading - previous[reading.machine_id]
+            reading.save(update_fields=['volume'])
+        previous[reading.machine_id] = reading.reading
+
+    prices = dict(Fuel.objects.values_list('pk', 'price'))
+    for model_name in ('HourlyReading', 'DailyReading'):
+        model = apps.get_model('app', model_name)
+        for rollup in model.objects.select_related('machine'):
+            rollup.amount = rollup.volume * prices[rollup.machine.fuel_id]
+            rollup.save(update_fields=['amount'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0003_machine_reading_history'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailyreading',
+            name='amount',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='hourlyreading',
+            name='amount',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='machinereading',
+            name='volume',
+            field=models.FloatField(default=0),
+        ),
+        migrations.CreateModel(
+            name='FuelPrice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('price', models.FloatField()),
+                ('effective_from', models.DateTimeField(default=django.utils.timezone.now)),
+                ('fuel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='prices', to='app.fuel')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='fuelprice',
+            index=models.Index(fields=['effective_from'], name='app_fuelpri_effecti_90e5a6_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='fuelprice',
+            constraint=models.UniqueConstraint(fields=('fuel', 'effective_from'), name='unique_fuel_price_effective_from'),
+        ),
+        migrations.RunPython(seed_price_history, migrations.RunPython.noop),
+    ]
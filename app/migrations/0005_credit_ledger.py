@@ -0,0 +1,64 @@
+# Generated by Django 4.1.1 on 2026-10-18 08:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def numeric_limits(apps, schema_editor):
+    """
+    Rewrite the text limits as numbers so the columns can change type, unreadable limits become 0
+    """
+    Creditor = apps.get_model('app', 'Creditor')
+    for creditor in Creditor.objects.all():
+        for field in ('limit_warning', 'limit_stop_credit'):
+            try:
+                value = float(str(getattr(creditor, field)).replace(',', '').strip())
+            except ValueError:
+                value = 0.0
+            setattr(creditor, field, str(value))
+        creditor.save(update_fields=['limit_warning', 'limit_stop_credit'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0004_fuel_price_history'),
+    ]
+
+    operations = [
+        migrations.RunPython(numeric_limits, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='creditor',
+            name='balance',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='creditor',
+            name='limit_stop_credit',
+            field=models.FloatField(),
+        ),
+        migrations.AlterField(
+            model_name='creditor',
+            name='limit_warning',
+            field=models.FloatField(),
+        ),
+        migrations.CreateModel(
+            name='CreditTransaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.FloatField()),
+                ('note', models.CharField(blank=True, default='', max_length=255)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('creditor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transactions', to='app.creditor')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='credittransaction',
+            index=models.Index(fields=['creditor', 'created_at'], name='app_creditt_credito_92e71f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='credittransaction',
+            index=models.Index(fields=['created_at'], name='app_creditt_created_5e303d_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.1.1 on 2026-10-18 08:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_credit_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SummaryWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='credittransaction',
+            name='fuel',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='app.fuel'),
+        ),
+        migrations.CreateModel(
+            name='DailySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('litres', models.FloatField(default=0)),
+                ('revenue', models.FloatField(default=0)),
+                ('credit_issued', models.FloatField(default=0)),
+                ('refreshed_at', models.DateTimeField(auto_now=True)),
+                ('fuel', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='app.fuel')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='dailysummary',
+            index=models.Index(fields=['day', 'fuel'], name='app_dailysu_day_60deca_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.1.1 on 2026-10-18 08:53
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_daily_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MeterAnomaly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('rollback', 'Rollback'), ('stuck', 'Stuck'), ('jump', 'Jump')], max_length=20)),
+                ('recorded_at', models.DateTimeField()),
+                ('until', models.DateTimeField(blank=True, null=True)),
+                ('reading', models.FloatField()),
+                ('delta', models.FloatField(default=0)),
+                ('score', models.FloatField(default=0)),
+                ('detected_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('machine', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='anomalies', to='app.machine')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='meteranomaly',
+            index=models.Index(fields=['machine', 'recorded_at'], name='app_meteran_machine_b6df61_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='meteranomaly',
+            index=models.Index(fields=['recorded_at'], name='app_meteran_recorde_479635_idx'),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 4.1.1 on 2026-10-18 16:10
+
+from django.db import migrations
+from django.db.models import CharField, Value
+from django.db.models.functions import Cast, Concat
+
+# The search documents as of this migration, app.search.SEARCH_DOCUMENTS may change later
+SEARCH_DOCUMENTS = {
+    'app.User': ['name', 'username', 'authorisation'],
+    'app.Fuel': ['type', 'price'],
+    'app.Machine': ['name', 'fuel__type', 'reading'],
+    'app.Creditor': ['payment__mode', 'name', 'limit_warning', 'limit_stop_credit'],
+}
+
+CREATE_TABLE = {
+    'sqlite': "CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5(body, tokenize = 'trigram')",
+    'mysql': (
+        'CREATE TABLE IF NOT EXISTS {table} (object_id BIGINT NOT NULL PRIMARY KEY, body LONGTEXT NOT NULL, '
+        'FULLTEXT KEY body (body) WITH PARSER ngram) ENGINE=InnoDB'
+    ),
+}
+
+KEY_COLUMN = {
+    'sqlite': 'rowid',
+    'mysql': 'object_id',
+}
+
+
+def search_table(model, connection):
+    return connection.ops.quote_name('{}_search'.format(model._meta.db_table))
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor not in CREATE_TABLE:
+        return
+    for label, paths in SEARCH_DOCUMENTS.items():
+        model = apps.get_model(label)
+        table = search_table(model, connection)
+        parts = []
+        for path in paths:
+            if parts:
+                parts.append(Value('\n'))
+            parts.append(Cast(path, output_field=CharField()))
+        documents = (
+            model._base_manager.using(connection.alias).order_by()
+            .values_list('pk', Concat(*parts, output_field=CharField()))
+        )
+        sql, params = documents.query.sql_with_params()
+        schema_editor.execute(CREATE_TABLE[connection.vendor].format(table=table))
+        schema_editor.execute('DELETE FROM {}'.format(table))
+        schema_editor.execute('INSERT INTO {} ({}, body) {}'.format(table, KEY_COLUMN[connection.vendor], sql), params)
+
+
+def drop_search_index(apps, schema_editor):
+    for label in SEARCH_DOCUMENTS:
+        model = apps.get_model(label)
+        schema_editor.execute('DROP TABLE IF EXISTS {}'.format(search_table(model, schema_editor.connection)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0007_meter_anomaly'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
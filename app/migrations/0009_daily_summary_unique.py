@@ -0,0 +1,35 @@
+# Generated by Django 4.1.1 on 2026-10-18 09:26
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def delete_duplicate_summaries(apps, schema_editor):
+    # Concurrent refreshes could insert the same (day, fuel) twice, keep the latest of each
+    DailySummary = apps.get_model('app', 'DailySummary')
+    summaries = DailySummary.objects.using(schema_editor.connection.alias)
+    keep = summaries.values('day', 'fuel').annotate(keep=Max('pk')).values_list('keep', flat=True).order_by()
+    summaries.exclude(pk__in=list(keep)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_summaries, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='dailysummary',
+            name='app_dailysu_day_60deca_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='dailysummary',
+            constraint=models.UniqueConstraint(fields=('day', 'fuel'), name='unique_daily_summary_day_fuel'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailysummary',
+            constraint=models.UniqueConstraint(condition=models.Q(('fuel__isnull', True)), fields=('day',), name='unique_daily_summary_day_without_fuel'),
+        ),
+    ]
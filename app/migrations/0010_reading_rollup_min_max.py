@@ -0,0 +1,33 @@
+# Generated by Django 4.1.1 on 2026-10-18 10:05
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_daily_summary_unique'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='dailyreading',
+            old_name='first_reading',
+            new_name='min_reading',
+        ),
+        migrations.RenameField(
+            model_name='dailyreading',
+            old_name='last_reading',
+            new_name='max_reading',
+        ),
+        migrations.RenameField(
+            model_name='hourlyreading',
+            old_name='first_reading',
+            new_name='min_reading',
+        ),
+        migrations.RenameField(
+            model_name='hourlyreading',
+            old_name='last_reading',
+            new_name='max_reading',
+        ),
+    ]
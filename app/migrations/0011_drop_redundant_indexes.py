@@ -0,0 +1,32 @@
+# Generated by Django 4.1.1 on 2026-10-18 09:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0010_reading_rollup_min_max'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='user',
+            name='app_user_name_fc39e0_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='user',
+            name='app_user_authori_b85f04_idx',
+        ),
+        migrations.AlterField(
+            model_name='creditor',
+            name='payment',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='app.payment'),
+        ),
+        migrations.AlterField(
+            model_name='machine',
+            name='fuel',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='app.fuel'),
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.utils.translation import gettext_lazy as _
+from django.utils import timezone
 
 # USER SCHEMA
 
@@ -44,6 +45,12 @@ class User(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = 'username'
     REQUIRED_FIELDS = []
 
+    class Meta:
+        indexes = [
+            # GraphQL users connection: is_staff = false, paginated by id
+            models.Index(fields=['is_staff', 'id']),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -58,14 +65,41 @@ class Fuel(models.Model):
     )
     price = models.FloatField(null=False, blank=False)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['price']),
+        ]
+
     def __str__(self):
         return self.type
 
 
+class FuelPrice(models.Model):
+    """
+    Price of a fuel from effective_from until the next price of the same fuel
+    """
+    fuel = models.ForeignKey(Fuel, on_delete=models.CASCADE, related_name='prices')
+    price = models.FloatField(null=False, blank=False)
+    effective_from = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            # price in effect at t: fuel = ? and effective_from <= t order by effective_from desc limit 1
+            models.UniqueConstraint(fields=['fuel', 'effective_from'], name='unique_fuel_price_effective_from'),
+        ]
+        indexes = [
+            models.Index(fields=['effective_from']),
+        ]
+
+    def __str__(self):
+        return '{} @ {}'.format(self.fuel_id, self.effective_from)
+
+
 # MACHINE SCHEMA
 
 class Machine(models.Model):
-    fuel = models.ForeignKey(Fuel, on_delete=models.CASCADE)
+    # fuel_id lookups use the (fuel, name) index
+    fuel = models.ForeignKey(Fuel, on_delete=models.CASCADE, db_index=False)
     name = models.CharField(
         max_length=100,
         null=False,
@@ -76,9 +110,112 @@ class Machine(models.Model):
         blank=False
     )
 
+    class Meta:
+        indexes = [
+            # machines of a fuel by name, also covers the fuel_id lookups
+            models.Index(fields=['fuel', 'name']),
+            models.Index(fields=['name']),
+            models.Index(fields=['reading']),
+        ]
+
     def __str__(self):
         return self.name
 
+# MACHINE READING SCHEMA
+
+class MachineReading(models.Model):
+    """
+    Append only history of the meter readings of a machine
+    """
+    machine = models.ForeignKey(Machine, on_delete=models.CASCADE, related_name='readings')
+    recorded_at = models.DateTimeField(default=timezone.now)
+    reading = models.FloatField(
+        null=False,
+        blank=False
+    )
+    # reading minus the previous reading of the machine
+    volume = models.FloatField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['machine', 'recorded_at']),
+            models.Index(fields=['recorded_at']),
+        ]
+
+    def __str__(self):
+        return '{} @ {}'.format(self.machine_id, self.recorded_at)
+
+
+class ReadingRollup(models.Model):
+    """
+    Dispensed volume of a machine over one time bucket, maintained as readings arrive. Readings
+    may arrive out of order, so the bucket keeps the lowest and highest meter reading it saw
+    """
+    machine = models.ForeignKey(Machine, on_delete=models.CASCADE)
+    bucket = models.DateTimeField()
+    min_reading = models.FloatField()
+    max_reading = models.FloatField()
+    volume = models.FloatField(default=0)
+    # sales value of the volume at the fuel prices in effect when it was dispensed
+    amount = models.FloatField(default=0)
+    samples = models.IntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+    def __str__(self):
+        return '{} @ {}'.format(self.machine_id, self.bucket)
+
+
+class HourlyReading(ReadingRollup):
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['machine', 'bucket'], name='unique_hourly_reading_bucket'),
+        ]
+        indexes = [
+            models.Index(fields=['bucket']),
+        ]
+
+
+class DailyReading(ReadingRollup):
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['machine', 'bucket'], name='unique_daily_reading_bucket'),
+        ]
+        indexes = [
+            models.Index(fields=['bucket']),
+        ]
+
+
+class MeterAnomaly(models.Model):
+    """
+    Reading flagged by manage.py detect_meter_anomalies: a rollback, a stuck meter (from
+    recorded_at until) or a jump far above the machine's rolling baseline
+    """
+    KIND_CHOICES = (
+        ('rollback', 'Rollback'),
+        ('stuck', 'Stuck'),
+        ('jump', 'Jump'),
+    )
+    machine = models.ForeignKey(Machine, on_delete=models.CASCADE, related_name='anomalies')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    recorded_at = models.DateTimeField()
+    until = models.DateTimeField(null=True, blank=True)
+    reading = models.FloatField()
+    delta = models.FloatField(default=0)
+    # robust z-score of a jump, unchanged readings of a stuck meter, litres of a rollback
+    score = models.FloatField(default=0)
+    detected_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['machine', 'recorded_at']),
+            models.Index(fields=['recorded_at']),
+        ]
+
+    def __str__(self):
+        return '{} {} @ {}'.format(self.kind, self.machine_id, self.recorded_at)
+
 # PAYMENT SCHEMA
 
 
@@ -90,6 +227,12 @@ class Payment(models.Model):
         blank=False
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['mode']),
+            models.Index(fields=['allowed_subcategory', 'id']),
+        ]
+
     def __str__(self):
         return self.mode
 
@@ -97,22 +240,91 @@ class Payment(models.Model):
 # CREDITOR SCHEMA
 
 class Creditor(models.Model):
-    payment = models.ForeignKey(Payment, on_delete=models.CASCADE)
+    # payment_id lookups use the (payment, name) index
+    payment = models.ForeignKey(Payment, on_delete=models.CASCADE, db_index=False)
     name = models.CharField(
         max_length=100,
         null=False,
         blank=False
     )
-    limit_warning = models.CharField(
-        max_length=100,
+    limit_warning = models.FloatField(
         null=False,
         blank=False
     )
-    limit_stop_credit = models.CharField(
-        max_length=100,
+    limit_stop_credit = models.FloatField(
         null=False,
         blank=False
     )
+    # outstanding credit, only ever changed through CreditTransaction with F() updates
+    balance = models.FloatField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            # creditors of a payment mode by name, also covers the payment_id lookups
+            models.Index(fields=['payment', 'name']),
+            models.Index(fields=['name']),
+            models.Index(fields=['limit_warning']),
+            models.Index(fields=['limit_stop_credit']),
+        ]
 
     def __str__(self):
         return self.name
+
+
+class CreditTransaction(models.Model):
+    """
+    Ledger of a creditor's account, credit sales are positive and repayments negative
+    """
+    creditor = models.ForeignKey(Creditor, on_delete=models.CASCADE, related_name='transactions')
+    # fuel sold on credit, unset for repayments and adjustments
+    fuel = models.ForeignKey(Fuel, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    amount = models.FloatField(null=False, blank=False)
+    note = models.CharField(max_length=255, blank=True, default='')
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['creditor', 'created_at']),
+            models.Index(fields=['created_at']),
+        ]
+
+    def __str__(self):
+        return '{} {}'.format(self.creditor_id, self.amount)
+
+
+# DAILY SUMMARY SCHEMA
+
+class DailySummary(models.Model):
+    """
+    Station totals of one day per fuel, refreshed from the daily reading rollups and the
+    credit ledger. Credit not attributed to a fuel is summed in the row without fuel
+    """
+    day = models.DateField()
+    fuel = models.ForeignKey(Fuel, on_delete=models.CASCADE, null=True, blank=True)
+    litres = models.FloatField(default=0)
+    revenue = models.FloatField(default=0)
+    credit_issued = models.FloatField(default=0)
+    refreshed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'fuel'], name='unique_daily_summary_day_fuel'),
+            # NULLs never conflict in the constraint above, the row without fuel needs its own
+            models.UniqueConstraint(
+                fields=['day'], condition=models.Q(fuel__isnull=True), name='unique_daily_summary_day_without_fuel'
+            ),
+        ]
+
+    def __str__(self):
+        return '{} {}'.format(self.day, self.fuel_id)
+
+
+class SummaryWatermark(models.Model):
+    """
+    Highest source primary key already folded into the daily summaries
+    """
+    name = models.CharField(max_length=100, unique=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return '{} {}'.format(self.name, self.value)
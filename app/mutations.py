@@ -1,6 +1,13 @@
 import graphene
 import re
-from .models import Creditor, Fuel, Machine, Payment
+from django.db import transaction
+from .credit import CreditLimitExceeded, post_transaction
+from .deletion import chunked_delete
+from .models import Creditor, CreditTransaction, Fuel, Machine, Payment
+from .pubsub import publish_machine
+from .readings import machine_entries, record_readings
+from .search import update_documents
+from .valuation import PRICE_HISTORY_START, set_fuel_price
 from graphql import GraphQLError
 from django.contrib.auth import get_user_model
 from graphene_django import DjangoObjectType
@@ -89,7 +96,7 @@ class DeleteUser(graphene.Mutation):
     def mutate(self, info, id):
         try:
             user = User.objects.get(id=from_global_id(id)[1])
-            user.delete()
+            chunked_delete(User.objects.filter(pk=user.pk))
             response = DeleteUser(success=True)
             return response
         except Exception as e:
@@ -112,7 +119,9 @@ class CreateFuel(graphene.Mutation):
     @superuser_required
     def mutate(self, info, type, price):
         try:
-            fuel = Fuel.objects.create(type=type, price=price)
+            with transaction.atomic():
+                fuel = Fuel.objects.create(type=type, price=price)
+                set_fuel_price(fuel, price, PRICE_HISTORY_START)
             response = CreateFuel(fuel=fuel)
             return response
         except Exception as e:
@@ -132,14 +141,34 @@ class UpdateFuel(graphene.Mutation):
         try:
             fuel = Fuel.objects.get(id=from_global_id(id)[1])
             fuel.type = type
-            fuel.price = price
-            fuel.save()
+            with transaction.atomic():
+                fuel.save()
+                if price != fuel.price:
+                    set_fuel_price(fuel, price)
             response = UpdateFuel(fuel=fuel)
             return response
         except Exception as e:
             raise GraphQLError('fuel already exist')
 
 
+class SetFuelPrice(graphene.Mutation):
+    class Arguments:
+        id = graphene.ID(required=True)
+        price = graphene.Float(required=True)
+        effective_from = graphene.DateTime()
+
+    fuel = graphene.Field(FuelType)
+
+    @superuser_required
+    def mutate(self, info, id, price, effective_from=None):
+        try:
+            fuel = Fuel.objects.get(id=from_global_id(id)[1])
+        except Exception:
+            raise GraphQLError('fuel does not exist')
+        set_fuel_price(fuel, price, effective_from)
+        return SetFuelPrice(fuel=fuel)
+
+
 class DeleteFuel(graphene.Mutation):
     class Arguments:
         id = graphene.ID()
@@ -151,7 +180,7 @@ class DeleteFuel(graphene.Mutation):
     def mutate(self, info, id):
         try:
             fuel = Fuel.objects.get(id=from_global_id(id)[1])
-            fuel.delete()
+            chunked_delete(Fuel.objects.filter(pk=fuel.pk))
             response = DeleteFuel(success=True)
             return response
         except Exception as e:
@@ -175,11 +204,13 @@ class CreateMachine(graphene.Mutation):
     @superuser_required
     def mutate(self, info, name, fuel, reading):
         try:
-            machine = Machine.objects.create(
-                name=name,
-                fuel=Fuel.objects.get(id=from_global_id(fuel)[1]),
-                reading=reading
-            )
+            with transaction.atomic():
+                machine = Machine.objects.create(
+                    name=name,
+                    fuel=Fuel.objects.get(id=from_global_id(fuel)[1]),
+                    reading=reading
+                )
+                record_readings(machine_entries([machine], {}))
             response = CreateMachine(machine=machine)
             return response
         except Exception as e:
@@ -198,12 +229,18 @@ class UpdateMachine(graphene.Mutation):
     @superuser_required
     def mutate(self, info, id, name, fuel, reading):
         try:
-            machine = Machine.objects.get(id=from_global_id(id)[1])
             f = Fuel.objects.get(id=from_global_id(fuel)[1])
-            machine.fuel = f
-            machine.name = name
-            machine.reading = reading
-            machine.save()
+            with transaction.atomic():
+                # Locked until the reading is recorded, so concurrent updates can't share a previous reading
+                machine = Machine.objects.select_for_update().get(id=from_global_id(id)[1])
+                previous = machine.reading
+                machine.fuel = f
+                machine.name = name
+                machine.reading = reading
+                machine.save()
+                if reading != previous:
+                    record_readings(machine_entries([machine], {machine.pk: previous}))
+                    publish_machine(machine)
             response = UpdateMachine(machine=machine)
             return response
         except Exception as e:
@@ -221,7 +258,7 @@ class DeleteMachine(graphene.Mutation):
     def mutate(self, info, id):
         try:
             machine = Machine.objects.get(id=from_global_id(id)[1])
-            machine.delete()
+            chunked_delete(Machine.objects.filter(pk=machine.pk))
             response = DeleteMachine(success=True)
             return response
         except Exception as e:
@@ -287,7 +324,7 @@ class DeletePayment(graphene.Mutation):
         print('COMING')
         try:
             payment = Payment.objects.get(id=from_global_id(id)[1])
-            payment.delete()
+            chunked_delete(Payment.objects.filter(pk=payment.pk))
             response = DeletePayment(success=True)
             return response
         except Exception as e:
@@ -304,8 +341,8 @@ class CreateCreditor(graphene.Mutation):
     class Arguments:
         payment = graphene.ID()
         name = graphene.String()
-        limit_warning = graphene.String()
-        limit_stop_credit = graphene.String()
+        limit_warning = graphene.Float()
+        limit_stop_credit = graphene.Float()
 
     creditor = graphene.Field(CreditorType)
 
@@ -329,8 +366,8 @@ class UpdateCreditor(graphene.Mutation):
         id = graphene.ID()
         payment = graphene.ID()
         name = graphene.String()
-        limit_warning = graphene.String()
-        limit_stop_credit = graphene.String()
+        limit_warning = graphene.Float()
+        limit_stop_credit = graphene.Float()
 
     creditor = graphene.Field(CreditorType)
 
@@ -343,7 +380,8 @@ class UpdateCreditor(graphene.Mutation):
             creditor.name = name
             creditor.limit_warning = limit_warning
             creditor.limit_stop_credit = limit_stop_credit
-            creditor.save()
+            # balance moves concurrently through the ledger, never write back the value read here
+            creditor.save(update_fields=['payment', 'name', 'limit_warning', 'limit_stop_credit'])
             response = UpdateCreditor(creditor=creditor)
             return response
         except Exception as e:
@@ -361,13 +399,227 @@ class DeleteCreditor(graphene.Mutation):
     def mutate(self, info, id):
         try:
             creditor = Creditor.objects.get(id=from_global_id(id)[1])
-            creditor.delete()
+            chunked_delete(Creditor.objects.filter(pk=creditor.pk))
             response = DeleteCreditor(success=True)
             return response
         except Exception as e:
             raise GraphQLError(e)
 
 
+class CreditTransactionType(DjangoObjectType):
+    class Meta:
+        model = CreditTransaction
+
+
+class RecordCreditTransaction(graphene.Mutation):
+    class Arguments:
+        creditor = graphene.ID(required=True)
+        amount = graphene.Float(required=True)
+        note = graphene.String()
+        fuel = graphene.ID()
+
+    transaction = graphene.Field(CreditTransactionType)
+    balance = graphene.Float()
+
+    @superuser_required
+    def mutate(self, info, creditor, amount, note='', fuel=None):
+        fuel_id = None
+        if fuel:
+            try:
+                fuel_id = Fuel.objects.values_list('pk', flat=True).get(pk=from_global_id(fuel)[1])
+            except Exception:
+                raise GraphQLError('fuel does not exist')
+        try:
+            creditor_id = decode_id(creditor, CREDITOR_TYPES)
+        except ValueError as e:
+            raise GraphQLError(e)
+        try:
+            credit_transaction = post_transaction(creditor_id, amount, note, fuel_id=fuel_id)
+        except (Creditor.DoesNotExist, CreditLimitExceeded) as e:
+            raise GraphQLError(e)
+        balance = Creditor.objects.filter(pk=creditor_id).values_list('balance', flat=True).first()
+        return RecordCreditTransaction(transaction=credit_transaction, balance=balance)
+
+
+# BULK OPERATIONS
+class BulkItemError(graphene.ObjectType):
+    index = graphene.Int()
+    message = graphene.String()
+
+
+# Type names of the creditor ids handed out by the CreditorNode queries and the creditor mutations
+CREDITOR_TYPES = ("CreditorNode", "CreditorType")
+
+
+def decode_id(global_id, types=None):
+    """
+    Primary key of a relay global id, raises ValueError when it can't be decoded or its type
+    isn't one of types
+    """
+    try:
+        node_type, pk = from_global_id(global_id)
+        pk = int(pk)
+    except Exception:
+        raise ValueError("invalid id {}".format(global_id))
+    if types is not None and node_type not in types:
+        raise ValueError("invalid id {}".format(global_id))
+    return pk
+
+
+def decode_ids(global_ids, errors):
+    """
+    Decode relay global ids, recording an error for every item that can't be decoded
+    """
+    ids = {}
+    for index, global_id in global_ids:
+        try:
+            ids[index] = decode_id(global_id)
+        except ValueError as e:
+            errors.append(BulkItemError(index=index, message=str(e)))
+    return ids
+
+
+class MachineReadingInput(graphene.InputObjectType):
+    id = graphene.ID(required=True)
+    reading = graphene.Float(required=True)
+
+
+class BulkUpdateMachineReadings(graphene.Mutation):
+    class Arguments:
+        readings = graphene.List(graphene.NonNull(MachineReadingInput), required=True)
+
+    machines = graphene.List(MachineType)
+    errors = graphene.List(BulkItemError)
+
+    @superuser_required
+    def mutate(self, info, readings):
+        errors = []
+        ids = decode_ids([(index, item.id) for index, item in enumerate(readings)], errors)
+
+        with transaction.atomic():
+            # Locked in pk order until the readings are recorded, the previous readings can't go stale
+            machines = Machine.objects.select_for_update().order_by("pk").in_bulk(set(ids.values()))
+
+            updated, previous = {}, {}
+            for index, machine_id in ids.items():
+                machine = machines.get(machine_id)
+                if machine is None:
+                    errors.append(BulkItemError(index=index, message="machine does not exist"))
+                    continue
+                previous.setdefault(machine_id, machine.reading)
+                machine.reading = readings[index].reading
+                updated[machine_id] = machine
+
+            Machine.objects.bulk_update(updated.values(), ["reading"])
+            update_documents(Machine, list(updated))
+            record_readings(machine_entries(updated.values(), previous))
+            for machine in updated.values():
+                publish_machine(machine)
+
+        errors.sort(key=lambda error: error.index)
+        return BulkUpdateMachineReadings(machines=list(updated.values()), errors=errors)
+
+
+class MachineInput(graphene.InputObjectType):
+    name = graphene.String(required=True)
+    fuel = graphene.ID(required=True)
+    reading = graphene.Float(required=True)
+
+
+class BulkCreateMachines(graphene.Mutation):
+    class Arguments:
+        machines = graphene.List(graphene.NonNull(MachineInput), required=True)
+
+    machines = graphene.List(MachineType)
+    errors = graphene.List(BulkItemError)
+
+    @superuser_required
+    def mutate(self, info, machines):
+        errors = []
+        fuel_ids = decode_ids([(index, item.fuel) for index, item in enumerate(machines)], errors)
+        fuels = Fuel.objects.in_bulk(set(fuel_ids.values()))
+
+        new_machines = []
+        for index, fuel_id in fuel_ids.items():
+            if fuel_id not in fuels:
+                errors.append(BulkItemError(index=index, message="fuel does not exist"))
+                continue
+            if not machines[index].name:
+                errors.append(BulkItemError(index=index, message="name is required"))
+                continue
+            new_machines.append(
+                Machine(name=machines[index].name, fuel=fuels[fuel_id], reading=machines[index].reading)
+            )
+
+        with transaction.atomic():
+            created = Machine.objects.bulk_create(new_machines)
+            update_documents(Machine, [machine.pk for machine in created])
+            record_readings(machine_entries(created, {}))
+
+        errors.sort(key=lambda error: error.index)
+        return BulkCreateMachines(machines=created, errors=errors)
+
+
+class CreditorInput(graphene.InputObjectType):
+    id = graphene.ID()
+    payment = graphene.ID(required=True)
+    name = graphene.String(required=True)
+    limit_warning = graphene.Float(required=True)
+    limit_stop_credit = graphene.Float(required=True)
+
+
+class BulkUpsertCreditors(graphene.Mutation):
+    class Arguments:
+        creditors = graphene.List(graphene.NonNull(CreditorInput), required=True)
+
+    creditors = graphene.List(CreditorType)
+    errors = graphene.List(BulkItemError)
+
+    @superuser_required
+    def mutate(self, info, creditors):
+        errors = []
+        payment_ids = decode_ids([(index, item.payment) for index, item in enumerate(creditors)], errors)
+        creditor_ids = decode_ids(
+            [(index, item.id) for index, item in enumerate(creditors) if item.id and index in payment_ids], errors
+        )
+        payments = Payment.objects.in_bulk(set(payment_ids.values()))
+        existing = Creditor.objects.in_bulk(set(creditor_ids.values()))
+
+        to_create, to_update = [], {}
+        for index, payment_id in payment_ids.items():
+            item = creditors[index]
+            if item.id and index not in creditor_ids:
+                continue
+            if payment_id not in payments:
+                errors.append(BulkItemError(index=index, message="payment does not exist"))
+                continue
+
+            if item.id:
+                creditor = existing.get(creditor_ids[index])
+                if creditor is None:
+                    errors.append(BulkItemError(index=index, message="creditor does not exist"))
+                    continue
+                to_update[creditor.pk] = creditor
+            else:
+                creditor = Creditor()
+                to_create.append(creditor)
+
+            creditor.payment = payments[payment_id]
+            creditor.name = item.name
+            creditor.limit_warning = item.limit_warning
+            creditor.limit_stop_credit = item.limit_stop_credit
+
+        with transaction.atomic():
+            Creditor.objects.bulk_update(
+                to_update.values(), ["payment", "name", "limit_warning", "limit_stop_credit"]
+            )
+            created = Creditor.objects.bulk_create(to_create)
+            update_documents(Creditor, list(to_update) + [creditor.pk for creditor in created])
+
+        errors.sort(key=lambda error: error.index)
+        return BulkUpsertCreditors(creditors=list(to_update.values()) + created, errors=errors)
+
+
 # LIST OF ALL MUTATIONS
 class Mutation(graphene.ObjectType):
 
@@ -379,6 +631,7 @@ class Mutation(graphene.ObjectType):
     # Fuel Mutations
     create_fuel = CreateFuel.Field()
     update_fuel = UpdateFuel.Field()
+    set_fuel_price = SetFuelPrice.Field()
     delete_fuel = DeleteFuel.Field()
 
     # Fuel Mutations
@@ -395,3 +648,9 @@ class Mutation(graphene.ObjectType):
     create_creditor = CreateCreditor.Field()
     update_creditor = UpdateCreditor.Field()
     delete_creditor = DeleteCreditor.Field()
+    record_credit_transaction = RecordCreditTransaction.Field()
+
+    # Bulk Mutations
+    bulk_update_machine_readings = BulkUpdateMachineReadings.Field()
+    bulk_create_machines = BulkCreateMachines.Field()
+    bulk_upsert_creditors = BulkUpsertCreditors.Field()
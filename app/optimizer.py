@@ -0,0 +1,133 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from graphene.utils.str_converters import to_snake_case
+from graphql.language.ast import FieldNode, FragmentSpreadNode, InlineFragmentNode
+
+CONNECTION_ARGS = ("first", "last", "before", "after", "offset")
+
+
+def collect_fields(selection_set, fragments):
+    """
+    Flatten a selection set (resolving fragments) into {field name: [field nodes]}
+    """
+    fields = {}
+    if selection_set is None:
+        return fields
+
+    for selection in selection_set.selections:
+        if isinstance(selection, FieldNode):
+            fields.setdefault(selection.name.value, []).append(selection)
+        elif isinstance(selection, InlineFragmentNode):
+            for name, nodes in collect_fields(selection.selection_set, fragments).items():
+                fields.setdefault(name, []).extend(nodes)
+        elif isinstance(selection, FragmentSpreadNode):
+            fragment = fragments.get(selection.name.value)
+            if fragment:
+                for name, nodes in collect_fields(fragment.selection_set, fragments).items():
+                    fields.setdefault(name, []).extend(nodes)
+    return fields
+
+
+def get_sub_fields(field_nodes, name, fragments):
+    nodes = []
+    for field_node in field_nodes:
+        nodes.extend(collect_fields(field_node.selection_set, fragments).get(name, []))
+    return nodes
+
+
+def get_node_fields(connection_nodes, fragments):
+    """
+    Return the field nodes selected under `edges { node { ... } }` of a connection
+    """
+    node_nodes = get_sub_fields(get_sub_fields(connection_nodes, "edges", fragments), "node", fragments)
+    fields = {}
+    for node in node_nodes:
+        for name, nodes in collect_fields(node.selection_set, fragments).items():
+            fields.setdefault(name, []).extend(nodes)
+    return fields
+
+
+def has_filter_arguments(field_nodes):
+    return any(
+        argument.name.value not in CONNECTION_ARGS for node in field_nodes for argument in node.arguments
+    )
+
+
+class QueryPlan:
+    """
+    Columns and relations needed to resolve a selection on one model
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.only = {model._meta.pk.attname}
+        self.select_related = []
+        self.prefetch = []
+
+    def apply(self, queryset):
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        if self.prefetch:
+            queryset = queryset.prefetch_related(*self.prefetch)
+        return queryset.only(*self.only)
+
+
+def get_model_field(model, name):
+    """
+    Look up a model field by its schema name, reverse relations go by accessor (e.g machine_set)
+    """
+    for relation in model._meta.related_objects:
+        if relation.get_accessor_name() == name:
+            return relation
+    try:
+        return model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+
+
+def plan_fields(model, fields, fragments, plan=None, prefix=""):
+    plan = plan or QueryPlan(model)
+    if prefix:
+        plan.only.add(prefix + model._meta.pk.attname)
+
+    for name, nodes in fields.items():
+        if name == "id":
+            continue
+
+        field = get_model_field(model, to_snake_case(name))
+        if field is None:
+            continue
+
+        if field.auto_created and not field.concrete:
+            if prefix or not field.one_to_many or has_filter_arguments(nodes):
+                continue
+            child = plan_fields(field.related_model, get_node_fields(nodes, fragments), fragments)
+            child.only.add(field.field.attname)
+            plan.prefetch.append(
+                Prefetch(field.get_accessor_name(), queryset=child.apply(field.related_model._default_manager.all()))
+            )
+
+        elif field.is_relation and field.many_to_one:
+            plan.only.add(prefix + field.attname)
+            if not prefix:
+                plan.select_related.append(field.name)
+                related_fields = {}
+                for node in nodes:
+                    for sub_name, sub_nodes in collect_fields(node.selection_set, fragments).items():
+                        related_fields.setdefault(sub_name, []).extend(sub_nodes)
+                plan_fields(field.related_model, related_fields, fragments, plan, prefix=field.name + "__")
+
+        elif field.concrete and not field.many_to_many:
+            plan.only.add(prefix + field.attname)
+
+    return plan
+
+
+def optimize_queryset(queryset, info):
+    """
+    Restrict a connection queryset to the columns and relations the client selected
+    """
+    fields = get_node_fields(info.field_nodes, info.fragments)
+    if not fields:
+        return queryset.only(queryset.model._meta.pk.attname)
+    return plan_fields(queryset.model, fields, info.fragments).apply(queryset)
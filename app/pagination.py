@@ -0,0 +1,130 @@
+from django.conf import settings
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+
+DEFAULT_ADMIN_PAGINATION = {
+    # unfiltered lists whose table statistics estimate fewer rows are counted exactly
+    "ESTIMATE_THRESHOLD": 10000,
+    # filtered lists are counted up to this many rows, past it the count is reported as unknown
+    "COUNT_CAP": 1000,
+}
+
+
+def get_admin_pagination_settings():
+    pagination_settings = dict(DEFAULT_ADMIN_PAGINATION)
+    pagination_settings.update(getattr(settings, "ADMIN_PAGINATION", {}))
+    return pagination_settings
+
+
+def estimate_rows(model, using):
+    """
+    Row count of the model's table from the database statistics, None when there are none
+    (sqlite only has them once ANALYZE has run)
+    """
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+            if cursor.fetchone() is None:
+                return None
+            # stat is "rows [rows per distinct value of each index prefix...]"
+            cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1", [model._meta.db_table])
+        elif connection.vendor == "mysql":
+            cursor.execute(
+                "SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s",
+                [model._meta.db_table],
+            )
+        elif connection.vendor == "postgresql":
+            cursor.execute("SELECT reltuples FROM pg_class WHERE oid = to_regclass(%s)", [model._meta.db_table])
+        else:
+            return None
+        row = cursor.fetchone()
+
+    if row is None or row[0] is None:
+        return None
+    rows = int(float(str(row[0]).split()[0]))
+    # postgres reports -1 before the table was first analysed
+    return rows if rows >= 0 else None
+
+
+class EstimatedCountPage(Page):
+    def has_next(self):
+        if self.paginator.exact:
+            return super().has_next()
+        return self.paginator.object_list[self.number * self.paginator.per_page:][:1].exists()
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator for admin changelists that avoids exact counts of large lists. Unfiltered lists use
+    the table statistics' row estimate, filtered ones are counted up to COUNT_CAP rows. When either
+    applies exact is False, page numbers are no longer checked against the count and the
+    pagination only links the previous and next page
+    """
+
+    @cached_property
+    def counted(self):
+        """
+        (count, exact, estimated)
+        """
+        queryset = self.object_list
+        pagination_settings = get_admin_pagination_settings()
+        if self.is_unfiltered():
+            estimate = estimate_rows(queryset.model, queryset.db)
+            if estimate is not None and estimate >= pagination_settings["ESTIMATE_THRESHOLD"]:
+                return estimate, False, True
+            return queryset.count(), True, False
+
+        count = queryset.order_by()[:self.count_cap + 1].count()
+        return count, count <= self.count_cap, False
+
+    @cached_property
+    def count_cap(self):
+        return get_admin_pagination_settings()["COUNT_CAP"]
+
+    @property
+    def count(self):
+        return self.counted[0]
+
+    @property
+    def exact(self):
+        return self.counted[1]
+
+    @property
+    def estimated(self):
+        return self.counted[2]
+
+    def is_unfiltered(self):
+        query = self.object_list.query
+        return not query.where and not query.distinct and not query.combinator and \
+            query.low_mark == 0 and query.high_mark is None
+
+    def validate_number(self, number):
+        if self.exact:
+            return super().validate_number(number)
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(_("That page number is not an integer"))
+        if number < 1:
+            raise EmptyPage(_("That page number is less than 1"))
+        return number
+
+    def page(self, number):
+        if self.exact:
+            return super().page(number)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        return self._get_page(self.object_list[bottom:bottom + self.per_page], number, self)
+
+    def _get_page(self, *args, **kwargs):
+        return EstimatedCountPage(*args, **kwargs)
+
+    def get_elided_page_range(self, number=1, *, on_each_side=3, on_ends=2):
+        if self.exact:
+            return super().get_elided_page_range(number, on_each_side=on_each_side, on_ends=on_ends)
+        return [self.validate_number(number)]
@@ -0,0 +1,144 @@
+import asyncio
+import json
+import logging
+import socket
+from collections import defaultdict
+from threading import Lock
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+MACHINE_READING_CHANGED = "machine_reading_changed"
+FUEL_PRICE_CHANGED = "fuel_price_changed"
+
+# First line a worker sends to the broker to receive events, connections that only publish never send it
+BROKER_SUBSCRIBE = b"SUBSCRIBE\n"
+
+
+class LocalPubSub:
+    """
+    In process pub/sub. publish() may be called from any thread, every subscriber gets its own
+    bounded queue on its event loop; a subscriber that falls behind loses its oldest events
+    """
+
+    def __init__(self, max_queue=100):
+        self.max_queue = max_queue
+        self.subscribers = defaultdict(set)
+        self.lock = Lock()
+
+    def publish(self, channel, message):
+        self.deliver(channel, message)
+
+    def deliver(self, channel, message):
+        with self.lock:
+            subscribers = list(self.subscribers.get(channel, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self.put, queue, message)
+            except RuntimeError:
+                # The subscriber's loop is closed, its generator never got to unsubscribe
+                with self.lock:
+                    self.subscribers[channel].discard((loop, queue))
+
+    @staticmethod
+    def put(queue, message):
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(message)
+
+    async def subscribe(self, channel):
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue(self.max_queue))
+        with self.lock:
+            self.subscribers[channel].add(subscriber)
+        try:
+            while True:
+                yield await subscriber[1].get()
+        finally:
+            with self.lock:
+                self.subscribers[channel].discard(subscriber)
+
+
+class BrokerPubSub(LocalPubSub):
+    """
+    Pub/sub fanned out across workers through manage.py pubsub_broker: events are sent to the
+    broker, which relays them to every subscribed worker (including the publisher)
+    """
+
+    def __init__(self, address="127.0.0.1:8765", max_queue=100):
+        super().__init__(max_queue)
+        host, port = address.rsplit(":", 1)
+        self.address = (host, int(port))
+        self.connection = None
+        self.connection_lock = Lock()
+        self.listeners = {}
+
+    def publish(self, channel, message):
+        line = (json.dumps({"channel": channel, "message": message}) + "\n").encode("utf-8")
+        with self.connection_lock:
+            for attempt in range(2):
+                try:
+                    if self.connection is None:
+                        self.connection = socket.create_connection(self.address, timeout=1)
+                    self.connection.sendall(line)
+                    return
+                except OSError:
+                    if self.connection is not None:
+                        self.connection.close()
+                    self.connection = None
+        logger.warning("pub/sub broker %s:%s unreachable, delivering %s locally", *self.address, channel)
+        self.deliver(channel, message)
+
+    async def listen(self):
+        while True:
+            try:
+                reader, writer = await asyncio.open_connection(*self.address)
+                try:
+                    writer.write(BROKER_SUBSCRIBE)
+                    await writer.drain()
+                    while True:
+                        line = await reader.readline()
+                        if not line:
+                            break
+                        event = json.loads(line)
+                        self.deliver(event["channel"], event["message"])
+                finally:
+                    writer.close()
+            except (OSError, ValueError, KeyError):
+                logger.warning("pub/sub broker %s:%s connection lost, reconnecting", *self.address)
+            await asyncio.sleep(1)
+
+    async def subscribe(self, channel):
+        loop = asyncio.get_running_loop()
+        if loop not in self.listeners or self.listeners[loop].done():
+            self.listeners[loop] = loop.create_task(self.listen())
+        async for message in super().subscribe(channel):
+            yield message
+
+
+pubsub = None
+
+
+def get_pubsub():
+    global pubsub
+    if pubsub is None:
+        pubsub_settings = getattr(settings, "GRAPHQL_PUBSUB", {})
+        backend = import_string(pubsub_settings.get("BACKEND", "app.pubsub.LocalPubSub"))
+        pubsub = backend(**pubsub_settings.get("OPTIONS", {}))
+    return pubsub
+
+
+def publish_on_commit(channel, message):
+    transaction.on_commit(lambda: get_pubsub().publish(channel, message))
+
+
+def publish_machine(machine):
+    publish_on_commit(
+        MACHINE_READING_CHANGED,
+        {"id": machine.pk, "name": machine.name, "fuel_id": machine.fuel_id, "reading": machine.reading},
+    )
+
+
+def publish_fuel(fuel):
+    publish_on_commit(FUEL_PRICE_CHANGED, {"id": fuel.pk, "type": fuel.type, "price": fuel.price})
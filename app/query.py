@@ -1,10 +1,18 @@
 from django.contrib.auth import get_user_model
-from .mutations import Mutation
+from .mutations import CREDITOR_TYPES, Mutation, decode_id
 from graphene_django import DjangoObjectType
-from graphene import relay, ObjectType, Schema
+from graphene import relay, Boolean, Field, Float, ID, Int, ObjectType, Schema
 from graphql_jwt.decorators import superuser_required
-from .models import Creditor, Fuel, Machine, Payment
-from graphene_django.filter import DjangoFilterConnectionField
+from .models import Creditor, CreditTransaction, DailyReading, DailySummary, Fuel, FuelPrice, HourlyReading, Machine, MachineReading, Payment
+from .fields import CachedConnectionField, CountableConnection, KeysetConnectionField, is_filtered
+from .auth import token_cache
+from .loaders import get_loaders
+from .credit import credit_check
+from .documents import document_cache
+from .pubsub import FUEL_PRICE_CHANGED, MACHINE_READING_CHANGED, get_pubsub
+from .results import result_cache
+from graphql import GraphQLError
+from graphql_relay import from_global_id
 
 User = get_user_model()
 
@@ -14,6 +22,7 @@ class UserNode(DjangoObjectType):
         model = User
         filter_fields = ["id", "username"]
         interfaces = (relay.Node, )
+        connection_class = CountableConnection
 
 
 class FuelNode(DjangoObjectType):
@@ -21,6 +30,36 @@ class FuelNode(DjangoObjectType):
         model = Fuel
         filter_fields = ["id", "type", "price"]
         interfaces = (relay.Node, )
+        connection_class = CountableConnection
+
+    machine_set = KeysetConnectionField(lambda: MachineNode, required=True)
+
+    @classmethod
+    def get_node(cls, info, id):
+        return get_loaders(info.context).model(Fuel).load(id)
+
+    def resolve_machine_set(self, info, **kwargs):
+        if is_filtered(kwargs):
+            return self.machine_set.all()
+        return get_loaders(info.context).related_set(Fuel, "machine_set").load(self.pk)
+
+
+class FuelPriceNode(DjangoObjectType):
+    class Meta:
+        model = FuelPrice
+        filter_fields = {
+            "fuel": ["exact"],
+            "effective_from": ["gte", "lt"],
+        }
+        interfaces = (relay.Node, )
+        connection_class = CountableConnection
+
+    fuel = Field(lambda: FuelNode, required=True)
+
+    def resolve_fuel(self, info):
+        if FuelPrice.fuel.is_cached(self):
+            return self.fuel
+        return get_loaders(info.context).model(Fuel).load(self.fuel_id)
 
 
 class MachineNode(DjangoObjectType):
@@ -28,6 +67,76 @@ class MachineNode(DjangoObjectType):
         model = Machine
         filter_fields = ["id", "name", "reading"]
         interfaces = (relay.Node, )
+        connection_class = CountableConnection
+
+    fuel = Field(lambda: FuelNode, required=True)
+
+    def resolve_fuel(self, info):
+        if Machine.fuel.is_cached(self):
+            return self.fuel
+        return get_loaders(info.context).model(Fuel).load(self.fuel_id)
+
+
+class ReadingMachineMixin:
+    machine = Field(lambda: MachineNode, required=True)
+
+    def resolve_machine(self, info):
+        if type(self).machine.is_cached(self):
+            return self.machine
+        return get_loaders(info.context).model(Machine).load(self.machine_id)
+
+
+class MachineReadingNode(ReadingMachineMixin, DjangoObjectType):
+    class Meta:
+        model = MachineReading
+        filter_fields = {
+            "machine": ["exact"],
+            "recorded_at": ["gte", "lt"],
+        }
+        interfaces = (relay.Node, )
+        connection_class = CountableConnection
+
+
+class HourlyReadingNode(ReadingMachineMixin, DjangoObjectType):
+    class Meta:
+        model = HourlyReading
+        filter_fields = {
+            "machine": ["exact"],
+            "bucket": ["exact", "gte", "lt"],
+        }
+        interfaces = (relay.Node, )
+        connection_class = CountableConnection
+
+
+class DailyReadingNode(ReadingMachineMixin, DjangoObjectType):
+    class Meta:
+        model = DailyReading
+        filter_fields = {
+            "machine": ["exact"],
+            "bucket": ["exact", "gte", "lt"],
+        }
+        interfaces = (relay.Node, )
+        connection_class = CountableConnection
+
+
+class DailySummaryNode(DjangoObjectType):
+    class Meta:
+        model = DailySummary
+        filter_fields = {
+            "day": ["exact", "gte", "lt"],
+            "fuel": ["exact"],
+        }
+        interfaces = (relay.Node, )
+        connection_class = CountableConnection
+
+    fuel = Field(lambda: FuelNode)
+
+    def resolve_fuel(self, info):
+        if self.fuel_id is None:
+            return None
+        if DailySummary.fuel.is_cached(self):
+            return self.fuel
+        return get_loaders(info.context).model(Fuel).load(self.fuel_id)
 
 
 class PaymentNode(DjangoObjectType):
@@ -35,6 +144,18 @@ class PaymentNode(DjangoObjectType):
         model = Payment
         filter_fields = ["id", "allowed_subcategory", "mode"]
         interfaces = (relay.Node, )
+        connection_class = CountableConnection
+
+    creditor_set = KeysetConnectionField(lambda: CreditorNode, required=True)
+
+    @classmethod
+    def get_node(cls, info, id):
+        return get_loaders(info.context).model(Payment).load(id)
+
+    def resolve_creditor_set(self, info, **kwargs):
+        if is_filtered(kwargs):
+            return self.creditor_set.all()
+        return get_loaders(info.context).related_set(Payment, "creditor_set").load(self.pk)
 
 
 class CreditorNode(DjangoObjectType):
@@ -42,43 +163,191 @@ class CreditorNode(DjangoObjectType):
         model = Creditor
         filter_fields = ["id", "name", "limit_warning", "limit_stop_credit"]
         interfaces = (relay.Node, )
+        connection_class = CountableConnection
+
+    payment = Field(lambda: PaymentNode, required=True)
+
+    def resolve_payment(self, info):
+        if Creditor.payment.is_cached(self):
+            return self.payment
+        return get_loaders(info.context).model(Payment).load(self.payment_id)
+
+
+class CreditTransactionNode(DjangoObjectType):
+    class Meta:
+        model = CreditTransaction
+        filter_fields = {
+            "creditor": ["exact"],
+            "created_at": ["gte", "lt"],
+        }
+        interfaces = (relay.Node, )
+        connection_class = CountableConnection
+
+    creditor = Field(lambda: CreditorNode, required=True)
+
+    def resolve_creditor(self, info):
+        if CreditTransaction.creditor.is_cached(self):
+            return self.creditor
+        return get_loaders(info.context).model(Creditor).load(self.creditor_id)
+
+    fuel = Field(lambda: FuelNode)
+
+    def resolve_fuel(self, info):
+        if self.fuel_id is None:
+            return None
+        if CreditTransaction.fuel.is_cached(self):
+            return self.fuel
+        return get_loaders(info.context).model(Fuel).load(self.fuel_id)
+
+
+class CreditCheck(ObjectType):
+    creditor_id = ID(required=True)
+    balance = Float(required=True)
+    limit_warning = Float(required=True)
+    limit_stop_credit = Float(required=True)
+    projected_balance = Float(required=True)
+    warning = Boolean(required=True)
+    allowed = Boolean(required=True)
+
+    def resolve_warning(self, info):
+        return self.projected_balance >= self.limit_warning
+
+    def resolve_allowed(self, info):
+        return self.projected_balance <= self.limit_stop_credit
+
+
+class CacheStats(ObjectType):
+    size = Int(required=True)
+    hits = Int(required=True)
+    misses = Int(required=True)
+
+
+class DocumentCacheStats(CacheStats):
+    max_size = Int(required=True)
+    persisted_hits = Int(required=True)
+    persisted_misses = Int(required=True)
+
+
+class CachesStats(ObjectType):
+    """
+    Counters of the per process caches, of the worker that served the request
+    """
+    documents = Field(DocumentCacheStats, required=True)
+    results = Field(CacheStats, required=True)
+    tokens = Field(CacheStats, required=True)
 
 
 class Query(ObjectType):
     # user query
-    users = DjangoFilterConnectionField(UserNode)
+    users = KeysetConnectionField(UserNode)
 
     @superuser_required
     def resolve_users(self, info, **kwargs):
         return User.objects.filter(is_staff=False)
 
     # fuel query
-    fuels = DjangoFilterConnectionField(FuelNode)
+    fuels = CachedConnectionField(FuelNode)
 
     @superuser_required
     def resolve_fuels(self, info, **kwargs):
         return Fuel.objects.all()
 
+    # fuel price history
+    fuel_prices = KeysetConnectionField(FuelPriceNode)
+
+    @superuser_required
+    def resolve_fuel_prices(self, info, **kwargs):
+        return FuelPrice.objects.all()
+
     # machine query
-    machines = DjangoFilterConnectionField(MachineNode)
+    machines = KeysetConnectionField(MachineNode)
 
     @superuser_required
     def resolve_machines(self, info, **kwargs):
         return Machine.objects.all()
 
+    # machine reading history and hourly / daily rollups
+    machine_readings = KeysetConnectionField(MachineReadingNode)
+    hourly_readings = KeysetConnectionField(HourlyReadingNode)
+    daily_readings = KeysetConnectionField(DailyReadingNode)
+
+    @superuser_required
+    def resolve_machine_readings(self, info, **kwargs):
+        return MachineReading.objects.all()
+
+    @superuser_required
+    def resolve_hourly_readings(self, info, **kwargs):
+        return HourlyReading.objects.all()
+
+    @superuser_required
+    def resolve_daily_readings(self, info, **kwargs):
+        return DailyReading.objects.all()
+
+    # daily station summary per fuel
+    daily_summaries = KeysetConnectionField(DailySummaryNode)
+
+    @superuser_required
+    def resolve_daily_summaries(self, info, **kwargs):
+        return DailySummary.objects.all()
+
     # payment query
-    payments = DjangoFilterConnectionField(PaymentNode)
+    payments = CachedConnectionField(PaymentNode)
 
     @superuser_required
     def resolve_payments(self, info, **kwargs):
         return Payment.objects.all()
 
     # creditor query
-    creditors = DjangoFilterConnectionField(CreditorNode)
+    creditors = KeysetConnectionField(CreditorNode)
 
     @superuser_required
     def resolve_creditors(self, info, **kwargs):
         return Creditor.objects.all()
 
+    # creditor ledger
+    credit_transactions = KeysetConnectionField(CreditTransactionNode)
+    credit_check = Field(CreditCheck, creditor_id=ID(required=True), amount=Float(required=True))
+
+    @superuser_required
+    def resolve_credit_transactions(self, info, **kwargs):
+        return CreditTransaction.objects.all()
+
+    @superuser_required
+    def resolve_credit_check(self, info, creditor_id, amount):
+        try:
+            pk = decode_id(creditor_id, CREDITOR_TYPES)
+        except ValueError as e:
+            raise GraphQLError(e)
+        check = credit_check(pk, amount)
+        if check is None:
+            raise GraphQLError("creditor does not exist")
+        return check._replace(creditor_id=creditor_id)
+
+    # cache hit / miss counters of this worker
+    cache_stats = Field(CachesStats, required=True)
+
+    @superuser_required
+    def resolve_cache_stats(self, info):
+        return {"documents": document_cache.stats(), "results": result_cache.stats(), "tokens": token_cache.stats()}
+
+
+class Subscription(ObjectType):
+    machine_reading_changed = Field(MachineNode, required=True, id=ID())
+    fuel_price_changed = Field(FuelNode, required=True, id=ID())
+
+    @superuser_required
+    async def subscribe_machine_reading_changed(self, info, id=None):
+        machine_id = int(from_global_id(id)[1]) if id else None
+        async for message in get_pubsub().subscribe(MACHINE_READING_CHANGED):
+            if machine_id is None or message["id"] == machine_id:
+                yield Machine(**message)
+
+    @superuser_required
+    async def subscribe_fuel_price_changed(self, info, id=None):
+        fuel_id = int(from_global_id(id)[1]) if id else None
+        async for message in get_pubsub().subscribe(FUEL_PRICE_CHANGED):
+            if fuel_id is None or message["id"] == fuel_id:
+                yield Fuel(**message)
+
 
-schema = Schema(query=Query, mutation=Mutation)
+schema = Schema(query=Query, mutation=Mutation, subscription=Subscription)
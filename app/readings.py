@@ -0,0 +1,261 @@
+from collections import namedtuple
+from datetime import timedelta
+from django.db import connection, transaction
+from django.db.models import OuterRef, Subquery, Sum
+from django.utils import timezone
+from .models import DailyReading, HourlyReading, Machine, MachineReading
+from .search import update_documents
+from .summaries import refresh_on_commit
+from .valuation import PriceTimeline
+
+ReadingEntry = namedtuple("ReadingEntry", ["machine_id", "recorded_at", "reading", "previous"])
+
+
+def hour_bucket(moment, tzinfo=None):
+    return timezone.localtime(moment, tzinfo).replace(minute=0, second=0, microsecond=0)
+
+
+def day_bucket(moment, tzinfo=None):
+    return timezone.localtime(moment, tzinfo).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+ROLLUPS = ((HourlyReading, hour_bucket), (DailyReading, day_bucket))
+
+
+def machine_entries(machines, previous, recorded_at=None):
+    """
+    Entries for machines whose reading was just set, previous maps machine id -> reading it replaced
+    """
+    recorded_at = recorded_at or timezone.now()
+    # Backends that can't return bulk inserted keys leave pk unset, those rows get no history
+    return [
+        ReadingEntry(machine.pk, recorded_at, machine.reading, previous.get(machine.pk))
+        for machine in machines
+        if machine.pk is not None
+    ]
+
+
+def entry_volumes(entries):
+    return [0.0 if entry.previous is None else entry.reading - entry.previous for entry in entries]
+
+
+def rollup_deltas(entries, volumes, amounts):
+    """
+    Fold entries into {rollup model: {(machine id, bucket): [min, max, volume, amount, samples]}}
+    """
+    tzinfo = timezone.get_current_timezone()
+    buckets = {}
+    deltas = {model: {} for model, bucket_of in ROLLUPS}
+    for entry, volume, amount in zip(entries, volumes, amounts):
+        moment_buckets = buckets.get(entry.recorded_at)
+        if moment_buckets is None:
+            moment_buckets = buckets[entry.recorded_at] = [
+                (model, bucket_of(entry.recorded_at, tzinfo)) for model, bucket_of in ROLLUPS
+            ]
+        start = entry.reading if entry.previous is None else entry.previous
+        for model, bucket in moment_buckets:
+            model_deltas = deltas[model]
+            delta = model_deltas.get((entry.machine_id, bucket))
+            if delta is None:
+                model_deltas[(entry.machine_id, bucket)] = [start, entry.reading, volume, amount, 1]
+                continue
+            if start < delta[0]:
+                delta[0] = start
+            if entry.reading > delta[1]:
+                delta[1] = entry.reading
+            delta[2] += volume
+            delta[3] += amount
+            delta[4] += 1
+    return deltas
+
+
+def adapter():
+    """
+    Memoized datetime -> database value conversion, readings of one import share their timestamps
+    """
+    adapted = {}
+
+    def adapt(moment):
+        value = adapted.get(moment)
+        if value is None:
+            value = adapted[moment] = connection.ops.adapt_datetimefield_value(moment)
+        return value
+
+    return adapt
+
+
+def columns(model, *names):
+    qn = connection.ops.quote_name
+    return [qn(model._meta.get_field(name).column) for name in names]
+
+
+def update_rollup(model, deltas):
+    # Create the missing buckets first so concurrent writers only ever increment
+    model.objects.bulk_create(
+        [
+            model(machine_id=machine_id, bucket=bucket, min_reading=low, max_reading=low)
+            for (machine_id, bucket), (low, high, volume, amount, samples) in deltas.items()
+        ],
+        ignore_conflicts=True,
+    )
+
+    low, high, volume, amount, samples, machine, bucket = columns(
+        model, "min_reading", "max_reading", "volume", "amount", "samples", "machine", "bucket"
+    )
+    sql = (
+        "UPDATE {table} SET "
+        "{low} = CASE WHEN {low} < %s THEN {low} ELSE %s END, "
+        "{high} = CASE WHEN {high} > %s THEN {high} ELSE %s END, "
+        "{volume} = {volume} + %s, {amount} = {amount} + %s, {samples} = {samples} + %s "
+        "WHERE {machine} = %s AND {bucket} = %s"
+    ).format(
+        table=connection.ops.quote_name(model._meta.db_table), low=low, high=high, volume=volume,
+        amount=amount, samples=samples, machine=machine, bucket=bucket,
+    )
+    adapt = adapter()
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            sql,
+            [
+                (delta[0], delta[0], delta[1], delta[1], delta[2], delta[3], delta[4], machine_id, adapt(moment))
+                for (machine_id, moment), delta in deltas.items()
+            ],
+        )
+
+
+def insert_history(entries, volumes):
+    """
+    Append entries to MachineReading with one executemany, large imports would otherwise
+    spend most of their time building model instances
+    """
+    sql = "INSERT INTO {} ({}) VALUES (%s, %s, %s, %s)".format(
+        connection.ops.quote_name(MachineReading._meta.db_table),
+        ", ".join(columns(MachineReading, "machine", "recorded_at", "reading", "volume")),
+    )
+    adapt = adapter()
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            sql,
+            [
+                (entry.machine_id, adapt(entry.recorded_at), entry.reading, volume)
+                for entry, volume in zip(entries, volumes)
+            ],
+        )
+
+
+def entry_amounts(entries, volumes):
+    """
+    Sales value of each entry at the price of its machine's fuel in effect when it was recorded
+    """
+    fuels = dict(
+        Machine.objects.filter(pk__in={entry.machine_id for entry in entries}).values_list("pk", "fuel_id")
+    )
+    moments = [entry.recorded_at for entry in entries]
+    timeline = PriceTimeline(fuels.values(), min(moments), max(moments))
+    prices = {}
+    amounts = []
+    for entry, volume in zip(entries, volumes):
+        if not volume:
+            amounts.append(0.0)
+            continue
+        # Machines on the same fuel share the price of a timestamp
+        key = (fuels.get(entry.machine_id), entry.recorded_at)
+        price = prices.get(key)
+        if price is None:
+            price = prices[key] = timeline.price(*key)
+        amounts.append(volume * price)
+    return amounts
+
+
+def record_readings(entries):
+    """
+    Append readings to the history and fold their volume and sales value into the hourly
+    and daily rollups. The volume of an entry is its reading minus the previous one, a first
+    reading has none. Returns the number of readings recorded
+    """
+    entries = list(entries)
+    if not entries:
+        return 0
+
+    volumes = entry_volumes(entries)
+    with transaction.atomic():
+        insert_history(entries, volumes)
+        rollups = rollup_deltas(entries, volumes, entry_amounts(entries, volumes))
+        for model, deltas in rollups.items():
+            update_rollup(model, deltas)
+        refresh_on_commit({bucket.date() for machine_id, bucket in rollups[DailyReading]})
+    return len(entries)
+
+
+def rollup_totals(model, field, start, end):
+    if start >= end:
+        return {}
+    rows = (
+        model.objects.filter(bucket__gte=start, bucket__lt=end)
+        .values("machine_id")
+        .annotate(total=Sum(field))
+        .order_by()
+    )
+    return {row["machine_id"]: row["total"] for row in rows}
+
+
+def totals_by_machine(field, start, end):
+    """
+    Sum of a rollup field per machine id between start and end (rounded down to the hour), read
+    from the daily rollups for whole days and the hourly rollups for the partial days around them
+    """
+    start, end = hour_bucket(start), hour_bucket(end)
+    first_day = day_bucket(start)
+    if first_day < start:
+        first_day += timedelta(days=1)
+    last_day = day_bucket(end)
+
+    if first_day >= last_day:
+        parts = [rollup_totals(HourlyReading, field, start, end)]
+    else:
+        parts = [
+            rollup_totals(HourlyReading, field, start, first_day),
+            rollup_totals(DailyReading, field, first_day, last_day),
+            rollup_totals(HourlyReading, field, last_day, end),
+        ]
+
+    totals = {}
+    for part in parts:
+        for machine_id, total in part.items():
+            totals[machine_id] = totals.get(machine_id, 0) + total
+    return totals
+
+
+def volume_by_machine(start, end):
+    return totals_by_machine("volume", start, end)
+
+
+def sales_by_machine(start, end):
+    return totals_by_machine("amount", start, end)
+
+
+def readings_before(moments):
+    """
+    Latest recorded reading of each machine at or before its moment in {machine id: moment},
+    one seek on (machine, recorded_at) per machine
+    """
+    readings = {}
+    for machine_id, moment in moments.items():
+        reading = (
+            MachineReading.objects.filter(machine_id=machine_id, recorded_at__lte=moment)
+            .order_by("-recorded_at", "-pk")
+            .values_list("reading", flat=True)
+            .first()
+        )
+        if reading is not None:
+            readings[machine_id] = reading
+    return readings
+
+
+def sync_machine_readings(machine_ids):
+    """
+    Point Machine.reading at the latest recorded reading of each machine
+    """
+    latest = MachineReading.objects.filter(machine_id=OuterRef("pk")).order_by("-recorded_at", "-pk")
+    Machine.objects.filter(pk__in=machine_ids).update(reading=Subquery(latest.values("reading")[:1]))
+    update_documents(Machine, machine_ids)
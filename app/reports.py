@@ -0,0 +1,86 @@
+import csv
+import json
+from collections import namedtuple
+from django.core.serializers.json import DjangoJSONEncoder
+from .models import Creditor, DailyReading, MachineReading
+
+# rows fetched from the database per round trip, also the rows written per streamed chunk
+REPORT_CHUNK_SIZE = 2000
+
+Report = namedtuple("Report", ["title", "columns", "fields", "queryset", "date_field"])
+
+
+class Echo:
+    """
+    File like object handing written lines straight back to the csv writer caller
+    """
+
+    def write(self, value):
+        return value
+
+
+REPORTS = {
+    "machines": Report(
+        title="Machine readings",
+        columns=["recorded_at", "machine", "fuel", "reading", "volume"],
+        fields=["recorded_at", "machine__name", "machine__fuel__type", "reading", "volume"],
+        queryset=lambda: MachineReading.objects.order_by("recorded_at", "pk"),
+        date_field="recorded_at",
+    ),
+    "fuels": Report(
+        title="Daily fuel sales",
+        columns=["day", "fuel", "machine", "volume", "amount"],
+        fields=["bucket", "machine__fuel__type", "machine__name", "volume", "amount"],
+        queryset=lambda: DailyReading.objects.order_by("bucket", "machine_id"),
+        date_field="bucket",
+    ),
+    "creditors": Report(
+        title="Creditors",
+        columns=["name", "payment", "limit_warning", "limit_stop_credit", "balance"],
+        fields=["name", "payment__mode", "limit_warning", "limit_stop_credit", "balance"],
+        queryset=lambda: Creditor.objects.order_by("pk"),
+        date_field=None,
+    ),
+}
+
+
+def report_rows(report, start=None, end=None):
+    """
+    Stream the report rows as tuples, reading REPORT_CHUNK_SIZE rows per database round trip
+    """
+    queryset = report.queryset()
+    if report.date_field and start:
+        queryset = queryset.filter(**{"{}__gte".format(report.date_field): start})
+    if report.date_field and end:
+        queryset = queryset.filter(**{"{}__lt".format(report.date_field): end})
+    return queryset.values_list(*report.fields).iterator(chunk_size=REPORT_CHUNK_SIZE)
+
+
+def chunked(rows, size=REPORT_CHUNK_SIZE):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def stream_csv(report, rows):
+    writer = csv.writer(Echo())
+    # The header goes out before the first query runs
+    yield writer.writerow(report.columns)
+    for chunk in chunked(rows):
+        yield "".join(writer.writerow(row) for row in chunk)
+
+
+def stream_jsonl(report, rows):
+    for chunk in chunked(rows):
+        yield "".join(json.dumps(dict(zip(report.columns, row)), cls=DjangoJSONEncoder) + "\n" for row in chunk)
+
+
+FORMATS = {
+    "csv": ("text/csv", stream_csv),
+    "jsonl": ("application/x-ndjson", stream_jsonl),
+}
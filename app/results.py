@@ -0,0 +1,68 @@
+import hashlib
+import json
+from collections import OrderedDict
+from threading import Lock
+from .versions import bump_cache_version, get_cache_version
+
+MAX_CACHED_RESULTS = 256
+
+
+def version_key(model):
+    return "graphql:version:{}".format(model._meta.label_lower)
+
+
+def get_version(model):
+    """
+    Current data version of a model, shared by every worker through the django cache
+    """
+    return get_cache_version(version_key(model))
+
+
+def bump_version(model):
+    bump_cache_version(version_key(model))
+
+
+class ResultCache:
+    """
+    Per process LRU of connection results. Entries are keyed by the shared model version,
+    so a change in any worker makes every worker miss and reload on its next request
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.results = OrderedDict()
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, model, arguments):
+        digest = hashlib.sha256(json.dumps(arguments, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        return "{}:{}:{}".format(model._meta.label_lower, get_version(model), digest)
+
+    def get_or_load(self, model, arguments, load):
+        key = self.key(model, arguments)
+        with self.lock:
+            if key in self.results:
+                self.results.move_to_end(key)
+                self.hits += 1
+                return self.results[key]
+            self.misses += 1
+
+        rows = load()
+        with self.lock:
+            self.results[key] = rows
+            while len(self.results) > self.max_size:
+                self.results.popitem(last=False)
+        return rows
+
+    def stats(self):
+        with self.lock:
+            return {"size": len(self.results), "hits": self.hits, "misses": self.misses}
+
+    def clear(self):
+        with self.lock:
+            self.results.clear()
+            self.hits = self.misses = 0
+
+
+result_cache = ResultCache(MAX_CACHED_RESULTS)
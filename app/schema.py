@@ -12,4 +12,8 @@ class Mutation(schema.mutation, graphene.ObjectType):
     verify_token = graphql_jwt.Verify.Field()
 
 
-schema = graphene.Schema(query=Query, mutation=Mutation)
+class Subscription(schema.subscription, graphene.ObjectType):
+    pass
+
+
+schema = graphene.Schema(query=Query, mutation=Mutation, subscription=Subscription)
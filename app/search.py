@@ -0,0 +1,274 @@
+from django.apps import apps
+from django.conf import settings
+from django.db import connections
+from django.db.models import CharField, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast, Concat
+from django.utils.module_loading import import_string
+from django.utils.text import smart_split, unescape_string_literal
+
+# Searchable models -> field paths joined into their search document (what their admin searches)
+SEARCH_DOCUMENTS = {
+    "app.User": ["name", "username", "authorisation"],
+    "app.Fuel": ["type", "price"],
+    "app.Machine": ["name", "fuel__type", "reading"],
+    "app.Creditor": ["payment__mode", "name", "limit_warning", "limit_stop_credit"],
+}
+
+# Documents are updated by primary key in batches of this many, under the backend parameter limits
+SEARCH_CHUNK_SIZE = 900
+
+# Fields are joined by a newline, no search term spans two of them (terms never contain one)
+SEPARATOR = "\n"
+
+
+def document_queryset(model, pks=None):
+    """
+    (pk, document) rows of model, built by the database so a batch of documents is one INSERT ... SELECT
+    """
+    parts = []
+    for path in SEARCH_DOCUMENTS[model._meta.label]:
+        if parts:
+            parts.append(Value(SEPARATOR))
+        parts.append(Cast(path, output_field=CharField()))
+    document = Concat(*parts, output_field=CharField()) if len(parts) > 1 else parts[0]
+    queryset = model._base_manager.all()
+    if pks is not None:
+        queryset = queryset.filter(pk__in=pks)
+    return queryset.order_by().values_list("pk", document)
+
+
+def search_terms(search_term):
+    """
+    The terms of an admin search, split the way ModelAdmin.get_search_results splits them
+    """
+    terms = []
+    for bit in smart_split(search_term):
+        if bit.startswith(('"', "'")) and bit[0] == bit[-1]:
+            bit = unescape_string_literal(bit)
+        terms.append(bit)
+    return terms
+
+
+class SearchBackend:
+    """
+    No index, every search falls back to the admin's icontains lookups
+    """
+
+    min_term_length = None
+
+    def install(self, model, using):
+        pass
+
+    def uninstall(self, model, using):
+        pass
+
+    def rebuild(self, model, using):
+        pass
+
+    def update(self, model, pks, using):
+        pass
+
+    def match(self, queryset, terms):
+        return None
+
+
+class TableSearchBackend(SearchBackend):
+    """
+    One search table per model, "<table>_search", holding (key column, body) rows that are
+    deleted and inserted again whenever their objects change
+    """
+
+    key_column = None
+
+    def table(self, model, using):
+        return connections[using].ops.quote_name("{}_search".format(model._meta.db_table))
+
+    def uninstall(self, model, using):
+        with connections[using].cursor() as cursor:
+            cursor.execute("DROP TABLE IF EXISTS {}".format(self.table(model, using)))
+
+    def rebuild(self, model, using):
+        with connections[using].cursor() as cursor:
+            cursor.execute("DELETE FROM {}".format(self.table(model, using)))
+        self.insert(model, None, using)
+
+    def update(self, model, pks, using):
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                "DELETE FROM {} WHERE {} IN ({})".format(self.table(model, using), self.key_column, ", ".join(["%s"] * len(pks))),
+                pks,
+            )
+        self.insert(model, pks, using)
+
+    def insert(self, model, pks, using):
+        """
+        Index the objects of pks (all of model when None), objects that no longer exist are skipped
+        """
+        sql, params = document_queryset(model, pks).using(using).query.sql_with_params()
+        with connections[using].cursor() as cursor:
+            cursor.execute("INSERT INTO {} ({}, body) {}".format(self.table(model, using), self.key_column, sql), params)
+
+
+class SqliteSearchBackend(TableSearchBackend):
+    """
+    SQLite FTS5 table per model whose rowid is the object's primary key. The trigram tokenizer
+    matches any substring of 3 characters or more, like icontains
+    """
+
+    key_column = "rowid"
+
+    def __init__(self, tokenize="trigram", min_term_length=3):
+        self.tokenize = tokenize
+        self.min_term_length = min_term_length
+
+    def install(self, model, using):
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS {} USING fts5(body, tokenize = '{}')".format(
+                    self.table(model, using), self.tokenize
+                )
+            )
+
+    def match(self, queryset, terms):
+        table = self.table(queryset.model, queryset.db)
+        expression = " AND ".join('"{}"'.format(term.replace('"', '""')) for term in terms)
+        return queryset.filter(
+            pk__in=RawSQL("SELECT rowid FROM {table} WHERE {table} MATCH %s".format(table=table), [expression])
+        )
+
+
+class MySQLSearchBackend(TableSearchBackend):
+    """
+    InnoDB table per model with a FULLTEXT index on the document. The ngram parser splits it into
+    ngram_token_size (2 by default) character tokens, so terms match inside words
+    """
+
+    key_column = "object_id"
+
+    def __init__(self, parser="ngram", min_term_length=2):
+        self.parser = parser
+        self.min_term_length = min_term_length
+
+    def install(self, model, using):
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                "CREATE TABLE IF NOT EXISTS {} (object_id BIGINT NOT NULL PRIMARY KEY, body LONGTEXT NOT NULL, "
+                "FULLTEXT KEY body (body){}) ENGINE=InnoDB".format(
+                    self.table(model, using), " WITH PARSER {}".format(self.parser) if self.parser else ""
+                )
+            )
+
+    def match(self, queryset, terms):
+        expression = " ".join('+"{}"'.format(term.replace('"', " ")) for term in terms)
+        return queryset.filter(
+            pk__in=RawSQL(
+                "SELECT object_id FROM {} WHERE MATCH (body) AGAINST (%s IN BOOLEAN MODE)".format(
+                    self.table(queryset.model, queryset.db)
+                ),
+                [expression],
+            )
+        )
+
+
+search_backends = {}
+
+
+def get_search_backend(using="default"):
+    """
+    The search backend of a database, ADMIN_SEARCH["BACKEND"] or the one matching its vendor
+    """
+    if using not in search_backends:
+        search_settings = getattr(settings, "ADMIN_SEARCH", {})
+        backend = search_settings.get("BACKEND") or {
+            "sqlite": "app.search.SqliteSearchBackend",
+            "mysql": "app.search.MySQLSearchBackend",
+        }.get(connections[using].vendor, "app.search.SearchBackend")
+        search_backends[using] = import_string(backend)(**search_settings.get("OPTIONS", {}))
+    return search_backends[using]
+
+
+def is_searchable(model):
+    return model._meta.label in SEARCH_DOCUMENTS
+
+
+def update_documents(model, pks, using="default"):
+    """
+    Rewrite the search documents of pks, objects that no longer exist drop out of the index.
+    Call it after writes that skip the save signals (bulk_create, bulk_update, update) and after
+    deletes that don't go through app.deletion.chunked_delete
+    """
+    if not is_searchable(model):
+        return
+    pks = list(pks)
+    backend = get_search_backend(using)
+    for position in range(0, len(pks), SEARCH_CHUNK_SIZE):
+        backend.update(model, pks[position:position + SEARCH_CHUNK_SIZE], using)
+
+
+def dependent_documents(model):
+    """
+    {(searchable model, relation to model): fields of model} of the documents that include fields of model
+    """
+    dependents = {}
+    for label, paths in SEARCH_DOCUMENTS.items():
+        searchable = apps.get_model(label)
+        for path in paths:
+            relation, _, field = path.partition("__")
+            if field and searchable._meta.get_field(relation).related_model is model:
+                dependents.setdefault((searchable, relation), set()).add(field.split("__")[0])
+    return dependents
+
+
+def update_dependent_documents(model, pks, using="default", update_fields=None):
+    """
+    Rewrite the documents that include fields of the objects pks of model
+    """
+    for (searchable, relation), fields in dependent_documents(model).items():
+        if update_fields is not None and not fields & set(update_fields):
+            continue
+        update_documents(
+            searchable,
+            searchable._base_manager.using(using).filter(**{"{}__in".format(relation): pks}).values_list("pk", flat=True),
+            using,
+        )
+
+
+def search(queryset, search_term):
+    """
+    (queryset narrowed to the objects whose document contains every term the index can match,
+    the search term left for the icontains lookups), or None when the index can't match any
+    """
+    if not is_searchable(queryset.model):
+        return None
+    backend = get_search_backend(queryset.db)
+    if backend.min_term_length is None:
+        return None
+    indexed, rest = [], []
+    for term in search_terms(search_term):
+        if len(term) >= backend.min_term_length:
+            indexed.append(term)
+        elif '"' in term or "\\" in term:
+            return None
+        else:
+            # Quoted so smart_split gives the term back unchanged
+            rest.append(term if term.isalnum() else '"{}"'.format(term))
+    if not indexed:
+        return None
+    return backend.match(queryset, indexed), " ".join(rest)
+
+
+def install_search_index(models, using="default"):
+    """
+    Create the search tables of models and index every object
+    """
+    backend = get_search_backend(using)
+    for model in models:
+        backend.install(model, using)
+        backend.rebuild(model, using)
+
+
+def uninstall_search_index(models, using="default"):
+    backend = get_search_backend(using)
+    for model in models:
+        backend.uninstall(model, using)
@@ -0,0 +1,44 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .auth import bump_user_version
+from .models import Creditor, Fuel, Machine, Payment, User
+from .results import bump_version
+from .search import SEARCH_DOCUMENTS, update_dependent_documents, update_documents
+
+
+# Invalidate cached GraphQL results of reference data once the change is committed
+@receiver(post_save, sender=Fuel)
+@receiver(post_delete, sender=Fuel)
+@receiver(post_save, sender=Payment)
+@receiver(post_delete, sender=Payment)
+def invalidate_reference_data(sender, **kwargs):
+    transaction.on_commit(lambda: bump_version(sender))
+
+
+# Drop verified token snapshots of a user whose row changed
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_tokens(sender, instance, **kwargs):
+    # Deleting clears instance.pk before the commit, bind the pk now
+    pk = instance.pk
+    transaction.on_commit(lambda: bump_user_version(pk))
+
+
+# Keep the admin search index in step with the rows (in the same transaction). Deletes go
+# through app.deletion.chunked_delete, which updates the index once per deleted batch
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Fuel)
+@receiver(post_save, sender=Machine)
+@receiver(post_save, sender=Creditor)
+def update_search_document(sender, instance, using, update_fields=None, **kwargs):
+    fields = {path.split("__")[0] for path in SEARCH_DOCUMENTS[sender._meta.label]}
+    if update_fields is None or fields & set(update_fields):
+        update_documents(sender, [instance.pk], using)
+
+
+# Fuel types and payment modes are part of the machine and creditor documents
+@receiver(post_save, sender=Fuel)
+@receiver(post_save, sender=Payment)
+def update_dependent_search_documents(sender, instance, using, update_fields=None, **kwargs):
+    update_dependent_documents(sender, [instance.pk], using, update_fields)
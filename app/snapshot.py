@@ -0,0 +1,224 @@
+import json
+import os
+import shutil
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.db import connection, transaction
+from django.db.models import Max
+from django.db.models.functions import Length
+from django.utils import timezone
+import numpy as np
+from .models import CreditTransaction, Creditor, DailyReading, Fuel, FuelPrice, Machine, MachineReading, Payment
+
+SNAPSHOT_FORMAT = 1
+SNAPSHOT_CHUNK_SIZE = 100000
+MANIFEST = "manifest.json"
+
+DATETIME = np.dtype("datetime64[us]")
+DATE = np.dtype("datetime64[D]")
+# Database datetimes are naive UTC unless the backend returns them aware
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+# full: rewritten on every export (rows are updated in place), append: only rows past the pk watermark
+SnapshotTable = namedtuple("SnapshotTable", ["model", "mode"])
+
+SNAPSHOT_TABLES = {
+    "fuel": SnapshotTable(Fuel, "full"),
+    "fuel_price": SnapshotTable(FuelPrice, "full"),
+    "machine": SnapshotTable(Machine, "full"),
+    "payment": SnapshotTable(Payment, "full"),
+    "creditor": SnapshotTable(Creditor, "full"),
+    "daily_reading": SnapshotTable(DailyReading, "full"),
+    "machine_reading": SnapshotTable(MachineReading, "append"),
+    "credit_transaction": SnapshotTable(CreditTransaction, "append"),
+}
+
+INTEGER_FIELDS = {
+    "AutoField", "BigAutoField", "SmallAutoField", "IntegerField", "BigIntegerField", "SmallIntegerField",
+    "PositiveIntegerField", "PositiveBigIntegerField", "PositiveSmallIntegerField", "ForeignKey", "OneToOneField",
+}
+
+
+def column_dtype(model, field):
+    """
+    NumPy dtype of a column, strings are fixed width so every file stays memory mappable
+    """
+    internal_type = field.get_internal_type()
+    if internal_type in INTEGER_FIELDS:
+        return np.dtype("<i8")
+    if internal_type in ("FloatField", "DecimalField"):
+        return np.dtype("<f8")
+    if internal_type == "BooleanField":
+        return np.dtype("?")
+    if internal_type == "DateTimeField":
+        return DATETIME
+    if internal_type == "DateField":
+        return DATE
+    width = field.max_length or model.objects.aggregate(width=Max(Length(field.name)))["width"]
+    return np.dtype("<U{}".format(max(width or 0, 1)))
+
+
+def fill_value(dtype):
+    if dtype.kind == "M":
+        return EPOCH if dtype == DATETIME else EPOCH.date()
+    if dtype.kind == "U":
+        return ""
+    return dtype.type(0)
+
+
+def column_array(values, dtype, nullable):
+    """
+    Column chunk as an array of dtype, with the null mask of a nullable column. Dates and times
+    go through integer offsets from the epoch, numpy parses datetime objects one by one
+    """
+    mask = None
+    if nullable:
+        mask = np.fromiter((value is None for value in values), dtype="?", count=len(values))
+        if mask.any():
+            fill = fill_value(dtype)
+            values = [fill if value is None else value for value in values]
+
+    if dtype == DATETIME:
+        epoch = EPOCH if values[0].tzinfo is None else EPOCH.replace(tzinfo=dt_timezone.utc)
+        array = np.fromiter(((value - epoch) // MICROSECOND for value in values), dtype="<i8", count=len(values)).view(dtype)
+    elif dtype == DATE:
+        epoch = EPOCH.date()
+        array = np.fromiter(((value - epoch).days for value in values), dtype="<i8", count=len(values)).view(dtype)
+    else:
+        array = np.array(values, dtype=dtype)
+
+    if mask is not None and dtype.kind == "M":
+        array[mask] = np.datetime64("NaT")
+    return array, mask
+
+
+def write_part(directory, model, columns, rows, after, upto):
+    """
+    Write the rows with after < pk <= upto as one .npy file per column (plus one null mask per
+    nullable column), filled chunk by chunk through memory maps. Returns the rows written
+    """
+    # Left over by an export that failed before its manifest was written
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+    queryset = model.objects.filter(pk__gt=after, pk__lte=upto).order_by("pk")
+    files = {}
+    for name, field, dtype in columns:
+        files[name] = np.lib.format.open_memmap(os.path.join(directory, name + ".npy"), mode="w+", dtype=dtype, shape=(rows,))
+        if field.null:
+            files[name + ".null"] = np.lib.format.open_memmap(
+                os.path.join(directory, name + ".null.npy"), mode="w+", dtype="?", shape=(rows,)
+            )
+
+    sql, params = queryset.values_list(*[field.attname for name, field, dtype in columns]).query.sql_with_params()
+    written = 0
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        while written < rows:
+            chunk = cursor.fetchmany(min(SNAPSHOT_CHUNK_SIZE, rows - written))
+            if not chunk:
+                break
+            for (name, field, dtype), values in zip(columns, zip(*chunk)):
+                array, mask = column_array(values, dtype, field.null)
+                files[name][written:written + len(chunk)] = array
+                if mask is not None:
+                    files[name + ".null"][written:written + len(chunk)] = mask
+            written += len(chunk)
+
+    for name, array in files.items():
+        array.flush()
+        if written < rows:
+            # Rows deleted between the count and the read
+            np.save(os.path.join(directory, name + ".npy"), np.array(array[:written]))
+    return written
+
+
+def read_manifest(path):
+    try:
+        with open(os.path.join(path, MANIFEST), encoding="utf-8") as manifest:
+            return json.load(manifest)
+    except FileNotFoundError:
+        return {"format": SNAPSHOT_FORMAT, "tables": {}}
+
+
+def write_manifest(path, manifest):
+    """
+    Replace the manifest atomically, readers see either the previous or the new snapshot
+    """
+    temporary = os.path.join(path, MANIFEST + ".tmp")
+    with open(temporary, "w", encoding="utf-8") as output:
+        json.dump(manifest, output, indent=2)
+    os.replace(temporary, os.path.join(path, MANIFEST))
+
+
+def export_table(path, name, table, previous, full=False):
+    """
+    Export one table under path/name and return its manifest entry. Full tables, schema changes
+    and full=True write one part replacing the previous ones, append tables add a part with
+    the rows past the pk watermark
+    """
+    model = table.model
+    columns = [(field.attname, field, column_dtype(model, field)) for field in model._meta.concrete_fields]
+    schema = {column: dtype.str for column, field, dtype in columns}
+
+    replace = full or table.mode == "full" or previous is None or previous["columns"] != schema
+    parts = [] if replace else [part for part in previous["parts"] if part["rows"]]
+    after = 0 if replace else previous["watermark"]
+    sequence = max([part["sequence"] for part in (previous or {}).get("parts", [])] + [0]) + 1
+
+    upto = model.objects.aggregate(latest=Max("pk"))["latest"] or 0
+    rows = model.objects.filter(pk__gt=after, pk__lte=upto).count()
+    if rows or replace:
+        part = "{}/{:06d}".format(name, sequence)
+        written = write_part(os.path.join(path, part), model, columns, rows, after, upto)
+        parts.append({"sequence": sequence, "path": part, "rows": written, "first_pk": after + 1, "last_pk": upto})
+
+    return {
+        "model": model._meta.label,
+        "mode": table.mode,
+        "columns": schema,
+        "nullable": [column for column, field, dtype in columns if field.null],
+        "watermark": max(upto, after),
+        "rows": sum(part["rows"] for part in parts),
+        "parts": parts,
+    }
+
+
+def export_snapshot(path, names=None, full=False):
+    """
+    Export the tables (all of SNAPSHOT_TABLES by default) into path, read in one transaction so
+    they are consistent with each other. Parts no longer in the manifest are removed once it
+    has been replaced. Returns the new manifest
+    """
+    os.makedirs(path, exist_ok=True)
+    manifest = read_manifest(path)
+    previous = manifest["tables"]
+    tables = dict(previous)
+    with transaction.atomic():
+        for name in names or SNAPSHOT_TABLES:
+            tables[name] = export_table(path, name, SNAPSHOT_TABLES[name], previous.get(name), full)
+
+    manifest = {"format": SNAPSHOT_FORMAT, "exported_at": timezone.now().isoformat(), "tables": tables}
+    write_manifest(path, manifest)
+
+    for name, entry in previous.items():
+        kept = {part["path"] for part in tables[name]["parts"]}
+        for part in entry["parts"]:
+            if part["path"] not in kept:
+                shutil.rmtree(os.path.join(path, part["path"]), ignore_errors=True)
+    return manifest
+
+
+def load_table(path, name, mmap_mode="r"):
+    """
+    {column: array} of an exported table. A table in one part is memory mapped without copying,
+    the parts of an incrementally exported table are concatenated (export with full=True to
+    merge them). Null masks are returned as "<column>.null"
+    """
+    entry = read_manifest(path)["tables"][name]
+    names = list(entry["columns"]) + [column + ".null" for column in entry["nullable"]]
+    arrays = {}
+    for column in names:
+        parts = [np.load(os.path.join(path, part["path"], column + ".npy"), mmap_mode=mmap_mode) for part in entry["parts"]]
+        arrays[column] = parts[0] if len(parts) == 1 else np.concatenate(parts)
+    return arrays
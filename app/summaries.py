@@ -0,0 +1,208 @@
+import logging
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from django.db import connection, transaction
+from django.db.models import Max, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from .models import CreditTransaction, DailyReading, DailySummary, MachineReading, SummaryWatermark
+
+logger = logging.getLogger(__name__)
+
+# Days recomputed per statement, keeps the day__in lists well under the backend parameter limits
+SUMMARY_CHUNK_DAYS = 100
+
+# Append only sources whose new rows mark days to refresh: watermark name -> (model, timestamp field)
+WATERMARKS = {
+    "machine_reading": (MachineReading, "recorded_at"),
+    "credit_transaction": (CreditTransaction, "created_at"),
+}
+
+
+def day_start(day, tzinfo):
+    return timezone.make_aware(datetime.combine(day, time.min), tzinfo)
+
+
+def day_totals(days, tzinfo):
+    """
+    {(day, fuel_id): [litres, revenue, credit_issued]} of days, from the daily reading rollups and the
+    credit sales of the ledger
+    """
+    start, end = day_start(days[0], tzinfo), day_start(days[-1] + timedelta(days=1), tzinfo)
+    totals = defaultdict(lambda: [0.0, 0.0, 0.0])
+
+    sales = (
+        DailyReading.objects.filter(bucket__gte=start, bucket__lt=end)
+        .annotate(day=TruncDate("bucket", tzinfo=tzinfo))
+        .filter(day__in=days)
+        .values("day", "machine__fuel_id")
+        .annotate(litres=Sum("volume"), revenue=Sum("amount"))
+        .order_by()
+    )
+    for row in sales:
+        total = totals[(row["day"], row["machine__fuel_id"])]
+        total[0], total[1] = row["litres"] or 0.0, row["revenue"] or 0.0
+
+    credit = (
+        CreditTransaction.objects.filter(created_at__gte=start, created_at__lt=end, amount__gt=0)
+        .annotate(day=TruncDate("created_at", tzinfo=tzinfo))
+        .filter(day__in=days)
+        .values("day", "fuel_id")
+        .annotate(issued=Sum("amount"))
+        .order_by()
+    )
+    for row in credit:
+        totals[(row["day"], row["fuel_id"])][2] = row["issued"] or 0.0
+    return totals
+
+
+def update_summaries(summaries, now):
+    """
+    Write the totals of changed summaries with one executemany, bulk_update builds a CASE per
+    column and row which costs more than the refresh itself
+    """
+    qn = connection.ops.quote_name
+    names = [qn(DailySummary._meta.get_field(name).column) for name in ("litres", "revenue", "credit_issued", "refreshed_at", "id")]
+    refreshed_at = connection.ops.adapt_datetimefield_value(now)
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            "UPDATE {} SET {} = %s, {} = %s, {} = %s, {} = %s WHERE {} = %s".format(qn(DailySummary._meta.db_table), *names),
+            [
+                (summary.litres, summary.revenue, summary.credit_issued, refreshed_at, summary.pk)
+                for summary in summaries
+            ],
+        )
+
+
+def refresh_chunk(days, tzinfo):
+    totals = day_totals(days, tzinfo)
+    now = timezone.now()
+    changed, stale = [], []
+    for summary in DailySummary.objects.select_for_update().filter(day__in=days):
+        values = totals.pop((summary.day, summary.fuel_id), None)
+        if values is None:
+            stale.append(summary.pk)
+        elif [summary.litres, summary.revenue, summary.credit_issued] != values:
+            summary.litres, summary.revenue, summary.credit_issued = values
+            summary.refreshed_at = now
+            changed.append(summary)
+
+    if stale:
+        DailySummary.objects.filter(pk__in=stale).delete()
+    if changed:
+        update_summaries(changed, now)
+    create_summaries(totals, now)
+
+
+def create_summaries(totals, now):
+    """
+    Insert the summaries of totals, those a concurrent refresh inserted first are updated instead.
+    The conflict target can't name the partial constraint of the rows without fuel, they are
+    upserted one by one (one per day at most)
+    """
+    rows = sorted(totals.items(), key=lambda item: (item[0][0], item[0][1] or 0))
+    DailySummary.objects.bulk_create(
+        [
+            DailySummary(day=day, fuel_id=fuel_id, litres=litres, revenue=revenue, credit_issued=credit_issued, refreshed_at=now)
+            for (day, fuel_id), (litres, revenue, credit_issued) in rows
+            if fuel_id is not None
+        ],
+        update_conflicts=True,
+        # the attname, Django 4.1 writes unique_fields into ON CONFLICT as they are
+        unique_fields=["day", "fuel_id"],
+        update_fields=["litres", "revenue", "credit_issued", "refreshed_at"],
+    )
+    for (day, fuel_id), (litres, revenue, credit_issued) in rows:
+        if fuel_id is None:
+            DailySummary.objects.update_or_create(
+                day=day, fuel=None, defaults={"litres": litres, "revenue": revenue, "credit_issued": credit_issued}
+            )
+
+
+def refresh_days(days):
+    """
+    Recompute the summaries of days (local dates) in place, returns the number of days refreshed
+    """
+    days = sorted(set(days))
+    tzinfo = timezone.get_current_timezone()
+    with transaction.atomic():
+        for position in range(0, len(days), SUMMARY_CHUNK_DAYS):
+            refresh_chunk(days[position:position + SUMMARY_CHUNK_DAYS], tzinfo)
+    return len(days)
+
+
+def refresh_on_commit(days):
+    """
+    Refresh the summaries of days once the current transaction commits. A failed refresh is
+    only logged, manage.py refresh_daily_summaries catches up from the watermarks
+    """
+    days = set(days)
+    if not days:
+        return
+
+    def refresh():
+        try:
+            refresh_days(days)
+        except Exception:
+            logger.exception("daily summary refresh of %d days failed", len(days))
+
+    transaction.on_commit(refresh)
+
+
+def touched_days(model, field, after, upto, tzinfo):
+    return set(
+        model.objects.filter(pk__gt=after, pk__lte=upto)
+        .annotate(day=TruncDate(field, tzinfo=tzinfo))
+        .values_list("day", flat=True)
+        .distinct()
+        .order_by()
+    )
+
+
+def refresh_since_watermarks():
+    """
+    Refresh the days of the readings and ledger entries added since the last run and move the
+    watermarks past them, returns the refreshed days
+    """
+    tzinfo = timezone.get_current_timezone()
+    days = set()
+    with transaction.atomic():
+        for name, (model, field) in WATERMARKS.items():
+            SummaryWatermark.objects.get_or_create(name=name)
+        watermarks = {mark.name: mark for mark in SummaryWatermark.objects.select_for_update().filter(name__in=WATERMARKS)}
+
+        for name, (model, field) in WATERMARKS.items():
+            mark = watermarks[name]
+            latest = model.objects.aggregate(latest=Max("pk"))["latest"] or 0
+            if latest > mark.value:
+                days |= touched_days(model, field, mark.value, latest, tzinfo)
+                mark.value = latest
+                mark.save(update_fields=["value"])
+
+        refresh_days(days)
+    return sorted(days)
+
+
+def all_days():
+    """
+    Every local date with a daily rollup, a ledger entry or a summary
+    """
+    tzinfo = timezone.get_current_timezone()
+    days = set(
+        DailyReading.objects.annotate(day=TruncDate("bucket", tzinfo=tzinfo))
+        .values_list("day", flat=True).distinct().order_by()
+    )
+    days |= set(
+        CreditTransaction.objects.annotate(day=TruncDate("created_at", tzinfo=tzinfo))
+        .values_list("day", flat=True).distinct().order_by()
+    )
+    days |= set(DailySummary.objects.values_list("day", flat=True).distinct().order_by())
+    return days
+
+
+def recent_summaries(days=14):
+    """
+    Summaries of the last days up to today, newest first
+    """
+    since = timezone.localdate() - timedelta(days=days - 1)
+    return DailySummary.objects.filter(day__gte=since).select_related("fuel").order_by("-day", "fuel__type")
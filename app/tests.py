@@ -1 +1,1081 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import shutil
+import socket
+import tempfile
+from datetime import datetime, timedelta
+from unittest import mock
+from asgiref.sync import sync_to_async
+from django.contrib import admin
+from django.contrib.admin import AdminSite
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Max
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from graphql_jwt.shortcuts import get_token
+from graphql import parse
+from graphql.language.ast import FragmentDefinitionNode
+from graphql_relay import to_global_id
+import numpy as np
+from .admin import FuelAdmin, MachineAdmin
+from .anomalies import DEFAULT_SETTINGS, JUMP, ROLLBACK, STUCK, detect_anomalies
+from .checks import check_filter_indexes
+from .cost import check_query_cost, cost_plan_cache
+from .auth import get_user_version, token_cache
+from .credit import CreditLimitExceeded, credit_check, post_transaction
+from .deletion import chunked_delete
+from .documents import document_cache, query_hash
+from .models import (
+    Creditor, CreditTransaction, DailyReading, DailySummary, Fuel, HourlyReading, Machine, MachineReading, MeterAnomaly,
+    Payment, User,
+)
+from .optimizer import get_node_fields, plan_fields
+from .management.commands.pubsub_broker import Command as BrokerCommand
+from .pagination import EstimatedCountPaginator
+from .pubsub import BROKER_SUBSCRIBE, MACHINE_READING_CHANGED, BrokerPubSub, LocalPubSub, get_pubsub
+from .readings import ReadingEntry, record_readings
+from .results import get_version, result_cache, version_key
+from .schema import schema
+from .search import search
+from .snapshot import export_snapshot, load_table, read_manifest
+from .summaries import create_summaries
+from .valuation import PRICE_HISTORY_START, set_fuel_price
+from .views import AsyncGraphQLView
+from .websocket import GRAPHQL_TRANSPORT_WS, GraphQLWebSocketApp
+
+
+def create_superuser(username="9000000000"):
+    return User.objects.create_superuser(username=username, password="secret", name="admin")
+
+
+def graphql_request(user):
+    request = RequestFactory().post("/graphql")
+    request.user = user
+    return request
+
+
+# REPORTS
+class ReportExportTests(TestCase):
+    def setUp(self):
+        self.client.force_login(create_superuser())
+
+    def test_bad_format_is_plain_text(self):
+        response = self.client.get("/admin/app/report/machines/", {"format": "<script>alert(1)</script>"})
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+
+    def test_bad_date_is_plain_text(self):
+        response = self.client.get("/admin/app/report/machines/", {"start": "<b>x</b>"})
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+
+    def test_end_date_includes_the_whole_day(self):
+        machine = Machine.objects.create(name="Pump", fuel=Fuel.objects.create(type="Petrol", price=1), reading=0)
+        for hour in (0, 23):
+            MachineReading.objects.create(
+                machine=machine, reading=hour, recorded_at=timezone.make_aware(datetime(2024, 5, 2, hour, 30))
+            )
+        MachineReading.objects.create(machine=machine, reading=99, recorded_at=timezone.make_aware(datetime(2024, 5, 3, 0, 30)))
+
+        response = self.client.get("/admin/app/report/machines/", {"format": "csv", "start": "2024-05-02", "end": "2024-05-02"})
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 3)
+
+
+# CACHE VERSIONS
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class VersionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_version_is_stable_until_a_change(self):
+        version = get_version(Fuel)
+        self.assertEqual(get_version(Fuel), version)
+        with self.captureOnCommitCallbacks(execute=True):
+            Fuel.objects.create(type="Diesel", price=1)
+        self.assertNotEqual(get_version(Fuel), version)
+
+    def test_culled_version_never_repeats(self):
+        seen = {get_version(Fuel)}
+        for _ in range(3):
+            cache.delete(version_key(Fuel))
+            version = get_version(Fuel)
+            self.assertNotIn(version, seen)
+            seen.add(version)
+
+    def test_user_delete_changes_its_version(self):
+        user = create_superuser()
+        pk = user.pk
+        version = get_user_version(pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            user.delete()
+        self.assertNotEqual(get_user_version(pk), version)
+
+
+# DAILY SUMMARIES
+class DailySummaryTests(TestCase):
+    def test_create_summaries_twice_updates_in_place(self):
+        fuel = Fuel.objects.create(type="Petrol", price=1)
+        day = datetime(2024, 5, 2).date()
+        create_summaries({(day, fuel.pk): [1.0, 2.0, 0.0], (day, None): [0.0, 0.0, 5.0]}, timezone.now())
+        create_summaries({(day, fuel.pk): [3.0, 6.0, 0.0], (day, None): [0.0, 0.0, 7.0]}, timezone.now())
+
+        self.assertEqual(DailySummary.objects.count(), 2)
+        self.assertEqual(DailySummary.objects.get(fuel=fuel).litres, 3.0)
+        self.assertEqual(DailySummary.objects.get(fuel=None).credit_issued, 7.0)
+
+
+# CREDIT LEDGER
+class CreditLimitTests(TestCase):
+    def setUp(self):
+        payment = Payment.objects.create(mode="Credit")
+        self.creditor = Creditor.objects.create(payment=payment, name="Acme", limit_warning=50, limit_stop_credit=100)
+        self.request = graphql_request(create_superuser())
+
+    def test_sale_up_to_the_limit_is_allowed(self):
+        post_transaction(self.creditor.pk, 100)
+        self.creditor.refresh_from_db()
+        self.assertEqual(self.creditor.balance, 100)
+
+    def test_sale_over_the_limit_is_rejected(self):
+        post_transaction(self.creditor.pk, 60)
+        with self.assertRaises(CreditLimitExceeded):
+            post_transaction(self.creditor.pk, 40.5)
+        self.creditor.refresh_from_db()
+        self.assertEqual(self.creditor.balance, 60)
+        self.assertEqual(CreditTransaction.objects.count(), 1)
+
+    def test_sales_checked_against_the_same_balance_cant_both_pass(self):
+        # Both sales fit the balance they were checked against, together they don't
+        checks = [credit_check(self.creditor.pk, 60) for _ in range(2)]
+        self.assertTrue(all(check.projected_balance <= check.limit_stop_credit for check in checks))
+        post_transaction(self.creditor.pk, 60)
+        with self.assertRaises(CreditLimitExceeded):
+            post_transaction(self.creditor.pk, 60)
+
+    def test_unknown_creditor(self):
+        with self.assertRaises(Creditor.DoesNotExist):
+            post_transaction(self.creditor.pk + 1, 10)
+
+    def test_mutation_reports_unknown_creditor(self):
+        result = schema.execute(
+            "mutation($id: ID!) { recordCreditTransaction(creditor: $id, amount: 10) { balance } }",
+            variable_values={"id": to_global_id("CreditorType", self.creditor.pk + 1)},
+            context_value=self.request,
+        )
+        self.assertEqual(result.errors[0].message, "creditor does not exist")
+
+    def credit_check_errors(self, creditor_id):
+        result = schema.execute(
+            "query($id: ID!) { creditCheck(creditorId: $id, amount: 10) { allowed } }",
+            variable_values={"id": creditor_id},
+            context_value=self.request,
+        )
+        return [error.message for error in result.errors or []]
+
+    def test_credit_check(self):
+        self.assertEqual(self.credit_check_errors(to_global_id("CreditorNode", self.creditor.pk)), [])
+
+    def test_credit_check_of_unknown_creditor(self):
+        self.assertEqual(self.credit_check_errors(to_global_id("CreditorNode", self.creditor.pk + 1)), ["creditor does not exist"])
+
+    def test_credit_check_of_malformed_id(self):
+        for creditor_id in ("nonsense", to_global_id("FuelNode", self.creditor.pk)):
+            self.assertEqual(self.credit_check_errors(creditor_id), ["invalid id {}".format(creditor_id)])
+
+
+# CONNECTIONS
+class KeysetConnectionTests(TestCase):
+    query = """
+        query($first: Int, $after: String, $last: Int, $before: String) {
+            fuels(first: $first, after: $after, last: $last, before: $before) {
+                edges { node { type } }
+                pageInfo { startCursor endCursor hasNextPage hasPreviousPage }
+            }
+        }
+    """
+
+    def setUp(self):
+        self.request = graphql_request(create_superuser())
+        self.types = ["Fuel {}".format(number) for number in range(5)]
+        for fuel_type in self.types:
+            Fuel.objects.create(type=fuel_type, price=1)
+
+    def page(self, **variables):
+        result = schema.execute(self.query, variable_values=variables, context_value=self.request)
+        self.assertIsNone(result.errors)
+        fuels = result.data["fuels"]
+        return [edge["node"]["type"] for edge in fuels["edges"]], fuels["pageInfo"]
+
+    def test_forward_pages_cover_every_row_once(self):
+        seen, after, has_next = [], None, True
+        while has_next:
+            types, page_info = self.page(first=2, after=after)
+            seen += types
+            after, has_next = page_info["endCursor"], page_info["hasNextPage"]
+        self.assertEqual(seen, self.types)
+
+    def test_backward_page_from_a_cursor(self):
+        types, page_info = self.page(first=3)
+        self.assertEqual(self.page(last=2, before=page_info["endCursor"])[0], self.types[:2])
+
+    def test_invalid_cursor(self):
+        result = schema.execute(self.query, variable_values={"after": "nonsense"}, context_value=self.request)
+        self.assertTrue(result.errors[0].message.startswith("Invalid cursor"))
+
+
+# ADMIN PAGINATION
+class EstimatedCountPaginatorTests(TestCase):
+    def setUp(self):
+        for number in range(5):
+            Fuel.objects.create(type="Fuel {}".format(number), price=number)
+
+    def test_small_unfiltered_list_is_counted_exactly(self):
+        paginator = EstimatedCountPaginator(Fuel.objects.order_by("pk"), 2)
+        self.assertEqual((paginator.count, paginator.exact, paginator.estimated), (5, True, False))
+        self.assertEqual(paginator.num_pages, 3)
+
+    @override_settings(ADMIN_PAGINATION={"ESTIMATE_THRESHOLD": 1000})
+    def test_large_unfiltered_list_uses_the_estimate(self):
+        with mock.patch("app.pagination.estimate_rows", return_value=50000):
+            paginator = EstimatedCountPaginator(Fuel.objects.order_by("pk"), 2)
+            self.assertEqual((paginator.count, paginator.exact, paginator.estimated), (50000, False, True))
+            page = paginator.page(3)
+        self.assertEqual(len(page.object_list), 1)
+        self.assertFalse(page.has_next())
+
+    @override_settings(ADMIN_PAGINATION={"COUNT_CAP": 3})
+    def test_filtered_list_count_is_capped(self):
+        paginator = EstimatedCountPaginator(Fuel.objects.filter(price__gte=0).order_by("pk"), 2)
+        self.assertEqual((paginator.count, paginator.exact, paginator.estimated), (4, False, False))
+        page = paginator.page(2)
+        self.assertTrue(page.has_next())
+        self.assertEqual(paginator.get_elided_page_range(2), [2])
+
+    @override_settings(ADMIN_PAGINATION={"COUNT_CAP": 10})
+    def test_filtered_list_under_the_cap_is_exact(self):
+        paginator = EstimatedCountPaginator(Fuel.objects.filter(price__gte=1).order_by("pk"), 2)
+        self.assertEqual((paginator.count, paginator.exact), (4, True))
+
+
+# ADMIN SEARCH
+class FullTextSearchTests(TestCase):
+    terms = ["Petrol", "etro", "PETROL", "di", "Pump 2", "2", "premium diesel", "\"Pump 1\"", "nothing", "1.5"]
+
+    def setUp(self):
+        petrol = Fuel.objects.create(type="Petrol", price=1.5)
+        diesel = Fuel.objects.create(type="Premium Diesel", price=2)
+        for number, fuel in enumerate([petrol, diesel, petrol]):
+            Machine.objects.create(name="Pump {}".format(number), fuel=fuel, reading=number * 10)
+        self.petrol_machines = list(petrol.machine_set.values_list("pk", flat=True))
+
+    def assertMatchesIcontains(self, model_admin):
+        queryset = model_admin.model.objects.all()
+        for term in self.terms:
+            indexed, _ = model_admin.get_search_results(None, queryset, term)
+            plain, _ = admin.ModelAdmin.get_search_results(model_admin, None, queryset, term)
+            self.assertEqual(set(indexed.values_list("pk", flat=True)), set(plain.values_list("pk", flat=True)), term)
+
+    def test_fuel_search_matches_icontains(self):
+        self.assertIsNotNone(search(Fuel.objects.all(), "Petrol"))
+        self.assertMatchesIcontains(FuelAdmin(Fuel, admin.site))
+
+    def test_machine_search_matches_icontains(self):
+        self.assertMatchesIcontains(MachineAdmin(Machine, admin.site))
+
+    def test_related_change_updates_the_search(self):
+        fuel = Fuel.objects.get(type="Petrol")
+        fuel.type = "Unleaded"
+        fuel.save()
+        self.assertMatchesIcontains(MachineAdmin(Machine, admin.site))
+        chunked_delete(Machine.objects.filter(pk=Machine.objects.filter(fuel=fuel).first().pk))
+        self.assertMatchesIcontains(MachineAdmin(Machine, admin.site))
+
+    def test_chunked_delete_drops_documents(self):
+        fuel = Fuel.objects.get(type="Petrol")
+        chunked_delete(Fuel.objects.filter(pk=fuel.pk))
+        with connection.cursor() as cursor:
+            for model, pk in [(Fuel, fuel.pk)] + [(Machine, pk) for pk in self.petrol_machines]:
+                cursor.execute("SELECT count(*) FROM {}_search WHERE rowid = %s".format(model._meta.db_table), [pk])
+                self.assertEqual(cursor.fetchone()[0], 0)
+
+
+# READINGS
+class ReadingTests(TestCase):
+    def setUp(self):
+        self.machine = Machine.objects.create(name="Pump", fuel=Fuel.objects.create(type="Petrol", price=1), reading=10)
+
+    def test_rollup_keeps_min_and_max_of_out_of_order_readings(self):
+        hour = timezone.make_aware(datetime(2024, 5, 2, 10))
+        record_readings([
+            ReadingEntry(self.machine.pk, hour.replace(minute=40), 30, 20),
+            ReadingEntry(self.machine.pk, hour.replace(minute=10), 20, 10),
+        ])
+        rollup = HourlyReading.objects.get(machine=self.machine)
+        self.assertEqual((rollup.min_reading, rollup.max_reading, rollup.volume), (10, 30, 20))
+
+    def test_admin_change_measures_from_the_stored_reading(self):
+        # The form was loaded at 10, another change moved the meter to 20 before it was saved
+        Machine.objects.filter(pk=self.machine.pk).update(reading=20)
+        self.machine.reading = 25
+        form = mock.Mock(changed_data=["reading"], initial={"reading": 10})
+        MachineAdmin(Machine, admin.site).save_model(mock.Mock(), self.machine, form, True)
+        self.assertEqual(MachineReading.objects.get(machine=self.machine).volume, 5)
+
+
+# CHECKS
+class FilterIndexCheckTests(TestCase):
+    def warnings_for(self, search_fields):
+        site = AdminSite()
+        site.register(CreditTransaction, search_fields=search_fields)
+        with mock.patch("app.checks.admin.site", site):
+            return [warning.msg for warning in check_filter_indexes() if warning.obj is CreditTransaction]
+
+    def test_icontains_search_needs_no_index(self):
+        self.assertEqual(self.warnings_for(["note"]), [])
+
+    def test_prefix_search_needs_an_index(self):
+        self.assertEqual(len(self.warnings_for(["^note", "=note", "=creditor__name"])), 2)
+
+    def test_project_is_indexed(self):
+        self.assertEqual(check_filter_indexes(), [])
+
+
+# ASYNC GRAPHQL VIEW
+class AsyncGraphQLViewTests(TestCase):
+    def setUp(self):
+        self.factory = AsyncRequestFactory()
+        self.view = AsyncGraphQLView.as_view(graphiql=True)
+
+    async def test_query_over_post(self):
+        request = self.factory.post("/graphql", {"query": "{ __typename }"}, content_type="application/json")
+        response = await self.view(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)["data"], {"__typename": "Query"})
+        self.assertIn("CSRF_COOKIE", request.META)
+
+    async def test_mutation_over_get_is_rejected(self):
+        request = self.factory.get("/graphql", {"query": "mutation { deleteUser(id: \"x\") { success } }"})
+        response = await self.view(request)
+        self.assertEqual(response.status_code, 405)
+
+    async def test_other_methods_are_rejected(self):
+        response = await self.view(self.factory.put("/graphql"))
+        self.assertEqual(response.status_code, 405)
+
+    async def test_graphiql_is_rendered(self):
+        response = await self.view(self.factory.get("/graphql", accept="text/html"))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"graphiql", response.content.lower())
+
+
+# QUERY COST
+@override_settings(GRAPHQL_QUERY_COST={"MAX_COST": 1000, "DEFAULT_PAGE_SIZE": 100})
+class QueryCostTests(TestCase):
+    query = """
+        query($fuels: Int, $machines: Int) {
+            fuels(first: $fuels) { edges { node { type machineSet(first: $machines) { edges { node { name } } } } } }
+        }
+    """
+
+    def cost(self, **variables):
+        document, errors = document_cache.get(schema.graphql_schema, self.query)
+        return check_query_cost(schema.graphql_schema, document, variables)
+
+    def test_page_sizes_come_from_each_requests_variables(self):
+        cost_plan_cache.clear()
+        self.assertEqual(self.cost(fuels=2, machines=3)[0].cost, 1 + 2 * (1 + 1 + 3 * 1))
+        self.assertEqual(self.cost(fuels=10, machines=1)[0].cost, 1 + 10 * (1 + 1 + 1 * 1))
+        self.assertEqual(len(cost_plan_cache.plans), 1)
+
+    def test_missing_variables_use_the_default_page_size(self):
+        query_cost, errors = self.cost(fuels=10)
+        self.assertEqual(query_cost.cost, 1 + 10 * (1 + 1 + 100 * 1))
+        self.assertTrue(errors)
+        self.assertEqual(errors[0].extensions["code"], "MAX_COST_EXCEEDED")
+
+
+# CACHE STATS
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class CacheStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.token = get_token(create_superuser())
+
+    def post(self, body):
+        response = self.client.post(
+            "/graphql", body, content_type="application/json", HTTP_AUTHORIZATION="JWT {}".format(self.token)
+        )
+        return json.loads(response.content)
+
+    def test_token_cache_counts_the_saved_lookups(self):
+        token_cache.clear()
+        query = {"query": "{ cacheStats { tokens { hits misses } } }"}
+        self.assertEqual(self.post(query)["data"]["cacheStats"]["tokens"], {"hits": 0, "misses": 1})
+        self.assertEqual(self.post(query)["data"]["cacheStats"]["tokens"], {"hits": 1, "misses": 1})
+
+    def test_cache_stats_need_a_superuser(self):
+        response = self.client.post("/graphql", {"query": "{ cacheStats { tokens { hits } } }"}, content_type="application/json")
+        self.assertTrue(json.loads(response.content)["errors"])
+
+    def test_persisted_query_round_trip(self):
+        document_cache.clear()
+        query = "{ cacheStats { documents { hits misses persistedHits persistedMisses } } }"
+        extensions = {"persistedQuery": {"version": 1, "sha256Hash": query_hash(query)}}
+
+        self.assertEqual(self.post({"extensions": extensions})["errors"][0]["message"], "PersistedQueryNotFound")
+        self.assertIn("data", self.post({"query": query, "extensions": extensions}))
+        documents = self.post({"extensions": extensions})["data"]["cacheStats"]["documents"]
+        self.assertEqual(documents, {"hits": 1, "misses": 2, "persistedHits": 1, "persistedMisses": 1})
+
+    def test_result_cache_counts_repeated_connections(self):
+        Fuel.objects.create(type="Petrol", price=1)
+        result_cache.clear()
+        query = {"query": "{ fuels { edges { node { type } } } cacheStats { results { hits misses } } }"}
+        self.assertEqual(self.post(query)["data"]["cacheStats"]["results"], {"hits": 0, "misses": 1})
+        self.assertEqual(self.post(query)["data"]["cacheStats"]["results"], {"hits": 1, "misses": 1})
+
+
+# GRAPHQL QUERY BATCHING
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class QueryCountTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        result_cache.clear()
+        self.request = graphql_request(create_superuser())
+
+    def create_rows(self, count):
+        fuels = [Fuel.objects.create(type="Fuel {}".format(number), price=1) for number in range(5)]
+        payments = [Payment.objects.create(mode="Mode {}".format(number)) for number in range(5)]
+        for number in range(count):
+            Machine.objects.create(name="Pump {}".format(number), fuel=fuels[number % 5], reading=0)
+            Creditor.objects.create(
+                name="Creditor {}".format(number), payment=payments[number % 5], limit_warning=1, limit_stop_credit=2
+            )
+
+    def assertQueriesForPage(self, query, queries):
+        for count in (5, 50):
+            Machine.objects.all().delete()
+            Creditor.objects.all().delete()
+            Fuel.objects.all().delete()
+            Payment.objects.all().delete()
+            self.create_rows(count)
+            with self.assertNumQueries(queries):
+                result = schema.execute(query, context_value=self.request)
+            self.assertIsNone(result.errors)
+            self.assertEqual(len(next(iter(result.data.values()))["edges"]), count)
+
+    def test_machines_with_their_fuel(self):
+        self.assertQueriesForPage("{ machines(first: 50) { edges { node { name fuel { type } } } } }", 1)
+
+    def test_creditors_with_their_payment(self):
+        self.assertQueriesForPage("{ creditors(first: 50) { edges { node { name payment { mode } } } } }", 1)
+
+    def test_machines_with_the_machines_of_their_fuel(self):
+        # The reverse sets of every fuel on the page are loaded together
+        self.assertQueriesForPage(
+            "{ machines(first: 50) { edges { node { name fuel { type machineSet { edges { node { name } } } } } } } }", 2
+        )
+
+
+# QUERY PLANNING
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class QueryPlanTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        result_cache.clear()
+        self.request = graphql_request(create_superuser())
+        fuel = Fuel.objects.create(type="Petrol", price=100)
+        payment = Payment.objects.create(mode="Card")
+        Machine.objects.create(name="Pump", fuel=fuel, reading=0)
+        Creditor.objects.create(name="Creditor", payment=payment, limit_warning=1, limit_stop_credit=2)
+
+    def execute(self, query):
+        with CaptureQueriesContext(connection) as queries:
+            result = schema.execute(query, context_value=self.request)
+        self.assertIsNone(result.errors)
+        return [query["sql"] for query in queries.captured_queries]
+
+    def selected_columns(self, sql):
+        return sql.split(" FROM ")[0][len("SELECT "):].split(", ")
+
+    def test_narrow_selection(self):
+        queries = self.execute("{ machines { edges { node { name } } } }")
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(self.selected_columns(queries[0]), ['"app_machine"."id"', '"app_machine"."name"'])
+
+    def test_nested_selection_through_fragments(self):
+        queries = self.execute(
+            "{ creditors { edges { node { ...C } } } } "
+            "fragment C on CreditorNode { ... on CreditorNode { name } payment { ...P } } "
+            "fragment P on PaymentNode { mode }"
+        )
+        self.assertEqual(len(queries), 1)
+        self.assertIn("JOIN", queries[0])
+        self.assertEqual(self.selected_columns(queries[0]), [
+            '"app_creditor"."id"', '"app_creditor"."payment_id"', '"app_creditor"."name"',
+            '"app_payment"."id"', '"app_payment"."mode"',
+        ])
+
+    def test_reverse_set_is_prefetched_with_its_own_selection(self):
+        document = parse(
+            "{ fuels { edges { node { ...F } } } } "
+            "fragment F on FuelNode { type machineSet { edges { node { ...M } } } } "
+            "fragment M on MachineNode { name }"
+        )
+        fragments = {
+            definition.name.value: definition
+            for definition in document.definitions if isinstance(definition, FragmentDefinitionNode)
+        }
+        fuels = document.definitions[0].selection_set.selections
+        plan = plan_fields(Fuel, get_node_fields(fuels, fragments), fragments)
+
+        self.assertEqual(plan.only, {"id", "type"})
+        self.assertEqual(plan.select_related, [])
+        [prefetch] = plan.prefetch
+        self.assertEqual(prefetch.prefetch_to, "machine_set")
+        self.assertEqual(prefetch.queryset.query.deferred_loading, ({"id", "fuel_id", "name"}, False))
+
+        with self.assertNumQueries(2):
+            fuel = plan.apply(Fuel.objects.all()).get()
+            self.assertEqual([machine.name for machine in fuel.machine_set.all()], ["Pump"])
+
+
+# BULK MUTATIONS
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class BulkMutationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.request = graphql_request(create_superuser())
+        self.fuel = Fuel.objects.create(type="Petrol", price=100)
+        self.payment = Payment.objects.create(mode="Card")
+        self.machine = Machine.objects.create(name="Pump", fuel=self.fuel, reading=10)
+
+    def execute(self, query, **variables):
+        result = schema.execute(query, variable_values=variables, context_value=self.request)
+        self.assertIsNone(result.errors)
+        return next(iter(result.data.values()))
+
+    def update_readings(self, readings):
+        return self.execute(
+            "mutation ($readings: [MachineReadingInput!]!) { bulkUpdateMachineReadings(readings: $readings) "
+            "{ machines { name reading } errors { index message } } }",
+            readings=readings,
+        )
+
+    def test_update_readings_reports_item_errors(self):
+        data = self.update_readings([
+            {"id": "nope", "reading": 5},
+            {"id": to_global_id("MachineType", self.machine.pk), "reading": 20},
+            {"id": to_global_id("MachineType", 999), "reading": 5},
+        ])
+        self.assertEqual(data["machines"], [{"name": "Pump", "reading": 20.0}])
+        self.assertEqual(data["errors"], [
+            {"index": 0, "message": "invalid id nope"},
+            {"index": 2, "message": "machine does not exist"},
+        ])
+        self.machine.refresh_from_db()
+        self.assertEqual(self.machine.reading, 20)
+        self.assertEqual(MachineReading.objects.get(machine=self.machine).reading, 20)
+
+    def test_update_readings_rolls_back_when_the_write_fails(self):
+        other = Machine.objects.create(name="Other pump", fuel=self.fuel, reading=30)
+        with mock.patch("app.mutations.record_readings", side_effect=RuntimeError("disk full")):
+            result = schema.execute(
+                "mutation ($readings: [MachineReadingInput!]!) { bulkUpdateMachineReadings(readings: $readings) "
+                "{ errors { index } } }",
+                variable_values={"readings": [
+                    {"id": to_global_id("MachineType", self.machine.pk), "reading": 20},
+                    {"id": to_global_id("MachineType", other.pk), "reading": 40},
+                ]},
+                context_value=self.request,
+            )
+        self.assertEqual([error.message for error in result.errors], ["disk full"])
+        self.assertEqual(
+            list(Machine.objects.order_by("pk").values_list("reading", flat=True)), [10, 30]
+        )
+
+    def test_create_machines_reports_item_errors(self):
+        fuel = to_global_id("FuelType", self.fuel.pk)
+        data = self.execute(
+            "mutation ($machines: [MachineInput!]!) { bulkCreateMachines(machines: $machines) "
+            "{ machines { name reading } errors { index message } } }",
+            machines=[
+                {"name": "Pump 2", "fuel": fuel, "reading": 1},
+                {"name": "", "fuel": fuel, "reading": 2},
+                {"name": "Pump 4", "fuel": to_global_id("FuelType", 999), "reading": 3},
+            ],
+        )
+        self.assertEqual(data["machines"], [{"name": "Pump 2", "reading": 1.0}])
+        self.assertEqual(data["errors"], [
+            {"index": 1, "message": "name is required"},
+            {"index": 2, "message": "fuel does not exist"},
+        ])
+        self.assertEqual(sorted(Machine.objects.values_list("name", flat=True)), ["Pump", "Pump 2"])
+
+    def test_upsert_creditors_updates_existing_and_creates_new(self):
+        creditor = Creditor.objects.create(name="Old name", payment=self.payment, limit_warning=1, limit_stop_credit=2)
+        payment = to_global_id("PaymentType", self.payment.pk)
+        data = self.execute(
+            "mutation ($creditors: [CreditorInput!]!) { bulkUpsertCreditors(creditors: $creditors) "
+            "{ creditors { name limitWarning } errors { index message } } }",
+            creditors=[
+                {"id": to_global_id("CreditorType", creditor.pk), "payment": payment, "name": "New name",
+                 "limitWarning": 5, "limitStopCredit": 10},
+                {"payment": payment, "name": "Another", "limitWarning": 1, "limitStopCredit": 2},
+                {"id": to_global_id("CreditorType", 999), "payment": payment, "name": "Ghost",
+                 "limitWarning": 1, "limitStopCredit": 2},
+                {"payment": to_global_id("PaymentType", 999), "name": "Orphan", "limitWarning": 1,
+                 "limitStopCredit": 2},
+            ],
+        )
+        self.assertEqual(data["creditors"], [
+            {"name": "New name", "limitWarning": 5.0},
+            {"name": "Another", "limitWarning": 1.0},
+        ])
+        self.assertEqual(data["errors"], [
+            {"index": 2, "message": "creditor does not exist"},
+            {"index": 3, "message": "payment does not exist"},
+        ])
+        creditor.refresh_from_db()
+        self.assertEqual((creditor.name, creditor.limit_warning, creditor.limit_stop_credit), ("New name", 5, 10))
+        self.assertEqual(Creditor.objects.count(), 2)
+
+
+# SUBSCRIPTIONS
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class WebSocketClient:
+    """
+    Drives the ASGI WebSocket app in process, messages go through queues instead of a socket
+    """
+
+    def __init__(self, token=None, subprotocols=(GRAPHQL_TRANSPORT_WS, )):
+        self.incoming = asyncio.Queue()
+        self.outgoing = asyncio.Queue()
+        headers = [(b"authorization", "JWT {}".format(token).encode("latin1"))] if token else []
+        scope = {"type": "websocket", "path": "/graphql", "subprotocols": list(subprotocols), "headers": headers}
+        self.incoming.put_nowait({"type": "websocket.connect"})
+        self.task = asyncio.ensure_future(GraphQLWebSocketApp(schema)(scope, self.incoming.get, self.outgoing.put))
+
+    async def send(self, message):
+        await self.incoming.put({"type": "websocket.receive", "text": json.dumps(message)})
+
+    async def receive(self):
+        message = await asyncio.wait_for(self.outgoing.get(), 5)
+        if message["type"] == "websocket.send":
+            return json.loads(message["text"])
+        return message
+
+    async def disconnect(self):
+        await self.incoming.put({"type": "websocket.disconnect"})
+        await asyncio.wait_for(self.task, 5)
+
+
+class SubscriptionTests(TransactionTestCase):
+    def setUp(self):
+        token_cache.clear()
+        self.user = create_superuser()
+        self.token = get_token(self.user)
+        self.fuel = Fuel.objects.create(type="Petrol", price=100)
+        self.machine = Machine.objects.create(name="Pump", fuel=self.fuel, reading=10)
+
+    async def connect(self, token=None):
+        client = WebSocketClient(token)
+        self.assertEqual((await client.receive())["type"], "websocket.accept")
+        await client.send({"type": "connection_init"})
+        self.assertEqual(await client.receive(), {"type": "connection_ack"})
+        return client
+
+    async def test_unknown_subprotocol_is_refused(self):
+        client = WebSocketClient(subprotocols=("graphql-ws", ))
+        self.assertEqual(await client.receive(), {"type": "websocket.close", "code": 4406})
+
+    async def test_operations_need_connection_init(self):
+        client = WebSocketClient(self.token)
+        await client.receive()
+        await client.send({"type": "subscribe", "id": "1", "payload": {"query": "{ __typename }"}})
+        self.assertEqual((await client.receive())["code"], 4401)
+
+    async def test_invalid_token_is_forbidden(self):
+        client = WebSocketClient()
+        await client.receive()
+        await client.send({"type": "connection_init", "payload": {"Authorization": "JWT nope"}})
+        self.assertEqual((await client.receive())["code"], 4403)
+
+    async def test_anonymous_subscription_is_refused(self):
+        client = await self.connect()
+        await client.send({
+            "type": "subscribe", "id": "1", "payload": {"query": "subscription { fuelPriceChanged { price } }"},
+        })
+        message = await client.receive()
+        self.assertEqual(message["type"], "error")
+        await client.disconnect()
+
+    async def subscribe_and_mutate(self, subscription, mutation):
+        client = await self.connect(self.token)
+        await client.send({"type": "subscribe", "id": "events", "payload": {"query": subscription}})
+        await self.subscribed()
+        await client.send({"type": "subscribe", "id": "change", "payload": {"query": mutation}})
+
+        messages = {}
+        while len(messages) < 3:
+            message = await client.receive()
+            messages[(message["id"], message["type"])] = message.get("payload")
+        await client.disconnect()
+        self.assertIsNone(messages[("change", "next")].get("errors"))
+        return messages[("events", "next")]
+
+    async def subscribed(self):
+        while not any(get_pubsub().subscribers.values()):
+            await asyncio.sleep(0.01)
+
+    async def test_reading_change_is_delivered(self):
+        with mock.patch("app.pubsub.pubsub", LocalPubSub()):
+            payload = await self.subscribe_and_mutate(
+                "subscription { machineReadingChanged { name reading } }",
+                'mutation { bulkUpdateMachineReadings(readings: [{id: "%s", reading: 25}]) { errors { index } } }'
+                % to_global_id("MachineType", self.machine.pk),
+            )
+        self.assertEqual(payload, {"data": {"machineReadingChanged": {"name": "Pump", "reading": 25.0}}})
+
+    async def test_price_change_is_delivered(self):
+        with mock.patch("app.pubsub.pubsub", LocalPubSub()):
+            payload = await self.subscribe_and_mutate(
+                "subscription { fuelPriceChanged { type price } }",
+                'mutation { setFuelPrice(id: "%s", price: 120) { fuel { price } } }'
+                % to_global_id("FuelType", self.fuel.pk),
+            )
+        self.assertEqual(payload, {"data": {"fuelPriceChanged": {"type": "Petrol", "price": 120.0}}})
+
+    async def test_slow_subscriber_loses_its_oldest_events(self):
+        pubsub = LocalPubSub(max_queue=2)
+        events = pubsub.subscribe(MACHINE_READING_CHANGED)
+        first = asyncio.ensure_future(events.__anext__())
+        await asyncio.sleep(0)
+        pubsub.publish(MACHINE_READING_CHANGED, 0)
+        self.assertEqual(await first, 0)
+        for number in range(1, 4):
+            pubsub.publish(MACHINE_READING_CHANGED, number)
+        await asyncio.sleep(0)
+        self.assertEqual([await events.__anext__(), await events.__anext__()], [2, 3])
+        await events.aclose()
+        self.assertFalse(pubsub.subscribers[MACHINE_READING_CHANGED])
+
+    async def start_broker(self, max_buffer=1024 * 1024):
+        address = "127.0.0.1:{}".format(free_port())
+        host, port = address.split(":")
+        broker = asyncio.ensure_future(BrokerCommand(stdout=io.StringIO()).serve(host, int(port), max_buffer))
+        while True:
+            try:
+                _, writer = await asyncio.open_connection(host, int(port))
+                writer.close()
+                return address, broker
+            except OSError:
+                await asyncio.sleep(0.01)
+
+    async def stop_broker(self, broker):
+        # Let the broker see the clients hang up before it is torn down
+        await asyncio.sleep(0.1)
+        broker.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await broker
+
+    async def test_events_are_relayed_through_the_broker(self):
+        address, broker = await self.start_broker()
+        pubsub = BrokerPubSub(address)
+        # The listener is subscribed to the broker once one of its own events comes back
+        probe = pubsub.subscribe("probe")
+        received = asyncio.ensure_future(probe.__anext__())
+        while not received.done():
+            await sync_to_async(pubsub.publish, thread_sensitive=False)("probe", {})
+            await asyncio.wait([received], timeout=0.1)
+        await probe.aclose()
+
+        with mock.patch("app.pubsub.pubsub", pubsub):
+            payload = await self.subscribe_and_mutate(
+                "subscription { machineReadingChanged { name reading } }",
+                'mutation { bulkUpdateMachineReadings(readings: [{id: "%s", reading: 30}]) { errors { index } } }'
+                % to_global_id("MachineType", self.machine.pk),
+            )
+        self.assertEqual(payload, {"data": {"machineReadingChanged": {"name": "Pump", "reading": 30.0}}})
+        for listener in pubsub.listeners.values():
+            listener.cancel()
+            await asyncio.wait([listener])
+        pubsub.connection.close()
+        await self.stop_broker(broker)
+
+    async def test_broker_drops_subscribers_that_stop_reading(self):
+        address, broker = await self.start_broker(max_buffer=64 * 1024)
+        host, port = address.split(":")
+        slow_reader, slow_writer = await asyncio.open_connection(host, int(port))
+        slow_writer.write(BROKER_SUBSCRIBE)
+        _, publisher = await asyncio.open_connection(host, int(port))
+        await asyncio.sleep(0.1)
+
+        line = (json.dumps({"channel": "c", "message": "x" * 16 * 1024}) + "\n").encode("utf-8")
+        for number in range(1600):
+            publisher.write(line)
+            await publisher.drain()
+
+        # What was buffered before the drop is flushed, then the broker hangs up
+        received = 0
+        while True:
+            data = await asyncio.wait_for(slow_reader.read(1024 * 1024), 5)
+            if not data:
+                break
+            received += len(data)
+        self.assertLess(received, len(line) * 1600)
+        publisher.close()
+        slow_writer.close()
+        await self.stop_broker(broker)
+
+
+# FUEL PRICES
+class ValuationTests(TestCase):
+    def setUp(self):
+        self.fuel = Fuel.objects.create(type="Petrol", price=100)
+        set_fuel_price(self.fuel, 100, PRICE_HISTORY_START)
+        self.machine = Machine.objects.create(name="Pump", fuel=self.fuel, reading=0)
+        self.hour = timezone.make_aware(datetime(2024, 5, 2, 10))
+
+    def record(self):
+        # 10 litres before the price change at 10:30 and 5 after it, all in the 10:00 bucket
+        record_readings([
+            ReadingEntry(self.machine.pk, self.hour.replace(minute=10), 10, 0),
+            ReadingEntry(self.machine.pk, self.hour.replace(minute=50), 15, 10),
+        ])
+
+    def assertAmounts(self, amount):
+        self.assertEqual(HourlyReading.objects.get(machine=self.machine).amount, amount)
+        self.assertEqual(DailyReading.objects.get(machine=self.machine).amount, amount)
+
+    def test_price_change_inside_a_bucket(self):
+        set_fuel_price(self.fuel, 120, self.hour.replace(minute=30))
+        self.record()
+        self.assertAmounts(10 * 100 + 5 * 120)
+
+    def test_back_dated_price_change_inside_a_bucket(self):
+        self.record()
+        self.assertAmounts(15 * 100)
+        set_fuel_price(self.fuel, 120, self.hour.replace(minute=30))
+        self.assertAmounts(10 * 100 + 5 * 120)
+        self.assertEqual(self.fuel.price, 120)
+
+
+# METER ANOMALIES
+class AnomalyTests(TestCase):
+    # Hourly deltas: a steady baseline, a jump of 100, a rollback of 5 and the meter standing still for 6 hours
+    DELTAS = [1, 2, 1, 2, 1, 2, 1, 2, 100, 1, 2, -5, 1, 0, 0, 0, 0, 0, 0, 2, 1]
+    SETTINGS = DEFAULT_SETTINGS._replace(window=6, step=1, stuck_hours=2)
+
+    def setUp(self):
+        self.machine = Machine.objects.create(name="Pump", fuel=Fuel.objects.create(type="Petrol", price=1), reading=0)
+        start = timezone.make_aware(datetime(2024, 5, 1))
+        readings = [0]
+        for delta in self.DELTAS:
+            readings.append(readings[-1] + delta)
+        self.history = MachineReading.objects.bulk_create([
+            MachineReading(machine=self.machine, recorded_at=start + timedelta(hours=hour), reading=reading)
+            for hour, reading in enumerate(readings)
+        ])
+
+    def test_detects_jump_rollback_and_stuck_meter(self):
+        flagged = detect_anomalies(settings=self.SETTINGS)
+        self.assertEqual(
+            [(anomaly.kind, anomaly.reading_id, anomaly.reading, anomaly.delta) for anomaly, _, _ in flagged],
+            [
+                (JUMP, self.history[9].pk, 112, 100),
+                (ROLLBACK, self.history[12].pk, 110, -5),
+                (STUCK, self.history[13].pk, 111, 0),
+            ],
+        )
+        anomaly, recorded_at, until = flagged[2]
+        self.assertEqual((anomaly.score, recorded_at, until), (6, self.history[13].recorded_at, self.history[19].recorded_at))
+
+    def test_short_stuck_run_is_not_flagged(self):
+        flagged = detect_anomalies(settings=self.SETTINGS._replace(stuck_hours=7))
+        self.assertEqual([anomaly.kind for anomaly, _, _ in flagged], [JUMP, ROLLBACK])
+
+    def test_command_stores_the_anomalies(self):
+        arguments = ["detect_meter_anomalies", "--all", "--window", "6", "--step", "1", "--stuck-hours", "2"]
+        out = io.StringIO()
+        call_command(*arguments, stdout=out)
+        self.assertIn("Flagged 3 anomalies (1 jump, 1 rollback, 1 stuck)", out.getvalue())
+        # A second scan replaces the stored anomalies of the range
+        call_command(*arguments, stdout=io.StringIO())
+        self.assertEqual(
+            list(MeterAnomaly.objects.order_by("recorded_at").values_list("kind", "reading")),
+            [(JUMP, 112), (ROLLBACK, 110), (STUCK, 111)],
+        )
+
+    def test_command_dry_run_stores_nothing(self):
+        out = io.StringIO()
+        call_command("detect_meter_anomalies", "--all", "--window", "6", "--step", "1", "--dry-run", stdout=out)
+        self.assertIn("jump machine {}".format(self.machine.pk), out.getvalue())
+        self.assertFalse(MeterAnomaly.objects.exists())
+
+    def test_command_rejects_unknown_machine(self):
+        with self.assertRaises(CommandError):
+            call_command("detect_meter_anomalies", "--machine", "Nope", stdout=io.StringIO())
+
+
+# READING IMPORT
+class ImportReadingsTests(TestCase):
+    def setUp(self):
+        fuel = Fuel.objects.create(type="Petrol", price=100)
+        set_fuel_price(fuel, 100, PRICE_HISTORY_START)
+        self.pump = Machine.objects.create(name="Pump 1", fuel=fuel, reading=0)
+        self.other = Machine.objects.create(name="Pump 2", fuel=fuel, reading=0)
+
+    def import_file(self, suffix, content, *arguments):
+        with tempfile.NamedTemporaryFile("w", suffix=suffix, delete=False, encoding="utf-8") as file:
+            file.write(content)
+        self.addCleanup(os.remove, file.name)
+        out, err = io.StringIO(), io.StringIO()
+        call_command("import_readings", file.name, *arguments, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_csv_import(self):
+        out, err = self.import_file(".csv", "\n".join([
+            "recorded_at,machine,reading",
+            "2024-05-02T10:10:00,Pump 1,10",
+            "2024-05-02T10:10:00,Pump 2,5",
+            "2024-05-02T10:50:00,Pump 1,25",
+            "2024-05-02T11:20:00,Pump 1,30",
+        ]), "--chunk-size", "2")
+        self.assertIn("Imported 4 rows, rejected 0", out)
+        self.assertEqual(err, "")
+
+        self.assertEqual(
+            list(MachineReading.objects.filter(machine=self.pump).order_by("recorded_at").values_list("reading", "volume")),
+            [(10, 0), (25, 15), (30, 5)],
+        )
+        hours = HourlyReading.objects.filter(machine=self.pump).order_by("bucket")
+        self.assertEqual([(hour.min_reading, hour.max_reading, hour.volume, hour.amount) for hour in hours], [
+            (10, 25, 15, 1500), (25, 30, 5, 500),
+        ])
+        self.assertEqual(DailyReading.objects.get(machine=self.pump).volume, 20)
+        self.pump.refresh_from_db()
+        self.assertEqual(self.pump.reading, 30)
+
+    def test_jsonl_import(self):
+        out, err = self.import_file(".jsonl", "\n".join([
+            json.dumps({"machine": "Pump 2", "recorded_at": "2024-05-02T10:00:00Z", "reading": 1}),
+            "",
+            json.dumps({"machine": "Pump 2", "recorded_at": "2024-05-02T12:00:00Z", "reading": 4}),
+        ]))
+        self.assertIn("Imported 2 rows, rejected 0", out)
+        self.other.refresh_from_db()
+        self.assertEqual(self.other.reading, 4)
+
+    def test_malformed_rows_are_rejected(self):
+        Machine.objects.create(name="Pump 2", fuel=self.pump.fuel, reading=0)
+        out, err = self.import_file(".csv", "\n".join([
+            "machine,recorded_at,reading",
+            "Pump 1,2024-05-02T10:00:00,10",
+            "Nope,2024-05-02T10:00:00,1",
+            "Pump 1,yesterday,11",
+            "Pump 1,2024-05-02T11:00:00,lots",
+            "Pump 2,2024-05-02T11:00:00,3",
+            "Pump 1",
+            "Pump 1,2024-05-02T12:00:00,12",
+        ]))
+        self.assertIn("Imported 2 rows, rejected 5", out)
+        self.assertEqual(err.splitlines(), [
+            "row 2: unknown machine 'Nope'",
+            "row 3: invalid recorded_at 'yesterday'",
+            "row 4: could not convert string to float: 'lots'",
+            "row 5: machine name 'Pump 2' matches several machines",
+            "row 6: missing machine",
+        ])
+        self.assertEqual(list(MachineReading.objects.order_by("recorded_at").values_list("reading", flat=True)), [10, 12])
+
+    def test_bad_header_is_an_error(self):
+        with self.assertRaises(CommandError):
+            self.import_file(".csv", "name,time,value\nPump 1,2024-05-02T10:00:00,10")
+
+
+# SNAPSHOTS
+class SnapshotTests(TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+        self.fuel = Fuel.objects.create(type="Petrol", price=100.5)
+        self.machine = Machine.objects.create(name="Pump", fuel=self.fuel, reading=10)
+        self.moment = timezone.make_aware(datetime(2024, 5, 2, 10, 30))
+
+    def add_readings(self, *readings):
+        MachineReading.objects.bulk_create([
+            MachineReading(machine=self.machine, recorded_at=self.moment, reading=reading, volume=1)
+            for reading in readings
+        ])
+
+    def test_full_export(self):
+        manifest = export_snapshot(self.path, ["fuel", "machine"])
+        self.assertEqual(manifest["tables"]["machine"]["rows"], 1)
+
+        fuels = load_table(self.path, "fuel")
+        self.assertIsInstance(fuels["type"], np.memmap)
+        self.assertEqual((list(fuels["id"]), list(fuels["type"]), list(fuels["price"])), ([self.fuel.pk], ["Petrol"], [100.5]))
+        machines = load_table(self.path, "machine")
+        self.assertEqual((list(machines["fuel_id"]), list(machines["reading"])), ([self.fuel.pk], [10]))
+
+        # Full tables are rewritten, the previous part is removed
+        Machine.objects.create(name="Pump 2", fuel=self.fuel, reading=0)
+        manifest = export_snapshot(self.path, ["machine"])
+        self.assertEqual([part["path"] for part in manifest["tables"]["machine"]["parts"]], ["machine/000002"])
+        self.assertFalse(os.path.exists(os.path.join(self.path, "machine", "000001")))
+        self.assertEqual(list(load_table(self.path, "machine")["name"]), ["Pump", "Pump 2"])
+        self.assertIn("fuel", read_manifest(self.path)["tables"])
+
+    def test_incremental_export_appends_past_the_watermark(self):
+        self.add_readings(1, 2)
+        first = export_snapshot(self.path, ["machine_reading"])["tables"]["machine_reading"]
+        watermark = MachineReading.objects.aggregate(latest=Max("pk"))["latest"]
+        self.assertEqual(first["watermark"], watermark)
+
+        self.add_readings(3)
+        latest = MachineReading.objects.aggregate(latest=Max("pk"))["latest"]
+        entry = export_snapshot(self.path, ["machine_reading"])["tables"]["machine_reading"]
+        self.assertEqual(
+            [(part["rows"], part["first_pk"], part["last_pk"]) for part in entry["parts"]],
+            [(2, 1, watermark), (1, watermark + 1, latest)],
+        )
+        self.assertEqual((entry["rows"], entry["watermark"]), (3, latest))
+        self.assertEqual(list(load_table(self.path, "machine_reading")["reading"]), [1, 2, 3])
+
+        # Nothing new, no new part
+        entry = export_snapshot(self.path, ["machine_reading"])["tables"]["machine_reading"]
+        self.assertEqual(len(entry["parts"]), 2)
+
+        # A full export merges the parts
+        entry = export_snapshot(self.path, ["machine_reading"], full=True)["tables"]["machine_reading"]
+        self.assertEqual([part["rows"] for part in entry["parts"]], [3])
+        self.assertEqual(sorted(os.listdir(os.path.join(self.path, "machine_reading"))), ["000003"])
+        readings = load_table(self.path, "machine_reading")
+        self.assertIsInstance(readings["reading"], np.memmap)
+        self.assertEqual(list(readings["recorded_at"]), [np.datetime64("2024-05-02T10:30:00", "us")] * 3)
+
+    def test_nullable_column_round_trip(self):
+        creditor = Creditor.objects.create(
+            name="Creditor", payment=Payment.objects.create(mode="Card"), limit_warning=100, limit_stop_credit=200
+        )
+        post_transaction(creditor.pk, 50, fuel_id=self.fuel.pk)
+        post_transaction(creditor.pk, -20)
+
+        export_snapshot(self.path, ["credit_transaction"])
+        ledger = load_table(self.path, "credit_transaction")
+        self.assertEqual(list(ledger["fuel_id.null"]), [False, True])
+        self.assertEqual(list(ledger["fuel_id"]), [self.fuel.pk, 0])
+        self.assertEqual(list(ledger["amount"]), [50, -20])
+        self.assertNotIn("amount.null", ledger)
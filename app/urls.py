@@ -3,5 +3,6 @@ from app import views
 
 urlpatterns = [
     # Custom Paths
-    path("app/report/", views.report)
+    path("app/report/", views.report),
+    path("app/report/<str:name>/", views.report_export),
 ]
@@ -0,0 +1,113 @@
+from bisect import bisect_right
+from datetime import datetime, timezone as dt_timezone
+from django.db import transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncDay, TruncHour
+from django.utils import timezone
+from .models import DailyReading, FuelPrice, HourlyReading, MachineReading
+from .pubsub import publish_fuel
+from .summaries import refresh_on_commit
+
+# The first price of a fuel applies to everything dispensed before it was set
+PRICE_HISTORY_START = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def price_at(fuel_id, moment):
+    """
+    Price of a fuel in effect at moment, one seek on the (fuel, effective_from) index
+    """
+    return (
+        FuelPrice.objects.filter(fuel_id=fuel_id, effective_from__lte=moment)
+        .order_by("-effective_from")
+        .values_list("price", flat=True)
+        .first()
+    )
+
+
+class PriceTimeline:
+    """
+    Prices of a set of fuels over a time range, loaded with one seek per fuel for the
+    price at the start and one range read for the changes inside the range
+    """
+
+    def __init__(self, fuel_ids, start, end):
+        self.changes = {}
+        for fuel_id in set(fuel_ids):
+            opening = (
+                FuelPrice.objects.filter(fuel_id=fuel_id, effective_from__lte=start)
+                .order_by("-effective_from")
+                .values_list("effective_from", "price")
+                .first()
+            )
+            self.changes[fuel_id] = [opening] if opening else []
+
+        rows = FuelPrice.objects.filter(
+            fuel_id__in=self.changes, effective_from__gt=start, effective_from__lte=end
+        ).order_by("fuel_id", "effective_from")
+        for fuel_id, effective_from, price in rows.values_list("fuel_id", "effective_from", "price"):
+            self.changes[fuel_id].append((effective_from, price))
+
+        self.moments = {
+            fuel_id: [effective_from for effective_from, price in changes]
+            for fuel_id, changes in self.changes.items()
+        }
+
+    def price(self, fuel_id, moment):
+        position = bisect_right(self.moments.get(fuel_id, []), moment)
+        if not position:
+            return 0.0
+        return self.changes[fuel_id][position - 1][1]
+
+
+def revalue(fuel_id, start, end, difference):
+    """
+    Add difference per unit to the rollup amounts of everything the fuel's machines dispensed in [start, end)
+    """
+    readings = MachineReading.objects.filter(machine__fuel_id=fuel_id, recorded_at__gte=start)
+    if end is not None:
+        readings = readings.filter(recorded_at__lt=end)
+
+    tzinfo = timezone.get_current_timezone()
+    days = set()
+    for model, trunc in ((HourlyReading, TruncHour), (DailyReading, TruncDay)):
+        buckets = (
+            readings.annotate(bucket=trunc("recorded_at", tzinfo=tzinfo))
+            .values("machine_id", "bucket")
+            .annotate(volume=Sum("volume"))
+            .order_by()
+        )
+        for row in buckets:
+            if row["volume"]:
+                model.objects.filter(machine_id=row["machine_id"], bucket=row["bucket"]).update(
+                    amount=F("amount") + row["volume"] * difference
+                )
+                if model is DailyReading:
+                    days.add(timezone.localdate(row["bucket"], tzinfo))
+    refresh_on_commit(days)
+
+
+def set_fuel_price(fuel, price, effective_from=None):
+    """
+    Record a price of a fuel, revalue the sales it affects when it is back dated and keep
+    Fuel.price at the price currently in effect
+    """
+    effective_from = effective_from or timezone.now()
+    with transaction.atomic():
+        previous = price_at(fuel.pk, effective_from)
+        FuelPrice.objects.update_or_create(fuel=fuel, effective_from=effective_from, defaults={"price": price})
+
+        if previous is not None and previous != price:
+            until = (
+                FuelPrice.objects.filter(fuel=fuel, effective_from__gt=effective_from)
+                .order_by("effective_from")
+                .values_list("effective_from", flat=True)
+                .first()
+            )
+            revalue(fuel.pk, effective_from, until, price - previous)
+
+        current = price_at(fuel.pk, timezone.now())
+        if current is not None and current != fuel.price:
+            fuel.price = current
+            fuel.save(update_fields=["price"])
+            publish_fuel(fuel)
+    return fuel
@@ -0,0 +1,19 @@
+from uuid import uuid4
+from django.core.cache import cache
+
+
+def get_cache_version(key):
+    """
+    Current version token under key, shared by every worker through the django cache. Tokens are
+    random, so a key that was culled or expired never comes back as a version seen before
+    """
+    version = cache.get(key)
+    if version is None:
+        # add() keeps the token of a worker that got there first
+        cache.add(key, uuid4().hex, timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_cache_version(key):
+    cache.set(key, uuid4().hex, timeout=None)
@@ -1,9 +1,301 @@
+from collections import namedtuple
+from datetime import datetime, time, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.http import Http404, HttpResponse, HttpResponseNotAllowed, StreamingHttpResponse
+from django.http.response import HttpResponseBadRequest
+from django.middleware.csrf import get_token
 from django.shortcuts import render
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from app.utils.index import menu
 from django.contrib.auth.decorators import login_required
+from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene_django.settings import graphene_settings
+from graphene_django.utils.utils import set_rollback
+from graphene_django.views import GraphQLView, HttpError
+from graphql import GraphQLError, OperationType, execute, get_operation_ast
+from graphql.execution import ExecutionResult
+from .cost import check_query_cost
+from .documents import document_cache, get_document_cache_settings, get_persisted_query_hash
+from .models import MeterAnomaly
+from .reports import FORMATS, REPORTS, report_rows
+from .summaries import recent_summaries
+
+PreparedOperation = namedtuple("PreparedOperation", ["document", "operation_ast", "query_cost"])
+
+executor = None
+
+
+def get_executor():
+    """
+    Thread pool running GraphQL executions of the async view, each thread uses its own database connection
+    """
+    global executor
+    if executor is None:
+        executor = ThreadPoolExecutor(
+            max_workers=settings.GRAPHQL_ASYNC["MAX_WORKERS"], thread_name_prefix="graphql"
+        )
+    return executor
+
+
+def parse_moment(value, end=False):
+    """
+    Read a report bound given as a date or a datetime, dates start at local midnight.
+    A date given as the (exclusive) end bound includes that whole day
+    """
+    if not value:
+        return None
+    day = parse_date(value)
+    if day is not None:
+        moment = datetime.combine(day + timedelta(days=1) if end else day, time())
+    else:
+        moment = parse_datetime(value)
+        if moment is None:
+            raise ValueError(value)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
 
 
 @login_required(login_url='/admin')
 def report(requests):
 
-    return render(requests, 'report.html', {'side_menu_list': menu})
+    return render(requests, 'report.html', {
+        'side_menu_list': menu, 'reports': REPORTS, 'formats': FORMATS, 'summaries': recent_summaries(),
+        'anomalies': MeterAnomaly.objects.select_related('machine').order_by('-recorded_at')[:50],
+    })
+
+
+@login_required(login_url='/admin')
+def report_export(requests, name):
+    report = REPORTS.get(name)
+    if report is None:
+        raise Http404("Unknown report {}".format(name))
+
+    export_format = requests.GET.get('format', 'csv')
+    if export_format not in FORMATS:
+        return HttpResponseBadRequest("Unknown format {}".format(export_format), content_type="text/plain")
+
+    try:
+        start = parse_moment(requests.GET.get('start'))
+        end = parse_moment(requests.GET.get('end'), end=True)
+    except ValueError as e:
+        return HttpResponseBadRequest("Invalid date {}".format(e), content_type="text/plain")
+
+    content_type, stream = FORMATS[export_format]
+    response = StreamingHttpResponse(stream(report, report_rows(report, start, end)), content_type=content_type)
+    response['Content-Disposition'] = 'attachment; filename="{}.{}"'.format(name, export_format)
+    return response
+
+
+class CachedGraphQLView(GraphQLView):
+    """
+    GraphQLView that parses and validates each distinct query once per process, accepts
+    automatic persisted queries (sha256 only requests) and rejects queries that are too
+    deep or too expensive, reporting the computed cost in the response extensions
+    """
+
+    def get_response(self, request, data, show_graphiql=False):
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+
+        execution_result = self.execute_graphql_request(
+            request, data, query, variables, operation_name, show_graphiql
+        )
+        return self.build_response(request, execution_result, id, show_graphiql)
+
+    def build_response(self, request, execution_result, id, show_graphiql=False):
+        if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+            set_rollback()
+
+        status_code = 200
+        if execution_result:
+            response = {}
+
+            if execution_result.errors:
+                set_rollback()
+                response["errors"] = [self.format_error(e) for e in execution_result.errors]
+
+            if execution_result.errors and any(not getattr(e, "path", None) for e in execution_result.errors):
+                status_code = 400
+            else:
+                response["data"] = execution_result.data
+
+            if execution_result.extensions:
+                response["extensions"] = execution_result.extensions
+
+            if self.batch:
+                response["id"] = id
+                response["status"] = status_code
+
+            result = self.json_encode(request, response, pretty=show_graphiql)
+        else:
+            result = None
+
+        return result, status_code
+
+    def check_cost(self, document, variables, operation_name):
+        return check_query_cost(self.schema.graphql_schema, document, variables, operation_name)
+
+    def get_document(self, request, data, query):
+        document_settings = get_document_cache_settings()
+        key = get_persisted_query_hash(request, data) if document_settings["PERSISTED_QUERIES"] else None
+        if key:
+            return document_cache.get_persisted(
+                self.schema.graphql_schema, key, query, timeout=document_settings["PERSISTED_QUERY_TIMEOUT"]
+            )
+        if not query:
+            return None
+        return document_cache.get(self.schema.graphql_schema, query)
+
+    def prepare_request(self, request, data, query, variables, operation_name, show_graphiql=False):
+        """
+        Resolve the cached document and run the request checks. Returns (result, None) when the
+        request ends here, or (None, operation) when the operation is ready to be executed
+        """
+        try:
+            entry = self.get_document(request, data, query)
+        except GraphQLError as e:
+            return ExecutionResult(errors=[e]), None
+
+        if entry is None:
+            if show_graphiql:
+                return None, None
+            raise HttpError(HttpResponseBadRequest("Must provide query string."))
+
+        document, validation_errors = entry
+        operation_ast = get_operation_ast(document, operation_name)
+
+        if request.method.lower() == "get" and operation_ast and operation_ast.operation != OperationType.QUERY:
+            if show_graphiql:
+                return None, None
+            raise HttpError(
+                HttpResponseNotAllowed(
+                    ["POST"],
+                    "Can only perform a {} operation from a POST request.".format(operation_ast.operation.value),
+                )
+            )
+
+        if validation_errors:
+            return ExecutionResult(data=None, errors=validation_errors), None
+
+        query_cost, cost_errors = self.check_cost(document, variables, operation_name)
+        if cost_errors:
+            return ExecutionResult(data=None, errors=cost_errors, extensions={"cost": query_cost.as_extension()}), None
+
+        return None, PreparedOperation(document, operation_ast, query_cost)
+
+    def execute_operation(self, request, operation, variables, operation_name):
+        try:
+            options = {
+                "schema": self.schema.graphql_schema,
+                "document": operation.document,
+                "root_value": self.get_root_value(request),
+                "variable_values": variables,
+                "operation_name": operation_name,
+                "context_value": self.get_context(request),
+                "middleware": self.get_middleware(request),
+            }
+            if self.execution_context_class:
+                options["execution_context_class"] = self.execution_context_class
+
+            if (
+                operation.operation_ast
+                and operation.operation_ast.operation == OperationType.MUTATION
+                and (
+                    graphene_settings.ATOMIC_MUTATIONS is True
+                    or connection.settings_dict.get("ATOMIC_MUTATIONS", False) is True
+                )
+            ):
+                with transaction.atomic():
+                    result = execute(**options)
+                    if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+                        transaction.set_rollback(True)
+            else:
+                result = execute(**options)
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+
+        result.extensions = dict(result.extensions or {}, cost=operation.query_cost.as_extension())
+        return result
+
+    def execute_graphql_request(self, request, data, query, variables, operation_name, show_graphiql=False):
+        result, operation = self.prepare_request(request, data, query, variables, operation_name, show_graphiql)
+        if operation is None:
+            return result
+        return self.execute_operation(request, operation, variables, operation_name)
+
+
+class AsyncGraphQLView(CachedGraphQLView):
+    """
+    Async variant served natively by the ASGI application. Body parsing and response encoding
+    run on the event loop; the document cache (persisted queries live in the django cache),
+    validation, cost analysis and the schema execution are handed to a bounded thread pool
+    (see GRAPHQL_ASYNC)
+    """
+
+    # GraphQLView only defines dispatch, View can't tell from its handlers that it is async
+    view_is_async = True
+
+    async def dispatch(self, request, *args, **kwargs):
+        """
+        GraphQLView.dispatch on the event loop, its ensure_csrf_cookie decorator can't wrap a coroutine
+        """
+        get_token(request)
+        try:
+            if request.method.lower() not in ("get", "post"):
+                raise HttpError(HttpResponseNotAllowed(["GET", "POST"], "GraphQL only supports GET and POST requests."))
+
+            data = self.parse_body(request)
+            show_graphiql = self.graphiql and self.can_display_graphiql(request, data)
+
+            if show_graphiql:
+                return self.render_graphiql(
+                    request,
+                    whatwg_fetch_version=self.whatwg_fetch_version,
+                    whatwg_fetch_sri=self.whatwg_fetch_sri,
+                    react_version=self.react_version,
+                    react_sri=self.react_sri,
+                    react_dom_sri=self.react_dom_sri,
+                    graphiql_version=self.graphiql_version,
+                    graphiql_sri=self.graphiql_sri,
+                    graphiql_css_sri=self.graphiql_css_sri,
+                    subscriptions_transport_ws_version=self.subscriptions_transport_ws_version,
+                    subscriptions_transport_ws_sri=self.subscriptions_transport_ws_sri,
+                    subscription_path=self.subscription_path,
+                    graphiql_header_editor_enabled=graphene_settings.GRAPHIQL_HEADER_EDITOR_ENABLED,
+                    graphiql_should_persist_headers=graphene_settings.GRAPHIQL_SHOULD_PERSIST_HEADERS,
+                )
+
+            if self.batch:
+                responses = [await self.get_async_response(request, entry) for entry in data]
+                result = "[{}]".format(",".join([response[0] for response in responses]))
+                status_code = responses and max(responses, key=lambda response: response[1])[1] or 200
+            else:
+                result, status_code = await self.get_async_response(request, data, show_graphiql)
+
+            return HttpResponse(status=status_code, content=result, content_type="application/json")
+
+        except HttpError as e:
+            response = e.response
+            response["Content-Type"] = "application/json"
+            response.content = self.json_encode(request, {"errors": [self.format_error(e)]})
+            return response
+
+    async def get_async_response(self, request, data, show_graphiql=False):
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+
+        execution_result = await sync_to_async(
+            self.execute_graphql_request_in_thread, thread_sensitive=False, executor=get_executor()
+        )(request, data, query, variables, operation_name, show_graphiql)
+
+        return self.build_response(request, execution_result, id, show_graphiql)
+
+    def execute_graphql_request_in_thread(self, request, data, query, variables, operation_name, show_graphiql=False):
+        try:
+            return self.execute_graphql_request(request, data, query, variables, operation_name, show_graphiql)
+        finally:
+            # Pool threads outlive the request, don't let them keep their connection open
+            close_old_connections()
@@ -0,0 +1,215 @@
+import asyncio
+import json
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.db import close_old_connections
+from graphene_django.settings import graphene_settings
+from graphql import ExecutionResult, GraphQLError, OperationType, execute, get_operation_ast
+from graphql.execution import create_source_event_stream
+from graphql_jwt.exceptions import JSONWebTokenError
+from .auth import token_cache
+from .cost import check_query_cost
+from .documents import document_cache
+from .views import get_executor
+
+GRAPHQL_TRANSPORT_WS = "graphql-transport-ws"
+
+
+class WebSocketContext:
+    """
+    Context of one operation sent over a WebSocket, stands in for the request of the HTTP view
+    """
+
+    def __init__(self, scope, user):
+        self.scope = scope
+        self.user = user
+
+
+def execute_in_thread(schema, document, root_value, context, variables, operation_name):
+    try:
+        return execute(
+            schema, document, root_value=root_value, context_value=context, variable_values=variables,
+            operation_name=operation_name,
+        )
+    finally:
+        close_old_connections()
+
+
+class GraphQLWebSocketConnection:
+    """
+    One client connection speaking the graphql-transport-ws protocol
+    """
+
+    def __init__(self, app, scope, send):
+        self.app = app
+        self.scope = scope
+        self.raw_send = send
+        self.send_lock = asyncio.Lock()
+        self.user = None
+        self.operations = {}
+
+    @property
+    def schema(self):
+        return self.app.schema.graphql_schema
+
+    async def send(self, message):
+        async with self.send_lock:
+            await self.raw_send({"type": "websocket.send", "text": json.dumps(message)})
+
+    async def close(self, code, reason=""):
+        async with self.send_lock:
+            await self.raw_send({"type": "websocket.close", "code": code, "reason": reason})
+
+    def token(self, payload):
+        for key in ("Authorization", "authorization"):
+            if isinstance(payload, dict) and payload.get(key):
+                return payload[key]
+        for name, value in self.scope.get("headers", []):
+            if name == b"authorization":
+                return value.decode("latin1")
+        return None
+
+    async def authenticate(self, payload):
+        token = self.token(payload)
+        if token is None:
+            return AnonymousUser()
+        # Same "JWT <token>" prefix as the HTTP Authorization header
+        token = token.split(" ", 1)[-1]
+        user = await sync_to_async(token_cache.get_user, thread_sensitive=False, executor=get_executor())(token)
+        return user or AnonymousUser()
+
+    async def run(self, receive):
+        try:
+            message = await asyncio.wait_for(receive(), self.app.connection_init_timeout)
+        except asyncio.TimeoutError:
+            await self.close(4408, "Connection initialisation timeout")
+            return
+
+        try:
+            while message["type"] == "websocket.receive":
+                if not await self.handle(message.get("text") or (message.get("bytes") or b"").decode("utf-8")):
+                    return
+                message = await receive()
+        finally:
+            for task in self.operations.values():
+                task.cancel()
+
+    async def handle(self, text):
+        """
+        Handle one client message, returns False once the connection is closed
+        """
+        try:
+            message = json.loads(text)
+            message_type = message["type"]
+        except (ValueError, KeyError, TypeError):
+            await self.close(4400, "Invalid message")
+            return False
+
+        if message_type == "connection_init":
+            if self.user is not None:
+                await self.close(4429, "Too many initialisation requests")
+                return False
+            try:
+                self.user = await self.authenticate(message.get("payload"))
+            except JSONWebTokenError:
+                await self.close(4403, "Forbidden")
+                return False
+            await self.send({"type": "connection_ack"})
+        elif message_type == "ping":
+            await self.send({"type": "pong"})
+        elif message_type == "pong":
+            pass
+        elif self.user is None:
+            await self.close(4401, "Unauthorized")
+            return False
+        elif message_type == "subscribe":
+            operation_id = message.get("id")
+            if operation_id in self.operations:
+                await self.close(4409, "Subscriber for {} already exists".format(operation_id))
+                return False
+            task = asyncio.ensure_future(self.run_operation(operation_id, message.get("payload") or {}))
+            self.operations[operation_id] = task
+            task.add_done_callback(lambda done: self.operations.pop(operation_id, None))
+        elif message_type == "complete":
+            task = self.operations.pop(message.get("id"), None)
+            if task is not None:
+                task.cancel()
+        else:
+            await self.close(4400, "Unknown message type {}".format(message_type))
+            return False
+        return True
+
+    def prepare(self, payload):
+        """
+        Resolve the cached document and run the validation and cost checks of the HTTP view
+        """
+        try:
+            document, errors = document_cache.get(self.schema, payload.get("query") or "")
+        except GraphQLError as e:
+            return None, [e]
+        if errors:
+            return None, errors
+
+        errors = check_query_cost(self.schema, document, payload.get("variables"), payload.get("operationName"))[1]
+        return document, errors
+
+    async def execute(self, document, root_value, variables, operation_name):
+        result = await sync_to_async(execute_in_thread, thread_sensitive=False, executor=get_executor())(
+            self.schema, document, root_value, WebSocketContext(self.scope, self.user), variables, operation_name
+        )
+        return result.formatted
+
+    async def run_operation(self, operation_id, payload):
+        variables, operation_name = payload.get("variables"), payload.get("operationName")
+        document, errors = self.prepare(payload)
+        if errors:
+            await self.send({"type": "error", "id": operation_id, "payload": [error.formatted for error in errors]})
+            return
+
+        operation_ast = get_operation_ast(document, operation_name)
+        if operation_ast is None or operation_ast.operation != OperationType.SUBSCRIPTION:
+            result = await self.execute(document, None, variables, operation_name)
+            await self.send({"type": "next", "id": operation_id, "payload": result})
+            await self.send({"type": "complete", "id": operation_id})
+            return
+
+        # The subscribe resolvers only check the user and attach to the pub/sub, they run on the loop
+        stream = await create_source_event_stream(
+            self.schema, document, context_value=WebSocketContext(self.scope, self.user),
+            variable_values=variables, operation_name=operation_name,
+        )
+        if isinstance(stream, ExecutionResult):
+            await self.send({"type": "error", "id": operation_id, "payload": [e.formatted for e in stream.errors]})
+            return
+
+        try:
+            async for event in stream:
+                # Each event is resolved like a query rooted at the event, the ORM runs in the pool
+                result = await self.execute(document, event, variables, operation_name)
+                await self.send({"type": "next", "id": operation_id, "payload": result})
+        finally:
+            await stream.aclose()
+        await self.send({"type": "complete", "id": operation_id})
+
+
+class GraphQLWebSocketApp:
+    """
+    ASGI application serving GraphQL subscriptions (and one shot operations) over WebSockets
+    """
+
+    def __init__(self, schema=None, path="/graphql", connection_init_timeout=10):
+        self.schema = schema or graphene_settings.SCHEMA
+        self.path = path
+        self.connection_init_timeout = connection_init_timeout
+
+    async def __call__(self, scope, receive, send):
+        message = await receive()
+        if message["type"] != "websocket.connect":
+            return
+
+        if scope["path"].rstrip("/") != self.path or GRAPHQL_TRANSPORT_WS not in scope.get("subprotocols", []):
+            await send({"type": "websocket.close", "code": 4406})
+            return
+
+        await send({"type": "websocket.accept", "subprotocol": GRAPHQL_TRANSPORT_WS})
+        await GraphQLWebSocketConnection(self, scope, send).run(receive)
@@ -12,5 +12,19 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+# Serve /graphql through the async view, executions run in a thread pool
+os.environ.setdefault('GRAPHQL_ASYNC', '1')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once django is set up, the schema pulls in the models
+from app.websocket import GraphQLWebSocketApp  # noqa: E402
+
+# GraphQL subscriptions over WebSockets (graphql-transport-ws) share the /graphql path
+websocket_application = GraphQLWebSocketApp(path="/graphql")
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "websocket":
+        return await websocket_application(scope, receive, send)
+    return await django_application(scope, receive, send)
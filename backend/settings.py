@@ -1,6 +1,7 @@
 from pathlib import Path
 from datetime import timedelta
 import os
+import tempfile
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -93,6 +94,14 @@ DATABASES = {
     }
 }
 
+# Cache shared by all gunicorn workers of a host (GraphQL result versions, persisted queries)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'we4itsolution_cache'),
+    }
+}
+
 # Default Static Root
 # 'static to staticfiles for heroku'
 STATIC_ROOT = os.path.join(BASE_DIR, 'static')
@@ -106,7 +115,7 @@ MEDIA_URL = '/media/'
 GRAPHENE = {
     "SCHEMA": "app.schema.schema",
     "MIDDLEWARE": [
-        "graphql_jwt.middleware.JSONWebTokenMiddleware"
+        "app.auth.JSONWebTokenMiddleware"
     ]
 }
 
@@ -122,6 +131,55 @@ GRAPHQL_JWT = {
     "JWT_EXPIRATION_DELTA": timedelta(days=9999),
 }
 
+# Verified JWT -> user snapshots kept per worker
+GRAPHQL_JWT_TOKEN_CACHE = {
+    "MAX_SIZE": 1024,
+    "TTL": 300,
+}
+
+# GraphQL parsed document cache and automatic persisted queries
+# (persisted query texts are stored in the default django cache)
+GRAPHQL_DOCUMENT_CACHE = {
+    "MAX_SIZE": 512,
+    "PERSISTED_QUERIES": True,
+    "PERSISTED_QUERY_TIMEOUT": None,
+}
+
+# Async GraphQL view, enabled by the ASGI entry point (backend/asgi.py)
+GRAPHQL_ASYNC = {
+    "ENABLED": os.environ.get("GRAPHQL_ASYNC", "0") == "1",
+    # threads executing GraphQL operations (and holding a database connection) per process
+    "MAX_WORKERS": int(os.environ.get("GRAPHQL_ASYNC_MAX_WORKERS", 32)),
+}
+
+# Pub/sub feeding the GraphQL subscriptions. LocalPubSub reaches the subscribers of this
+# process only, BrokerPubSub relays events across workers through manage.py pubsub_broker
+GRAPHQL_PUBSUB = {
+    "BACKEND": "app.pubsub.BrokerPubSub" if os.environ.get("GRAPHQL_PUBSUB_BROKER") else "app.pubsub.LocalPubSub",
+    "OPTIONS": {"address": os.environ["GRAPHQL_PUBSUB_BROKER"]} if os.environ.get("GRAPHQL_PUBSUB_BROKER") else {},
+}
+
+# GraphQL static query cost analysis (connections multiply by first/last)
+GRAPHQL_QUERY_COST = {
+    "MAX_DEPTH": 10,
+    "MAX_COST": 50000,
+}
+
+# Admin changelist counts (app.pagination.EstimatedCountPaginator): unfiltered lists use the
+# table statistics' estimate from this many rows (sqlite keeps them once ANALYZE has run),
+# filtered lists are counted up to COUNT_CAP rows
+ADMIN_PAGINATION = {
+    "ESTIMATE_THRESHOLD": 10000,
+    "COUNT_CAP": 1000,
+}
+
+# Admin full-text search (app.search). BACKEND defaults to the one of the database vendor
+# (SQLite FTS5, MySQL FULLTEXT), OPTIONS are passed to it
+ADMIN_SEARCH = {
+    "BACKEND": None,
+    "OPTIONS": {},
+}
+
 # Email Backend
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
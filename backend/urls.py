@@ -1,10 +1,12 @@
 from django.urls import path, re_path, include
 from django.views.generic.base import RedirectView
 from django.contrib import admin
-from graphene_django.views import GraphQLView
+from app.views import AsyncGraphQLView, CachedGraphQLView
 from django.conf import settings
 from django.views.static import serve
 
+graphql_view = AsyncGraphQLView if settings.GRAPHQL_ASYNC["ENABLED"] else CachedGraphQLView
+
 urlpatterns = [
 
     # Custom Path
@@ -15,7 +17,7 @@ urlpatterns = [
     path("admin/", admin.site.urls),
 
     # API Root
-    path("graphql", GraphQLView.as_view(graphiql=False)),
+    path("graphql", graphql_view.as_view(graphiql=False)),
 
     # Media and Static Root
     re_path(
@@ -8,3 +8,8 @@ class JazzminConfig(AppConfig):
     name = "jazzmin"
     label = "jazzmin"
     verbose_name = "Jazzmin"
+
+    def ready(self):
+        from .signals import connect_signals
+
+        connect_signals()
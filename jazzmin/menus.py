@@ -0,0 +1,106 @@
+import hashlib
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Callable, Hashable, List
+from uuid import uuid4
+from django.contrib.admin.sites import all_sites
+from django.contrib.auth.models import AbstractUser
+from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.urls import get_script_prefix
+from django.utils.translation import get_language
+
+from .settings import freeze
+
+MAX_CACHED_MENUS = 256
+MENU_VERSION_KEY = "jazzmin:menu:version"
+
+
+def get_menu_version() -> str:
+    """
+    Current version of the permissions and group memberships, shared by every worker through the django cache.
+    A random token, so a culled key never comes back as a version some worker has menus cached for
+    """
+    version = cache.get(MENU_VERSION_KEY)
+    if version is None:
+        cache.add(MENU_VERSION_KEY, uuid4().hex, timeout=None)
+        version = cache.get(MENU_VERSION_KEY)
+    return version
+
+
+def bump_menu_version() -> None:
+    cache.set(MENU_VERSION_KEY, uuid4().hex, timeout=None)
+
+
+def registry_version() -> int:
+    """
+    Changes whenever a model admin is registered or unregistered on any admin site
+    """
+    return hash(tuple(sorted(
+        (site.name, model._meta.label, id(model_admin))
+        for site in all_sites
+        for model, model_admin in site._registry.items()
+    )))
+
+
+def permission_fingerprint(user: AbstractUser) -> str:
+    """
+    Digest of everything the menus are filtered on, users with the same permissions share it.
+    get_all_permissions() is cached on the user, the admin has usually filled that cache already
+    """
+    perms = sorted(user.get_all_permissions()) if user.is_active else []
+    flags = "{}:{}".format(int(user.is_active), int(user.is_superuser))
+    return hashlib.sha1("\n".join([flags] + perms).encode("utf-8")).hexdigest()
+
+
+def menu_key(user: AbstractUser, *parts: Hashable) -> tuple:
+    """
+    Cache key of a menu of user, computed once per user object (so once per request) apart from parts
+    """
+    base = getattr(user, "_jazzmin_menu_key", None)
+    if base is None:
+        base = (get_menu_version(), registry_version(), permission_fingerprint(user))
+        user._jazzmin_menu_key = base
+    return base + (get_language(), get_script_prefix()) + parts
+
+
+class MenuCache:
+    """
+    Per process LRU of built menus, frozen so every request can share them. Entries are keyed
+    by the shared menu version, so a permission change in any worker makes every worker rebuild
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.menus: OrderedDict = OrderedDict()
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_build(self, key: tuple, build: Callable[[], List]) -> Any:
+        with self.lock:
+            if key in self.menus:
+                self.menus.move_to_end(key)
+                self.hits += 1
+                return self.menus[key]
+            self.misses += 1
+
+        menu = freeze(build())
+        with self.lock:
+            self.menus[key] = menu
+            while len(self.menus) > self.max_size:
+                self.menus.popitem(last=False)
+        return menu
+
+    def clear(self) -> None:
+        with self.lock:
+            self.menus.clear()
+
+
+menu_cache = MenuCache(MAX_CACHED_MENUS)
+
+
+@receiver(setting_changed)
+def reset_menus(**kwargs: Any) -> None:
+    menu_cache.clear()
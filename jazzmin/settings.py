@@ -1,7 +1,10 @@
 import copy
 import logging
-from typing import Dict, Any
+from types import MappingProxyType
+from typing import Any, Dict, Mapping
 from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
 from django.templatetags.static import static
 
 from .utils import get_admin_url, get_model_meta
@@ -119,7 +122,46 @@ def get_search_model_string(jazzmin_settings: Dict) -> str:
     return "{app}.{model_name}".format(app=app, model_name=model_name.lower())
 
 
-def get_settings() -> Dict:
+def freeze(value: Any) -> Any:
+    """
+    Read only copy of settings: dicts become mapping proxies and lists tuples
+    """
+    if isinstance(value, dict):
+        return MappingProxyType({x: freeze(y) for x, y in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(x) for x in value)
+    return value
+
+
+# Derived settings and ui tweaks, built on first use and dropped when a setting changes
+_derived: Dict[str, Mapping] = {}
+
+
+@receiver(setting_changed)
+def reset_derived_settings(**kwargs: Any) -> None:
+    _derived.clear()
+
+
+def get_settings() -> Mapping:
+    """
+    The jazzmin settings merged over the defaults, computed once into a read only mapping.
+    Callers that need to override values should layer a ChainMap over it
+    """
+    if "settings" not in _derived:
+        _derived["settings"] = freeze(build_settings())
+    return _derived["settings"]
+
+
+def get_ui_tweaks() -> Mapping:
+    """
+    The ui tweaks turned into css classes, computed once into a read only mapping
+    """
+    if "ui_tweaks" not in _derived:
+        _derived["ui_tweaks"] = freeze(build_ui_tweaks())
+    return _derived["ui_tweaks"]
+
+
+def build_settings() -> Dict:
     jazzmin_settings = copy.deepcopy(DEFAULT_SETTINGS)
     user_settings = {x: y for x, y in getattr(
         settings, "JAZZMIN_SETTINGS", {}).items() if y is not None}
@@ -162,7 +204,7 @@ def get_settings() -> Dict:
     return jazzmin_settings
 
 
-def get_ui_tweaks() -> Dict:
+def build_ui_tweaks() -> Dict:
     raw_tweaks = copy.deepcopy(DEFAULT_UI_TWEAKS)
     raw_tweaks.update(getattr(settings, "JAZZMIN_UI_TWEAKS", {}))
     tweaks = {x: y for x, y in raw_tweaks.items() if y not in (None, "", False)}
@@ -0,0 +1,32 @@
+from typing import Any
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+from .menus import bump_menu_version
+
+
+def invalidate_menus(**kwargs: Any) -> None:
+    """
+    Rebuild the cached menus in every worker once a permission or group membership change is committed
+    """
+    if kwargs.get("action", "post_").startswith("post_"):
+        transaction.on_commit(bump_menu_version)
+
+
+def connect_signals() -> None:
+    user_model = get_user_model()
+    through_models = [Group.permissions.through]
+    for name in ("groups", "user_permissions"):
+        try:
+            through_models.append(getattr(user_model, name).through)
+        except AttributeError:
+            # Custom user models without PermissionsMixin
+            continue
+
+    for through in through_models:
+        m2m_changed.connect(invalidate_menus, sender=through, dispatch_uid="jazzmin_menus_{}".format(through._meta.label_lower))
+    for model in (Group, Permission):
+        post_save.connect(invalidate_menus, sender=model, dispatch_uid="jazzmin_menus_save_{}".format(model._meta.label_lower))
+        post_delete.connect(invalidate_menus, sender=model, dispatch_uid="jazzmin_menus_delete_{}".format(model._meta.label_lower))
@@ -3,7 +3,9 @@ import itertools
 import json
 import logging
 import urllib.parse
-from typing import Any, Callable, Dict, List, Optional, Union
+from collections import ChainMap
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Mapping, Optional, Union
 from django.conf import settings
 from django.contrib.admin import ListFilter
 from django.contrib.admin.helpers import AdminForm, Fieldset, InlineAdminFormSet
@@ -26,6 +28,7 @@ from django.utils.text import get_text_list, slugify
 from django.utils.translation import gettext
 
 from .. import version
+from ..menus import menu_cache, menu_key
 from ..settings import CHANGEFORM_TEMPLATES, get_settings, get_ui_tweaks
 from ..utils import get_admin_url, get_filter_id, has_fieldsets_check, make_menu, order_with_respect_to
 
@@ -39,18 +42,32 @@ def get_side_menu(context: Context, using: str = "available_apps") -> List[Dict]
     """
     Get the list of apps and models to render out in the side menu and on the dashboard page
 
-    N.B - Permissions are not checked here, as context["available_apps"] has already been filtered by django
+    N.B - Permissions are not checked here, as context["available_apps"] has already been filtered by django.
+    The menu is cached per permission set, keyed on the apps and models django made available
     """
     user = context.get("user")
     if not user:
         return []
 
-    options = get_settings()
+    available_apps = context.get(using, [])
+    apps_key = tuple(
+        (app["app_label"], str(app["name"]), tuple(
+            (model["object_name"], model.get("admin_url"), model.get("add_url"), model.get("view_only"))
+            for model in app.get("models", [])
+        ))
+        for app in available_apps
+    )
+    return menu_cache.get_or_build(
+        menu_key(user, "side", using, apps_key), lambda: build_side_menu(user, available_apps, get_settings())
+    )
+
+
+def build_side_menu(user: AbstractUser, available_apps: List[Dict], options: Mapping) -> List[Dict]:
     ordering = options.get("order_with_respect_to", [])
     ordering = [x.lower() for x in ordering]
 
     menu = []
-    available_apps = copy.deepcopy(context.get(using, []))
+    available_apps = copy.deepcopy(available_apps)
 
     custom_links = {
         app_name: make_menu(user, links, options, allow_appmenus=False)
@@ -115,7 +132,10 @@ def get_top_menu(user: AbstractUser, admin_site: str = "admin") -> List[Dict]:
     Produce the menu for the top nav bar
     """
     options = get_settings()
-    return make_menu(user, options.get("topmenu_links", []), options, allow_appmenus=True, admin_site=admin_site)
+    return menu_cache.get_or_build(
+        menu_key(user, "top", admin_site),
+        lambda: make_menu(user, options.get("topmenu_links", []), options, allow_appmenus=True, admin_site=admin_site),
+    )
 
 
 @register.simple_tag
@@ -124,15 +144,19 @@ def get_user_menu(user: AbstractUser, admin_site: str = "admin") -> List[Dict]:
     Produce the menu for the user dropdown
     """
     options = get_settings()
-    return make_menu(user, options.get("usermenu_links", []), options, allow_appmenus=False, admin_site=admin_site)
+    return menu_cache.get_or_build(
+        menu_key(user, "user", admin_site),
+        lambda: make_menu(user, options.get("usermenu_links", []), options, allow_appmenus=False, admin_site=admin_site),
+    )
 
 
 @register.simple_tag
-def get_jazzmin_settings(request: WSGIRequest) -> Dict:
+def get_jazzmin_settings(request: WSGIRequest) -> Mapping:
     """
     Get Jazzmin settings, update any defaults from the request, and return
     """
-    settings = get_settings()
+    # Overrides go to a per request layer, the shared settings are read only
+    settings = ChainMap({}, get_settings())
 
     if hasattr(request, "current_app"):
         admin_site = {x.name: x for x in all_sites}.get(
@@ -150,7 +174,7 @@ def get_jazzmin_settings(request: WSGIRequest) -> Dict:
 
 
 @register.simple_tag
-def get_jazzmin_ui_tweaks() -> Dict:
+def get_jazzmin_ui_tweaks() -> Mapping:
     """
     Return Jazzmin ui tweaks
     """
@@ -262,6 +286,48 @@ def jazzmin_paginator_number(change_list: ChangeList, i: int) -> SafeText:
     return format_html(html_str)
 
 
+@register.simple_tag
+def jazzmin_paginator_neighbours(change_list: ChangeList) -> SafeText:
+    """
+    Generate previous / current / next page links, for paginators that don't know their exact count
+    """
+    page = change_list.paginator.page(change_list.page_num)
+    previous_link = change_list.get_query_string({PAGE_VAR: page.number - 1}) if page.has_previous() else "#"
+    next_link = change_list.get_query_string({PAGE_VAR: page.number + 1}) if page.has_next() else "#"
+    return format_html(
+        """
+        <li class="page-item previous {previous_disabled}">
+            <a class="page-link" href="{previous_link}" data-dt-idx="0" tabindex="0">«</a>
+        </li>
+        <li class="page-item active">
+            <a class="page-link" href="javascript:void(0);" data-dt-idx="3" tabindex="0">{num}</a>
+        </li>
+        <li class="page-item next {next_disabled}">
+            <a class="page-link" href="{next_link}" data-dt-idx="7" tabindex="0">»</a>
+        </li>
+        """,
+        previous_link=previous_link,
+        previous_disabled="disabled" if previous_link == "#" else "",
+        num=page.number,
+        next_link=next_link,
+        next_disabled="disabled" if next_link == "#" else "",
+    )
+
+
+@register.simple_tag
+def jazzmin_result_count(change_list: ChangeList) -> str:
+    """
+    The changelist's result count, as an estimate or a lower bound when the paginator has no exact count
+    """
+    paginator = change_list.paginator
+    if getattr(paginator, "exact", True):
+        return str(change_list.result_count)
+    if getattr(paginator, "estimated", False):
+        return gettext("about %(count)s") % {"count": change_list.result_count}
+    # Counted one row past the cap
+    return gettext("more than %(count)s") % {"count": change_list.result_count - 1}
+
+
 @register.simple_tag
 def admin_extra_filters(cl: ChangeList) -> Dict:
     """
@@ -375,12 +441,21 @@ def debug(value: Any) -> Any:
     return type(value)
 
 
+def thaw(value: Any) -> Any:
+    """
+    JSON encoder fallback for the read only mappings of the settings
+    """
+    if isinstance(value, (MappingProxyType, ChainMap)):
+        return dict(value)
+    raise TypeError("{} is not JSON serializable".format(type(value).__name__))
+
+
 @register.filter
 def as_json(value: Union[List, Dict]) -> str:
     """
     Take the given item and dump it out as JSON
     """
-    return json.dumps(value)
+    return json.dumps(value, default=thaw)
 
 
 @register.simple_tag
@@ -0,0 +1,83 @@
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import path, set_urlconf
+
+from .menus import get_menu_version, menu_cache
+from .settings import get_settings, get_ui_tweaks
+from .templatetags.jazzmin import get_top_menu
+from .utils import get_admin_url
+
+# Admin mounted somewhere else, for the url reversal tests
+urlpatterns = [path("backoffice/", admin.site.urls)]
+
+
+# SETTINGS
+class SettingsTests(SimpleTestCase):
+    def test_settings_are_built_once(self):
+        self.assertIs(get_settings(), get_settings())
+        self.assertIs(get_ui_tweaks(), get_ui_tweaks())
+
+    def test_settings_follow_setting_changes(self):
+        with override_settings(JAZZMIN_SETTINGS={"site_title": "First"}):
+            self.assertEqual(get_settings()["site_title"], "First")
+            with override_settings(JAZZMIN_SETTINGS={"site_title": "Second"}):
+                self.assertEqual(get_settings()["site_title"], "Second")
+            self.assertEqual(get_settings()["site_title"], "First")
+
+    def test_ui_tweaks_follow_setting_changes(self):
+        with override_settings(JAZZMIN_UI_TWEAKS={"navbar_small_text": False}):
+            self.assertNotIn("text-sm", get_ui_tweaks()["navbar_classes"])
+            with override_settings(JAZZMIN_UI_TWEAKS={"navbar_small_text": True}):
+                self.assertIn("text-sm", get_ui_tweaks()["navbar_classes"])
+
+
+# MENUS
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    JAZZMIN_SETTINGS={"topmenu_links": [{"model": "app.fuel"}]},
+)
+class MenuTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        menu_cache.clear()
+        self.group = Group.objects.create(name="Staff")
+        self.user = get_user_model().objects.create_user(username="9000000001", password="secret", name="staff")
+        self.user.groups.add(self.group)
+
+    def top_menu(self):
+        # A fresh user per request, as the admin loads it
+        user = get_user_model().objects.get(pk=self.user.pk)
+        return [item["name"] for item in get_top_menu(user)]
+
+    def test_menu_is_shared_until_permissions_change(self):
+        hits, misses = menu_cache.hits, menu_cache.misses
+        self.assertEqual(self.top_menu(), [])
+        self.assertEqual(self.top_menu(), [])
+        self.assertEqual((menu_cache.hits - hits, menu_cache.misses - misses), (1, 1))
+
+        version = get_menu_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.group.permissions.add(Permission.objects.get(codename="view_fuel"))
+        self.assertNotEqual(get_menu_version(), version)
+        self.assertEqual(self.top_menu(), ["Fuels"])
+
+
+# URLS
+class AdminUrlTests(SimpleTestCase):
+    def test_root_urlconf_change_resets_reversed_urls(self):
+        self.assertEqual(get_admin_url("app.fuel"), "/admin/app/fuel/")
+        with override_settings(ROOT_URLCONF="jazzmin.tests"):
+            self.assertEqual(get_admin_url("app.fuel"), "/backoffice/app/fuel/")
+        self.assertEqual(get_admin_url("app.fuel"), "/admin/app/fuel/")
+
+    def test_request_urlconf_is_cached_apart(self):
+        self.assertEqual(get_admin_url("app.fuel"), "/admin/app/fuel/")
+        set_urlconf("jazzmin.tests")
+        try:
+            self.assertEqual(get_admin_url("app.fuel"), "/backoffice/app/fuel/")
+        finally:
+            set_urlconf(None)
+        self.assertEqual(get_admin_url("app.fuel"), "/admin/app/fuel/")
@@ -1,18 +1,74 @@
 import logging
-from typing import List, Union, Dict, Set, Callable, Any
-from urllib.parse import urlencode
+from typing import List, Union, Dict, Set, Callable, Any, Optional, Tuple
+from urllib.parse import quote, urlencode
 from django.apps import apps
 from django.contrib.admin import ListFilter
 from django.contrib.admin.helpers import AdminForm
 from django.contrib.auth.models import AbstractUser
 from django.db.models.base import ModelBase, Model
 from django.db.models.options import Options
+from django.urls import get_resolver, get_script_prefix, get_urlconf
+from django.utils.http import RFC3986_SUBDELIMS
 from django.utils.translation import gettext
 
 from jazzmin.compat import NoReverseMatch, reverse
 
 logger = logging.getLogger(__name__)
 
+# Stands in for the primary key when reversing the template of a change url
+PK_PLACEHOLDER = "__jazzmin_pk__"
+
+# urlconf -> (resolver, {key: url or None}), an entry is dropped once django builds a new resolver
+# for its urlconf (clear_url_caches(), e.g when ROOT_URLCONF changes)
+_reversed: Dict[Any, Tuple[Any, Dict[Tuple, Optional[str]]]] = {}
+
+
+def cached_reverse(key: Tuple, viewname: str, admin_site: str, args: Tuple = ()) -> str:
+    """
+    reverse(), memoized per urlconf and script prefix under key. Names that don't reverse are
+    remembered too and raise NoReverseMatch again
+    """
+    urlconf = get_urlconf()
+    resolver = get_resolver(urlconf)
+    cached = _reversed.get(urlconf)
+    if cached is None or cached[0] is not resolver:
+        cached = _reversed[urlconf] = (resolver, {})
+
+    key = key + (get_script_prefix(),)
+    urls = cached[1]
+    if key not in urls:
+        try:
+            urls[key] = reverse(viewname, args=args, current_app=admin_site)
+        except NoReverseMatch:
+            urls[key] = None
+    if urls[key] is None:
+        raise NoReverseMatch("Reverse for '{}' not found".format(viewname))
+    return urls[key]
+
+
+def reverse_admin(app_label: str, model_name: str, view: str, admin_site: str = "admin") -> str:
+    """
+    Admin url of a model view without arguments (changelist, add)
+    """
+    return cached_reverse(
+        (app_label, model_name, view, admin_site),
+        "admin:{app_label}_{model_name}_{view}".format(app_label=app_label, model_name=model_name, view=view),
+        admin_site,
+    )
+
+
+def reverse_admin_object(app_label: str, model_name: str, view: str, pk: Any, admin_site: str = "admin") -> str:
+    """
+    Admin url of a model view of one object (change, delete, history), filled into a cached template
+    the same way reverse() quotes arguments
+    """
+    viewname = "admin:{app_label}_{model_name}_{view}".format(app_label=app_label, model_name=model_name, view=view)
+    template = cached_reverse((app_label, model_name, view, admin_site, PK_PLACEHOLDER), viewname, admin_site, (PK_PLACEHOLDER,))
+    url = template.replace(PK_PLACEHOLDER, quote(str(pk), safe=RFC3986_SUBDELIMS + "/~:@"))
+    if template.count(PK_PLACEHOLDER) != 1 or url.startswith("//") or not str(pk):
+        return reverse(viewname, args=(pk,), current_app=admin_site)
+    return url
+
 
 def order_with_respect_to(original: List, reference: List, getter: Callable = lambda x: x) -> List:
     """
@@ -43,30 +99,17 @@ def get_admin_url(instance: Any, admin_site: str = "admin", from_app: bool = Fal
         if type(instance) == str:
             app_label, model_name = instance.split(".")
             model_name = model_name.lower()
-            url = reverse(
-                "admin:{app_label}_{model_name}_changelist".format(
-                    app_label=app_label, model_name=model_name),
-                current_app=admin_site,
-            )
+            url = reverse_admin(app_label, model_name, "changelist", admin_site)
 
         # Model class
         elif instance.__class__ == ModelBase:
             app_label, model_name = instance._meta.app_label, instance._meta.model_name
-            url = reverse(
-                "admin:{app_label}_{model_name}_changelist".format(
-                    app_label=app_label, model_name=model_name),
-                current_app=admin_site,
-            )
+            url = reverse_admin(app_label, model_name, "changelist", admin_site)
 
         # Model instance
         elif instance.__class__.__class__ == ModelBase and isinstance(instance, instance.__class__):
             app_label, model_name = instance._meta.app_label, instance._meta.model_name
-            url = reverse(
-                "admin:{app_label}_{model_name}_change".format(
-                    app_label=app_label, model_name=model_name),
-                args=(instance.pk,),
-                current_app=admin_site,
-            )
+            url = reverse_admin_object(app_label, model_name, "change", instance.pk, admin_site)
 
     except (NoReverseMatch, ValueError):
         # If we are not walking through the models within an app, let the user know this url cant be reversed
@@ -95,7 +138,7 @@ def get_custom_url(url: str, admin_site: str = "admin") -> str:
     if "/" in url:
         return url
     try:
-        url = reverse(url.lower(), current_app=admin_site)
+        url = cached_reverse((url.lower(), admin_site), url.lower(), admin_site)
     except NoReverseMatch:
         logger.warning("Couldnt reverse {url}".format(url=url))
         url = "#" + url